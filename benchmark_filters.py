@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Замер фильтрации постов: цикл по распарсенным постам (как _match_post
+после parse_post_text) против колоночного хранилища на списках и на
+массивах NumPy. Посты и фильтры синтетические.
+Запуск: python benchmark_filters.py [количество постов ...] (нужен .env с GROUP_TOKEN)
+"""
+import random
+import sys
+import time
+
+from bot.services.post_store import NUMPY_AVAILABLE, PostStore
+from bot.services.search import _prepare_filters
+
+SIZES = (10_000, 100_000, 1_000_000)
+REPEAT = 5
+# Цикл по спискам медленный - на больших размерах не запускается
+LIST_STORE_LIMIT = 100_000
+
+DISTRICTS = (
+    "Автозаводский", "Канавинский", "Ленинский", "Московский",
+    "Нижегородский", "Приокский", "Советский", "Сормовский",
+)
+
+FILTERS = {
+    "район и цена": {"district": "Сормовский", "price_max": 30000},
+    "2 района, 1-2 комнаты": {"district": ["Канавинский", "Советский"], "rooms": [1, 2]},
+    "цена, комнаты, 30 дней": {"price_min": 20000, "price_max": 45000, "rooms": 2, "recent_days": 30},
+    "без фильтров": {},
+}
+
+
+def make_posts(count: int):
+    rnd = random.Random(count)
+    now = int(time.time())
+    posts = []
+    for post_id in range(1, count + 1):
+        parsed = {"district": rnd.choice(DISTRICTS), "price_value": rnd.randrange(8000, 80000, 500)}
+        if rnd.random() < 0.95:
+            parsed["rooms_value"] = rnd.randint(1, 4)
+        if rnd.random() < 0.9:
+            parsed["floor_value"] = rnd.randint(1, 25)
+        posts.append((post_id, now - rnd.randrange(0, 365 * 86400), parsed))
+    return posts
+
+
+def python_loop(posts, prepared):
+    """Проверка каждого поста, как в _match_post."""
+    result = []
+    for post_id, date, parsed in posts:
+        if prepared["recent_threshold"] is not None and date < prepared["recent_threshold"]:
+            continue
+        if prepared["district"] is not None and parsed.get("district", "").lower() not in prepared["district"]:
+            continue
+        price_value = parsed.get("price_value")
+        if prepared["price_min"] is not None and (price_value is None or price_value < prepared["price_min"]):
+            continue
+        if prepared["price_max"] is not None and (price_value is None or price_value > prepared["price_max"]):
+            continue
+        if prepared["rooms"] is not None and parsed.get("rooms_value") not in prepared["rooms"]:
+            continue
+        result.append((date, post_id))
+    result.sort(reverse=True)
+    return [post_id for _, post_id in result]
+
+
+def best_time(func, *args) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    if not NUMPY_AVAILABLE:
+        print("NumPy не установлен: колонки хранятся в списках\n")
+
+    for size in sizes:
+        posts = make_posts(size)
+        stores = {"numpy": PostStore(use_numpy=True)} if NUMPY_AVAILABLE else {}
+        if size <= LIST_STORE_LIMIT:
+            stores["списки"] = PostStore(use_numpy=False)
+        for store in stores.values():
+            for post_id, date, parsed in posts:
+                store.add(post_id, parsed, date)
+
+        print(f"Постов: {size}")
+        print(f"{'Фильтр':26} {'найдено':>8} {'цикл, мс':>10}" + "".join(f" {name + ', мс':>12}" for name in stores))
+        for title, filters in FILTERS.items():
+            prepared = _prepare_filters(filters)
+            expected = python_loop(posts, prepared)
+            row = f"{title:26} {len(expected):8} {best_time(python_loop, posts, prepared):10.1f}"
+            for store in stores.values():
+                assert store.select(prepared) == expected
+                row += f" {best_time(store.select, prepared):12.1f}"
+            print(row)
+        print()
+
+
+if __name__ == "__main__":
+    main()
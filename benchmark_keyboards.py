@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Замер стоимости сборки клавиатур на одно сообщение: сборка Keyboard
+и get_json() при каждом вызове против готового JSON из реестра.
+Запуск: python benchmark_keyboards.py (нужен .env с GROUP_TOKEN)
+"""
+import timeit
+
+from bot.keyboards import registered_keyboards, warm_up
+from bot.states import RentStates, SearchStates
+
+NUMBER = 2000
+
+# Типичные вызовы клавиатур при обработке сообщений
+CALLS = {
+    "main_menu_inline": (),
+    "subscription_keyboard": (),
+    "district_keyboard_inline": (False,),
+    "kb_for_state_inline": (RentStates.PRICE, True),
+    "kb_preview_inline": ({"district": "Советский", "price": 25000},),
+    "kb_photos_inline": (False,),
+    "search_kb_for_state_inline": (SearchStates.DISTRICT,),
+    "search_results_keyboard": (True, True),
+    "subscription_manage_keyboard": (True,),
+    "subscriptions_select_keyboard": ((True, False, True),),
+    "contract_result_keyboard": (True,),
+    "contract_retry_keyboard": (),
+}
+
+
+def main():
+    builders = {name.rsplit(".", 1)[-1]: func for name, func in registered_keyboards().items()}
+
+    started = timeit.default_timer()
+    built = warm_up()
+    print(f"Прогрев: {built} клавиатур за {(timeit.default_timer() - started) * 1000:.2f} мс\n")
+
+    print(f"{'Клавиатура':34} {'без кэша, мкс':>14} {'с кэшем, мкс':>13} {'ускорение':>10}")
+    total_before = total_after = 0.0
+    for name, args in CALLS.items():
+        builder = builders[name]
+        before = timeit.timeit(lambda: builder.__wrapped__(*args), number=NUMBER) / NUMBER * 1e6
+        after = timeit.timeit(lambda: builder(*args), number=NUMBER) / NUMBER * 1e6
+        total_before += before
+        total_after += after
+        print(f"{name:34} {before:14.2f} {after:13.2f} {before / after:9.0f}x")
+
+    print(f"\n{'Всего':34} {total_before:14.2f} {total_after:13.2f} {total_before / total_after:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Замер конкуренции за блокировки хранилища: потоки-читатели вызывают
+get_search_count, пока потоки-писатели увеличивают счетчики.
+Сравниваются одна общая блокировка с записью файла при каждом изменении
+(прежняя схема), одна блокировка с фоновой записью и шардированные
+блокировки с фоновой записью.
+Запуск: python benchmark_storage.py (нужен .env с GROUP_TOKEN)
+"""
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from storage import Storage
+
+USERS = 5000
+READERS = 8
+WRITERS = 4
+DURATION = 2.0
+
+CONFIGS = [
+    ("общая блокировка, запись сразу", 1, 0),
+    ("общая блокировка, запись в фоне", 1, 1.0),
+    ("64 шарда, запись в фоне", 64, 1.0),
+]
+
+
+def run(shards: int, flush_interval: float, path: str):
+    store = Storage(path=path, shards=shards, flush_interval=flush_interval)
+    for user_id in range(USERS):
+        store._data["user_search_count"][user_id] = 1
+    store.flush()
+
+    stop = threading.Event()
+    latencies = [[] for _ in range(READERS)]
+    writes = [0] * WRITERS
+
+    def reader(index: int):
+        rnd = random.Random(index)
+        samples = latencies[index]
+        while not stop.is_set():
+            started = time.perf_counter()
+            store.get_search_count(rnd.randrange(USERS))
+            samples.append(time.perf_counter() - started)
+
+    def writer(index: int):
+        rnd = random.Random(100 + index)
+        while not stop.is_set():
+            store.increment_search_count(rnd.randrange(USERS))
+            writes[index] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    samples = sorted(sample for reader_samples in latencies for sample in reader_samples)
+    return {
+        "reads": len(samples) / DURATION,
+        "writes": sum(writes) / DURATION,
+        "p50": statistics.median(samples) * 1e6,
+        "p99": samples[int(len(samples) * 0.99)] * 1e6,
+        "p999": samples[int(len(samples) * 0.999)] * 1e6,
+    }
+
+
+def main():
+    print(f"Пользователей: {USERS}, читателей: {READERS}, писателей: {WRITERS}, {DURATION:.0f} с\n")
+    print(f"{'Схема':34} {'чтений/с':>10} {'записей/с':>10} {'p50, мкс':>9} {'p99, мкс':>10} {'p99.9, мкс':>11}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for title, shards, flush_interval in CONFIGS:
+            result = run(shards, flush_interval, os.path.join(tmp, "storage.json"))
+            print(
+                f"{title:34} {result['reads']:10.0f} {result['writes']:10.0f} "
+                f"{result['p50']:9.1f} {result['p99']:10.1f} {result['p999']:11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
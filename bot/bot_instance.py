@@ -2,13 +2,85 @@
 Экземпляр бота и глобальные переменные.
 Отдельный файл для избежания циклических импортов.
 """
+import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from vkbottle.bot import Bot
 
-from .config import TOKEN_FOR_BOT, GROUP_ID, VK_CONFIRMATION_KEY, LOG
+from .config import (
+    TOKEN_FOR_BOT,
+    GROUP_ID,
+    VK_CONFIRMATION_KEY,
+    LOG,
+    STATE_BACKEND,
+    REDIS_URL,
+    STATE_TTL,
+    STATE_CACHE_TTL,
+    CONTRACT_DOCUMENTS_TTL,
+    CONTRACT_DOCUMENTS_LIMIT,
+)
+from .state_dispenser import create_state_dispenser
+
+
+class ExpiringDocuments:
+    """
+    Документы пользователей с временем жизни и ограничением количества.
+
+    Документ с изображениями занимает мегабайты, поэтому хранятся только
+    limit последних записей не дольше ttl секунд; старые вытесняются первыми.
+    """
+
+    def __init__(self, ttl: float, limit: int):
+        self.ttl = ttl
+        self.limit = limit
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            peer_id, (_, stored_at) = next(iter(self._entries.items()))
+            if stored_at > deadline:
+                break
+            del self._entries[peer_id]
+
+    def __setitem__(self, peer_id: int, document: Any) -> None:
+        self._entries.pop(peer_id, None)
+        self._entries[peer_id] = (document, time.monotonic())
+        self._expire()
+        while len(self._entries) > self.limit:
+            self._entries.popitem(last=False)
+
+    def pop(self, peer_id: int, default: Any = None) -> Any:
+        """Забирает документ пользователя (default, если его нет или он устарел)."""
+        self._expire()
+        entry = self._entries.pop(peer_id, None)
+        return entry[0] if entry else default
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._entries)
+
+
+# In-memory хранилище черновиков пользователей
+user_data: dict = {}
+
+# Сессии поиска
+search_sessions: Dict[str, Dict[str, Any]] = {}
+
+# Последний проверенный правилами договор пользователя (для глубокой проверки)
+contract_documents = ExpiringDocuments(CONTRACT_DOCUMENTS_TTL, CONTRACT_DOCUMENTS_LIMIT)
+
+# Состояния диалогов сохраняются вместе с черновиком и сессией поиска
+state_dispenser = create_state_dispenser(
+    STATE_BACKEND,
+    REDIS_URL,
+    state_ttl=STATE_TTL,
+    cache_ttl=STATE_CACHE_TTL,
+    sessions={"draft": user_data, "search": search_sessions},
+)
 
 # Создаём экземпляр бота с confirmation key для Callback API
-bot = Bot(token=TOKEN_FOR_BOT)
+bot = Bot(token=TOKEN_FOR_BOT, state_dispenser=state_dispenser)
 
 # Устанавливаем confirmation key для подтверждения сервера
 if VK_CONFIRMATION_KEY:
@@ -31,9 +103,3 @@ if GROUP_ID:
         LOG.info("Applied groups.getById patch with GROUP_ID=%s", GROUP_ID)
     except Exception as e:
         LOG.warning("Failed to apply groups.getById patch: %s", e)
-
-# In-memory хранилище черновиков пользователей
-user_data: dict = {}
-
-# Сессии поиска
-search_sessions: Dict[str, Dict[str, Any]] = {}
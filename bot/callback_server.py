@@ -0,0 +1,166 @@
+"""
+Сервер VK Callback API.
+Отвечает на запрос подтверждения, проверяет секретный ключ и сразу
+подтверждает получение события, а обработка идет из внутренней очереди
+теми же обработчиками, что и при Long Poll. Несколько процессов бота
+могут работать за балансировщиком нагрузки.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from bot.bot_instance import bot
+from bot.config import (
+    GROUP_ID,
+    VK_CONFIRMATION_KEY,
+    VK_CALLBACK_SECRET,
+    CALLBACK_HOST,
+    CALLBACK_PORT,
+    CALLBACK_PATH,
+    CALLBACK_WORKERS,
+    CALLBACK_QUEUE_SIZE,
+)
+
+logger = logging.getLogger("callback_server")
+
+# Сколько последних event_id помнить для отсева повторных доставок VK
+SEEN_EVENTS_LIMIT = 10000
+# Сколько ждать обработки оставшихся событий при остановке
+DRAIN_TIMEOUT = 10.0
+
+
+class CallbackServer:
+    """HTTP сервер Callback API с очередью событий и пулом обработчиков."""
+
+    def __init__(
+        self,
+        host: str = CALLBACK_HOST,
+        port: int = CALLBACK_PORT,
+        path: str = CALLBACK_PATH,
+        workers: int = CALLBACK_WORKERS,
+        queue_size: int = CALLBACK_QUEUE_SIZE,
+    ):
+        """
+        Args:
+            host: Адрес для входящих соединений
+            port: Порт
+            path: Путь, указанный в настройках Callback API сообщества
+            workers: Количество параллельных обработчиков событий
+            queue_size: Максимальная длина очереди событий
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.duplicates = 0
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._runner: Optional[web.AppRunner] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopped = asyncio.Event()
+
+    def make_app(self) -> web.Application:
+        """Создает aiohttp приложение с обработчиком Callback API."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    def _is_duplicate(self, event: Dict[str, Any]) -> bool:
+        """VK повторяет событие, если не получил ответ вовремя."""
+        event_id = event.get("event_id")
+        if not event_id:
+            return False
+        if event_id in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[event_id] = None
+        if len(self._seen) > SEEN_EVENTS_LIMIT:
+            self._seen.popitem(last=False)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принимает событие: подтверждение сервера или событие для очереди."""
+        try:
+            event = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400, text="bad request")
+        if not isinstance(event, dict):
+            return web.Response(status=400, text="bad request")
+
+        if GROUP_ID and event.get("group_id") not in (None, GROUP_ID):
+            logger.warning("Event for unknown group %s rejected", event.get("group_id"))
+            return web.Response(status=403, text="forbidden")
+
+        if event.get("type") == "confirmation":
+            return web.Response(text=VK_CONFIRMATION_KEY)
+
+        if VK_CALLBACK_SECRET and event.get("secret") != VK_CALLBACK_SECRET:
+            logger.warning("Event with wrong secret rejected")
+            return web.Response(status=403, text="forbidden")
+
+        if self._is_duplicate(event):
+            return web.Response(text="ok")
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Без "ok" VK доставит событие повторно
+            self._seen.pop(event.get("event_id"), None)
+            logger.warning("Event queue is full, asking VK to retry")
+            return web.Response(status=503, text="busy")
+
+        return web.Response(text="ok")
+
+    async def _worker(self) -> None:
+        """Обрабатывает события из очереди зарегистрированными обработчиками."""
+        while True:
+            event = await self.queue.get()
+            try:
+                await bot.process_event(event, bot.api)
+                self.processed += 1
+            except Exception as e:
+                logger.exception("Error processing %s event: %s", event.get("type"), e)
+            finally:
+                self.queue.task_done()
+
+    async def start(self) -> None:
+        """Запускает обработчики очереди и HTTP сервер."""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Callback API server listening on %s:%s%s", self.host, self.port, self.path)
+
+    async def serve_forever(self) -> None:
+        """Запускает сервер и работает до вызова stop()."""
+        await self.start()
+        await self._stopped.wait()
+
+    async def stop(self) -> None:
+        """Перестает принимать события и дообрабатывает очередь."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        try:
+            await asyncio.wait_for(self.queue.join(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Dropping %d unprocessed events on shutdown", self.queue.qsize())
+
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает статистику сервера."""
+        return {
+            "queued": self.queue.qsize(),
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+        }
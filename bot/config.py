@@ -22,6 +22,18 @@ GROUP_ID = int(os.getenv("GROUP_ID") or 0)
 API_V = os.getenv("VK_API_VERSION", "5.199")
 UPLOAD_TOKEN = os.getenv("UPLOAD_TOKEN")
 VK_CONFIRMATION_KEY = os.getenv("VK_CONFIRMATION_KEY", "")
+VK_CALLBACK_SECRET = os.getenv("VK_CALLBACK_SECRET", "")
+
+# Режим получения событий: longpoll или callback (HTTP сервер Callback API)
+BOT_MODE = os.getenv("BOT_MODE", "longpoll").strip().lower()
+CALLBACK_HOST = os.getenv("CALLBACK_HOST", "0.0.0.0")
+CALLBACK_PORT = int(os.getenv("CALLBACK_PORT", "8080"))
+CALLBACK_PATH = os.getenv("CALLBACK_PATH", "/callback")
+CALLBACK_WORKERS = int(os.getenv("CALLBACK_WORKERS", "8"))
+CALLBACK_QUEUE_SIZE = int(os.getenv("CALLBACK_QUEUE_SIZE", "1000"))
+# Опрос стены для уведомлений подписчиков. Хранилище (в том числе последний
+# разосланный пост) у каждого процесса свое - опрос включают только в одном
+NOTIFICATIONS_POLLING = os.getenv("NOTIFICATIONS_POLLING", "1").strip().lower() not in ("0", "false", "no")
 
 # Выбираем токен для бота (предпочитаем user-token)
 TOKEN_FOR_BOT = USER_TOKEN or GROUP_TOKEN
@@ -34,15 +46,56 @@ LOG.info("Starting bot: using %s", "USER_TOKEN" if USER_TOKEN else "GROUP_TOKEN"
 # Настройки бота
 SUPPORT_URL = os.getenv("SUPPORT_URL", "https://vk.com/")
 MAX_SEARCHES_UNSUBSCRIBED = int(os.getenv("MAX_SEARCHES_UNSUBSCRIBED", "3"))
+# Кэш статуса подписки на сообщество (секунды); обновляется событиями group_join/group_leave
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", "3600"))
+# Сообщества не больше этого размера загружаются в кэш целиком при запуске
+MEMBERSHIP_WARMUP_LIMIT = int(os.getenv("MEMBERSHIP_WARMUP_LIMIT", "10000"))
 SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", "30"))
-SEARCH_RESULTS_PAGE_SIZE = 10
+# Сколько постов стены просматривать за один поиск
+SEARCH_SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", "1000"))
+# Сколько последних постов стены загружать в индексы при запуске
+WALL_CRAWL_LIMIT = int(os.getenv("WALL_CRAWL_LIMIT", "1000"))
+SEARCH_RESULTS_PAGE_SIZE = 10  # не больше 10: столько вложений VK принимает в сообщении
+# Отображение страницы результатов: wall (вложения постов) или carousel
+SEARCH_RESULTS_MODE = os.getenv("SEARCH_RESULTS_MODE", "wall").strip().lower()
 
 # Настройки постинга
-DEFAULT_SCHEDULE_DELAY = 2 * 24 * 60 * 60  # 2 дня
+DEFAULT_SCHEDULE_DELAY = 2 * 24 * 60 * 60  # 2 дня - не раньше чем через столько публикуется объявление
+# Лимиты отложенных постов: объявление занимает ближайший свободный слот
+SCHEDULE_MAX_PER_HOUR = int(os.getenv("SCHEDULE_MAX_PER_HOUR", "2"))
+SCHEDULE_MAX_PER_DAY = int(os.getenv("SCHEDULE_MAX_PER_DAY", "25"))
+# Часы публикации (местное время): с SCHEDULE_FIRST_HOUR до SCHEDULE_LAST_HOUR
+SCHEDULE_FIRST_HOUR = int(os.getenv("SCHEDULE_FIRST_HOUR", "9"))
+SCHEDULE_LAST_HOUR = int(os.getenv("SCHEDULE_LAST_HOUR", "22"))
+# Как часто перечитывать очередь отложенных постов из VK, секунды
+SCHEDULE_REFRESH_INTERVAL = float(os.getenv("SCHEDULE_REFRESH_INTERVAL", "600"))
 REQUEST_TIMEOUT = 30
 
+# Индекс загруженных фото (повторные фото квартир не загружаются заново)
+PHOTO_INDEX_FILE = os.getenv("PHOTO_INDEX_FILE", "photo_index.json")
+PHOTO_HASH_DISTANCE = int(os.getenv("PHOTO_HASH_DISTANCE", "4"))
+# Сколько фото черновиков загружается в сообщество одновременно
+PHOTO_UPLOAD_WORKERS = int(os.getenv("PHOTO_UPLOAD_WORKERS", "3"))
+
+# Договоры, ожидающие глубокой проверки: время хранения (секунды) и максимум записей
+CONTRACT_DOCUMENTS_TTL = int(os.getenv("CONTRACT_DOCUMENTS_TTL", str(60 * 60)))
+CONTRACT_DOCUMENTS_LIMIT = int(os.getenv("CONTRACT_DOCUMENTS_LIMIT", "200"))
+
+# Хранение состояний диалогов: storage (файл хранилища), redis (общее для процессов) или memory
+STATE_BACKEND = os.getenv("STATE_BACKEND", "storage").strip().lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_TTL = int(os.getenv("STATE_TTL", str(24 * 60 * 60)))  # незавершенный диалог, секунды
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "5"))   # кэш состояния в процессе, секунды
+
 # Настройки хранилища
 STORAGE_FILE = os.getenv("STORAGE_FILE", "bot_storage.json")
+# Количество шардов блокировок данных пользователей
+STORAGE_LOCK_SHARDS = int(os.getenv("STORAGE_LOCK_SHARDS", "64"))
+# Задержка фоновой записи файла хранилища в секундах (0 - запись при каждом изменении)
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "1.0"))
+
+# ID администраторов бота через запятую (служебные команды, например /prices)
+ADMIN_IDS = {int(value) for value in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if value.isdigit()}
 
 # Текстовые константы
 MENU_GREETING = "Привет! Выберите действие:"
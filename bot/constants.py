@@ -16,6 +16,7 @@ class Button:
     VIEW_ADS = "Посмотреть"
     MY_SUBSCRIPTIONS = "Мои подписки"
     CHECK_CONTRACT = "🤖 Проверить договор"
+    DEEP_CHECK_CONTRACT = "🔍 Глубокая проверка"
     SUPPORT = "Поддержка"
     CHECK_SUBSCRIPTION = "Проверить подписку"
 
@@ -39,6 +40,8 @@ class Button:
 
     # Публикация
     SEND = "Отправить"
+    UPDATE_LISTING = "🔄 Обновить объявление"
+    SEND_AS_NEW = "Отправить как новое"
 
     # Поля объявления
     FIELD_DISTRICT = "Район"
@@ -79,6 +82,9 @@ DISTRICTS = [
     Button.DISTRICT_SORMOVSKY,
 ]
 
+# Районы для поиска: конкретные районы и «Любой»
+SEARCH_DISTRICTS = DISTRICTS + [Button.DISTRICT_ANY]
+
 
 # ============================================================================
 # СООБЩЕНИЯ ПОЛЬЗОВАТЕЛЮ
@@ -89,6 +95,7 @@ class Message:
 
     # Ошибки
     ERROR_NO_SEARCH = "❌ Сначала выполните поиск, чтобы создать подписку на его параметры."
+    ERROR_ADMIN_ONLY = "❌ Команда доступна только администраторам."
     ERROR_SUBSCRIPTION_NOT_FOUND = "❌ Подписка не найдена. Выберите подписку из списка."
     ERROR_INVALID_SUBSCRIPTION_NUMBER = "❌ Неверный номер подписки."
     ERROR_DELETE_FAILED = "❌ Не удалось удалить подписку."
@@ -113,6 +120,10 @@ class Message:
     # Уведомления
     NEW_AD_NOTIFICATION = "🔔 Новое объявление!\n\nНайдено объявление по вашей подписке:\n{filters}\n\nСмотрите объявление ниже:"
 
+    # Статистика цен
+    MARKET_TABLE_HEADER = "📊 Цены аренды: медиана (25% – 75%)"
+    MARKET_TABLE_EMPTY = "📊 Статистики цен пока нет: загруженных объявлений с ценой мало."
+
     # Информационные
     SUBSCRIPTION_INFO = "Вы будете получать уведомления о новых объявлениях с параметрами:\n\n{filters}\n\nУправлять подписками можно через кнопку «Мои подписки»."
 
@@ -132,6 +143,9 @@ class Message:
     CONTRACT_LOW_RISK = "🟢 НИЗКИЙ РИСК"
 
     CONTRACT_BACK_TO_MENU = "Для проверки другого договора нажмите «Проверить договор» в главном меню."
+    CONTRACT_STREAM_INTERRUPTED = "⚠️ AI-проверка прервалась, ответ выше неполный. Ниже - отчет проверки по правилам."
+    CONTRACT_QUICK_RESULT = "⚡ Это быстрая проверка по правилам. Для подробного анализа с помощью AI нажмите «Глубокая проверка»."
+    CONTRACT_DEEP_CHECK_EXPIRED = "❌ Договор для глубокой проверки не найден. Отправьте его заново через «Проверить договор»."
 
 
 # ============================================================================
@@ -158,3 +172,12 @@ class Format:
     FILTER_PRICE_ANY = "Цена: любая"
     FILTER_ROOMS = "Комнат: {rooms}"
     FILTER_ROOMS_ANY = "Комнат: любое"
+    FILTER_KEYWORDS = "Слова: {keywords}"
+
+    # Статистика цен
+    MARKET_MEDIAN = "📊 Медиана для {rooms}-комн. в районе {district}: {price}"
+    MARKET_MEDIAN_ROOMS = "📊 Медиана для {rooms}-комн. по городу: {price}"
+    MARKET_MEDIAN_DISTRICT = "📊 Медиана в районе {district}: {price}"
+    MARKET_MEDIAN_ALL = "📊 Медиана по всем объявлениям: {price}"
+    MARKET_PERIOD = " (за {days} дн.)"
+    MARKET_TABLE_ROW = "{group}: {median} ({p25} – {p75}, {count} объявл.)"
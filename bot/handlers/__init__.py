@@ -7,10 +7,12 @@
 """
 # Импортируем в правильном порядке: от специфичных к общим
 from . import wall_events   # Обработчики событий со стены (публикация постов)
+from . import group_events  # Вступление в сообщество и выход из него
 from . import rent          # Специфичные хендлеры для создания объявлений
 from . import search        # Специфичные хендлеры для поиска
 from . import subscriptions # Специфичные хендлеры для подписок
 from . import contract      # Специфичные хендлеры для проверки договоров
+from . import admin         # Служебные команды администраторов
 from . import menu          # Общие хендлеры (menu, start, fallback) - ПОСЛЕДНИМ!
 
-__all__ = ["wall_events", "rent", "search", "subscriptions", "contract", "menu"]
+__all__ = ["wall_events", "group_events", "rent", "search", "subscriptions", "contract", "admin", "menu"]
@@ -0,0 +1,65 @@
+"""
+Служебные команды администраторов бота (ADMIN_IDS).
+"""
+import logging
+from vkbottle.bot import Message
+
+from bot.bot_instance import bot
+from bot.config import ADMIN_IDS
+from bot.constants import Message as Msg, Format
+from bot.services import market_stats
+from bot.utils import format_price_display
+
+logger = logging.getLogger("admin_handlers")
+
+MAX_MESSAGE_LENGTH = 4000
+
+
+def _price(value) -> str:
+    return format_price_display(int(round(value, -2))) if value is not None else "—"
+
+
+def format_market_table() -> str:
+    """Таблица цен по районам и количеству комнат."""
+    rows = market_stats.table()
+    if not rows:
+        return Msg.MARKET_TABLE_EMPTY
+
+    lines = [Msg.MARKET_TABLE_HEADER]
+    current_district = object()
+    for row in rows:
+        if row["district"] != current_district:
+            current_district = row["district"]
+            lines.append("")
+            lines.append(f"🏙 {current_district or 'Весь город'}")
+        group = f"{row['rooms']}-комн." if row["rooms"] is not None else "все"
+        lines.append(Format.MARKET_TABLE_ROW.format(
+            group=group,
+            median=_price(row["median"]),
+            p25=_price(row["p25"]),
+            p75=_price(row["p75"]),
+            count=row["count"],
+        ))
+    return "\n".join(lines)
+
+
+@bot.on.message(text=["/prices", "/цены"])
+async def market_table_handler(message: Message):
+    """Выводит статистику цен (только для администраторов)."""
+    if message.from_id not in ADMIN_IDS:
+        await message.answer(Msg.ERROR_ADMIN_ONLY)
+        return
+
+    logger.info("Admin %s requested market stats", message.from_id)
+
+    # Длинную таблицу отправляем частями по строкам
+    part = []
+    length = 0
+    for line in format_market_table().split("\n"):
+        if part and length + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            await message.answer("\n".join(part))
+            part, length = [], 0
+        part.append(line)
+        length += len(line) + 1
+    if part:
+        await message.answer("\n".join(part))
@@ -2,12 +2,13 @@
 Обработчики для проверки договоров аренды.
 """
 import logging
-from vkbottle import Keyboard, KeyboardButtonColor, Text
 from vkbottle.bot import Message
-from bot.bot_instance import bot
+from bot.bot_instance import bot, contract_documents
 from bot.states import ContractStates, CONTRACT_PROMPTS
 from bot.constants import Button, Message as Msg
-from bot.services.document_parser import DocumentParser
+from bot.keyboards import contract_cancel_keyboard, contract_result_keyboard, contract_retry_keyboard
+from bot.services.document_parser import ContractDocument, DocumentParser
+from bot.services.analysis_stats import TIER_RULES
 from bot.services.contract_analyzer import ContractAnalyzer, RiskLevel
 
 
@@ -17,19 +18,108 @@ contract_analyzer = ContractAnalyzer()
 logger = logging.getLogger(__name__)
 
 
+# Сколько проблем из потокового ответа отправлять одним сообщением
+STREAM_ISSUES_BATCH = 3
+MAX_MESSAGE_LENGTH = 4000
+
+
+async def send_result_text(message: Message, text: str, deep_check: bool = False) -> None:
+    """Отправляет текст результата, при необходимости по частям, с клавиатурой в конце."""
+    # Разбиваем на части если слишком длинный
+    parts = []
+    current_part = []
+    current_length = 0
+
+    for line in text.split('\n'):
+        if current_part and current_length + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            parts.append('\n'.join(current_part))
+            current_part = [line]
+            current_length = len(line)
+        else:
+            current_part.append(line)
+            current_length += len(line) + 1
+
+    if current_part:
+        parts.append('\n'.join(current_part))
+
+    # Последняя часть с клавиатурой
+    for part in parts[:-1]:
+        await message.answer(part)
+
+    closing = Msg.CONTRACT_QUICK_RESULT if deep_check else Msg.CONTRACT_BACK_TO_MENU
+    await message.answer(
+        parts[-1] + "\n\n" + closing,
+        keyboard=contract_result_keyboard(deep_check)
+    )
+
+
+async def send_contract_analysis(message: Message, document: ContractDocument, deep: bool = False) -> None:
+    """Анализирует договор и отправляет результат: резюме и первые проблемы - по мере готовности."""
+    analysis_result = None
+    streamed = False
+    interrupted = False
+    summary_sent = False
+    pending_issues = []
+    sent_issues = 0
+
+    async for update in contract_analyzer.analyze_contract_stream(document.text, deep=deep, images=document.images):
+        if update.kind == "summary":
+            await message.answer(
+                contract_analyzer.format_summary_for_vk(update.overall_risk, update.summary)
+            )
+            summary_sent = True
+        elif update.kind == "issue":
+            pending_issues.append(update.issue)
+            # Первую проблему отправляем сразу, остальные - пачками
+            if sent_issues == 0 or len(pending_issues) >= STREAM_ISSUES_BATCH:
+                await message.answer(
+                    contract_analyzer.format_issues_for_vk(pending_issues, with_header=sent_issues == 0)
+                )
+                sent_issues += len(pending_issues)
+                pending_issues = []
+        elif update.kind == "result":
+            analysis_result = update.result
+            streamed = update.streamed
+            interrupted = update.interrupted
+
+    # Быструю проверку правилами можно уточнить через AI - запоминаем договор
+    deep_check = analysis_result.tier == TIER_RULES and contract_analyzer.can_escalate
+    if deep_check:
+        contract_documents[message.peer_id] = document
+    else:
+        contract_documents.pop(message.peer_id, None)
+
+    if streamed:
+        # Резюме и проблемы уже отправлены - досылаем оставшиеся проблемы и окончание отчета
+        tail_parts = []
+        if not summary_sent:
+            # Для длинных договоров резюме известно только после объединения фрагментов
+            tail_parts.append(
+                contract_analyzer.format_summary_for_vk(analysis_result.overall_risk, analysis_result.summary)
+            )
+        if pending_issues:
+            tail_parts.append(
+                contract_analyzer.format_issues_for_vk(pending_issues, with_header=sent_issues == 0)
+            )
+        tail_parts.append(contract_analyzer.format_details_for_vk(analysis_result))
+        await send_result_text(message, "\n\n".join(tail_parts), deep_check)
+    else:
+        if interrupted:
+            # Часть проблем от AI уже отправлена - отделяем их от отчета правилами
+            await message.answer(Msg.CONTRACT_STREAM_INTERRUPTED)
+        # Форматируем результат для VK
+        await send_result_text(message, contract_analyzer.format_analysis_for_vk(analysis_result), deep_check)
+
+
 @bot.on.message(text=Button.CHECK_CONTRACT)
 async def start_contract_check(message: Message):
     """Начало проверки договора."""
     # Устанавливаем состояние ожидания документа
     await bot.state_dispenser.set(message.peer_id, ContractStates.UPLOAD)
 
-    # Клавиатура с кнопкой отмены
-    kb = Keyboard(inline=True)
-    kb.add(Text(Button.CANCEL), color=KeyboardButtonColor.NEGATIVE)
-
     await message.answer(
         CONTRACT_PROMPTS[ContractStates.UPLOAD],
-        keyboard=kb.get_json()
+        keyboard=contract_cancel_keyboard()
     )
 
 
@@ -53,12 +143,9 @@ async def handle_contract_upload(message: Message):
 
     if not attachments:
         # Если нет вложений, напоминаем пользователю
-        kb = Keyboard(inline=True)
-        kb.add(Text(Button.CANCEL), color=KeyboardButtonColor.NEGATIVE)
-
         await message.answer(
             Msg.CONTRACT_ERROR_NO_FILES + "\n\n" + CONTRACT_PROMPTS[ContractStates.UPLOAD],
-            keyboard=kb.get_json()
+            keyboard=contract_cancel_keyboard()
         )
         return
 
@@ -69,8 +156,9 @@ async def handle_contract_upload(message: Message):
     await message.answer(CONTRACT_PROMPTS[ContractStates.PROCESSING])
 
     try:
-        # Извлекаем текст из всех вложений
+        # Извлекаем текст и изображения из всех вложений
         all_texts = []
+        all_images = []
         processed_files = []
 
         for attachment in attachments:
@@ -80,94 +168,37 @@ async def handle_contract_upload(message: Message):
             # Информируем пользователя о прогрессе
             await message.answer(Msg.CONTRACT_RECEIVED.format(file_type=file_type))
 
-            # Извлекаем текст
-            text = await document_parser.extract_text_from_attachment(attachment)
+            # Извлекаем текст (изображения без OCR передаются отдельно)
+            document = await document_parser.extract_document_from_attachment(attachment, owner=str(message.from_id))
 
-            if text:
-                all_texts.append(text)
+            if document and not document.is_empty():
+                if document.text:
+                    all_texts.append(document.text)
+                all_images.extend(document.images)
                 processed_files.append(file_type)
             else:
                 await message.answer(f"⚠️ Не удалось прочитать {file_type}")
 
-        if not all_texts:
+        if not processed_files:
             # Если не удалось извлечь текст ни из одного файла
             await bot.state_dispenser.delete(message.peer_id)
 
-            kb = Keyboard(inline=True)
-            kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
-            kb.row()
-            kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
-
             await message.answer(
                 Msg.CONTRACT_ERROR_PARSE + "\n\n" +
                 "Попробуйте отправить документ в другом формате или более четкие фотографии.",
-                keyboard=kb.get_json()
+                keyboard=contract_retry_keyboard()
             )
             return
 
         # Объединяем текст из всех файлов
-        combined_text = "\n\n".join(all_texts)
+        combined = ContractDocument(text="\n\n".join(all_texts), images=all_images)
 
         # Информируем о начале анализа
         files_info = f"📂 Обработано файлов: {len(processed_files)}"
         await message.answer(f"{files_info}\n\n{Msg.CONTRACT_ANALYZING}")
 
-        # Анализируем договор
-        analysis_result = await contract_analyzer.analyze_contract(combined_text)
-
-        # Переходим в состояние результатов
-        await bot.state_dispenser.set(message.peer_id, ContractStates.RESULTS)
-
-        # Форматируем результат для VK
-        formatted_result = contract_analyzer.format_analysis_for_vk(analysis_result)
-
-        # Разбиваем на части если слишком длинный
-        max_message_length = 4000
-        if len(formatted_result) > max_message_length:
-            # Отправляем по частям
-            parts = []
-            current_part = []
-            current_length = 0
-
-            for line in formatted_result.split('\n'):
-                if current_length + len(line) + 1 > max_message_length:
-                    parts.append('\n'.join(current_part))
-                    current_part = [line]
-                    current_length = len(line)
-                else:
-                    current_part.append(line)
-                    current_length += len(line) + 1
-
-            if current_part:
-                parts.append('\n'.join(current_part))
-
-            # Отправляем части
-            for i, part in enumerate(parts):
-                if i == len(parts) - 1:
-                    # Последняя часть с клавиатурой
-                    kb = Keyboard(inline=True)
-                    kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
-                    kb.row()
-                    kb.add(Text(Button.MENU), color=KeyboardButtonColor.PRIMARY)
-
-                    await message.answer(
-                        part + "\n\n" + Msg.CONTRACT_BACK_TO_MENU,
-                        keyboard=kb.get_json()
-                    )
-                else:
-                    await message.answer(part)
-
-        else:
-            # Отправляем результат с клавиатурой
-            kb = Keyboard(inline=True)
-            kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
-            kb.row()
-            kb.add(Text(Button.MENU), color=KeyboardButtonColor.PRIMARY)
-
-            await message.answer(
-                formatted_result + "\n\n" + Msg.CONTRACT_BACK_TO_MENU,
-                keyboard=kb.get_json()
-            )
+        # Анализируем договор: резюме и первые проблемы отправляем по мере готовности
+        await send_contract_analysis(message, combined)
 
         # Очищаем состояние
         await bot.state_dispenser.delete(message.peer_id)
@@ -179,11 +210,6 @@ async def handle_contract_upload(message: Message):
         await bot.state_dispenser.delete(message.peer_id)
 
         # Отправляем сообщение об ошибке
-        kb = Keyboard(inline=True)
-        kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
-        kb.row()
-        kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
-
         await message.answer(
             Msg.CONTRACT_ERROR_ANALYSIS + "\n\n" +
             "Возможные причины:\n" +
@@ -191,10 +217,26 @@ async def handle_contract_upload(message: Message):
             "• Временные проблемы с сервисом анализа\n" +
             "• Слишком большой объем текста\n\n" +
             "Попробуйте еще раз или обратитесь в поддержку.",
-            keyboard=kb.get_json()
+            keyboard=contract_retry_keyboard()
         )
 
 
+@bot.on.message(text=Button.DEEP_CHECK_CONTRACT)
+async def deep_contract_check(message: Message):
+    """Глубокая проверка через AI договора, который был быстро проверен правилами."""
+    document = contract_documents.pop(message.peer_id, None)
+    if document is None:
+        await message.answer(Msg.CONTRACT_DEEP_CHECK_EXPIRED, keyboard=contract_result_keyboard())
+        return
+
+    await message.answer(Msg.CONTRACT_ANALYZING)
+    try:
+        await send_contract_analysis(message, document, deep=True)
+    except Exception as e:
+        logger.error(f"Ошибка при глубокой проверке договора: {e}", exc_info=True)
+        await message.answer(Msg.CONTRACT_ERROR_ANALYSIS, keyboard=contract_result_keyboard())
+
+
 @bot.on.message(state=ContractStates.RESULTS)
 async def handle_results_state(message: Message):
     """Обработка состояния результатов."""
@@ -0,0 +1,28 @@
+"""
+Обработчики вступления в сообщество и выхода из него.
+Сразу обновляют кэш статуса подписки, чтобы лимит поисков
+снимался и возвращался без повторных запросов к API.
+"""
+import logging
+from vkbottle import GroupEventType
+
+from bot.bot_instance import bot
+from bot.services import update_membership
+
+logger = logging.getLogger("group_events")
+
+
+@bot.on.raw_event(GroupEventType.GROUP_JOIN, dataclass=dict)
+async def group_join_handler(event: dict):
+    """Пользователь вступил в сообщество."""
+    user_id = event.get("object", {}).get("user_id")
+    if user_id:
+        update_membership(int(user_id), True)
+
+
+@bot.on.raw_event(GroupEventType.GROUP_LEAVE, dataclass=dict)
+async def group_leave_handler(event: dict):
+    """Пользователь вышел из сообщества."""
+    user_id = event.get("object", {}).get("user_id")
+    if user_id:
+        update_membership(int(user_id), False)
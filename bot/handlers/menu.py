@@ -11,6 +11,7 @@ from vkbottle import GroupEventType, GroupTypes
 from bot.bot_instance import bot, user_data
 from bot.config import MENU_GREETING, START_COMMANDS, SUPPORT_URL, ALLOW_GREETING_SUPPRESS_SECONDS
 from bot.keyboards import main_menu_inline
+from bot.services import photo_prefetcher
 
 # Временное хранилище для подавления повторных приветствий
 _recent_allow_greetings: Dict[int, float] = {}
@@ -108,6 +109,7 @@ async def start_command(message: Message):
     if user_id is not None:
         try:
             user_data.pop(str(user_id), None)
+            photo_prefetcher.discard(str(user_id))
         except Exception:
             pass
 
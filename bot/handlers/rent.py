@@ -2,7 +2,9 @@
 Обработчики для создания объявлений об аренде.
 Включает FSM для сбора данных и публикации объявления.
 """
+import asyncio
 import logging
+from datetime import datetime
 from typing import Optional
 from vkbottle.bot import Message
 
@@ -13,12 +15,16 @@ from bot.keyboards import (
     kb_for_state_inline,
     kb_preview_inline,
     kb_photos_inline,
+    kb_duplicate_inline,
 )
 from bot.services import (
     extract_photo_urls_from_message,
-    upload_photos_to_group,
+    photo_prefetcher,
     send_to_scheduled,
+    edit_post,
+    listing_index,
 )
+from bot.services.duplicates import draft_fingerprint
 from bot.utils import (
     extract_int,
     validate_phone,
@@ -26,7 +32,8 @@ from bot.utils import (
     format_preview_text,
     build_post_text,
 )
-from bot.config import DEFAULT_SCHEDULE_DELAY
+from bot.config import DEFAULT_SCHEDULE_DELAY, GROUP_ID
+from bot.constants import Button
 
 logger = logging.getLogger("rent_handlers")
 
@@ -91,6 +98,7 @@ async def maybe_back_to_preview(message: Message, uid: str) -> bool:
 async def post_rent_start(message: Message):
     """Начало создания объявления."""
     uid = str(message.from_id)
+    photo_prefetcher.discard(uid)
     user_data[uid] = {}
     await bot.state_dispenser.set(message.peer_id, RentStates.DISTRICT)
     await message.answer(
@@ -396,6 +404,10 @@ async def photos_handler(message: Message):
         stored.extend(new_urls)
         added = len(new_urls)
         total = len(stored)
+        # Загружаем фото в сообщество, пока пользователь заполняет остальное
+        photo_prefetcher.schedule(uid, user_data[uid])
+        # Сохраняем черновик с новыми фото вместе с состоянием
+        await bot.state_dispenser.set(peer, RentStates.PHOTOS)
 
         await message.answer(
             f"Добавлено {added} фото. Всего: {total}.",
@@ -495,6 +507,53 @@ async def phone_handler(message: Message):
     await message.answer(preview_text, keyboard=kb_preview_inline(draft))
 
 
+async def collect_draft_attachments(message: Message, uid: str, draft: dict) -> Optional[dict]:
+    """
+    Дожидается загрузки фото черновика.
+
+    Returns:
+        {"attachments": str или None} или None при ошибке (пользователю уже отвечено)
+    """
+    if not draft.get("photo_urls"):
+        return {"attachments": None}
+
+    if photo_prefetcher.pending(draft):
+        await message.answer(
+            "Заканчиваю загрузку фото в сообщество... (это может занять некоторое время)"
+        )
+    upload_resp = await photo_prefetcher.collect(uid, draft)
+
+    if "error" in upload_resp:
+        err = upload_resp.get("error", {})
+        await message.answer(
+            f"Ошибка при загрузке фото: {err.get('error_msg')}",
+            keyboard=main_menu_inline(),
+        )
+        return None
+
+    return {"attachments": upload_resp.get("response", {}).get("attachments")}
+
+
+async def finish_draft(uid: str, peer: int) -> None:
+    """Очищает черновик и состояние после публикации."""
+    user_data.pop(uid, None)
+    try:
+        await bot.state_dispenser.delete(peer)
+    except (KeyError, Exception):
+        pass
+
+
+def duplicate_text(duplicate: dict) -> str:
+    """Сообщение о найденном похожем объявлении."""
+    link = f"https://vk.com/wall{-abs(int(GROUP_ID))}_{duplicate['post_id']}"
+    where = "в отложенных записях" if duplicate["postponed"] else "на стене"
+    reason = "с теми же фото" if duplicate["match"] == "photo" else "с тем же адресом, ценой, комнатами и телефоном"
+    return (
+        f"Похоже, это объявление уже есть {where} ({reason}):\n{link}\n\n"
+        "Обновить его текст и фото или отправить как новое?"
+    )
+
+
 @bot.on.message(text="Отправить")
 async def send_scheduled_handler(message: Message):
     """Отправка объявления в отложенные записи."""
@@ -512,28 +571,26 @@ async def send_scheduled_handler(message: Message):
     if not isinstance(text, str):
         text = str(text)
 
-    attachments: Optional[str] = None
-    photo_urls = draft.get("photo_urls") or []
-
-    if photo_urls:
-        await message.answer(
-            "Начинаю загрузку фото в сообщество... (это может занять некоторое время)"
-        )
-        upload_resp = upload_photos_to_group(photo_urls)
+    collected = await collect_draft_attachments(message, uid, draft)
+    if collected is None:
+        return
+    attachments: Optional[str] = collected["attachments"]
 
-        if "error" in upload_resp:
-            err = upload_resp.get("error", {})
-            await message.answer(
-                f"Ошибка при загрузке фото: {err.get('error_msg')}",
-                keyboard=main_menu_inline(),
-            )
+    # Повторная подача той же квартиры - предлагаем обновить старое объявление
+    if not draft.get("duplicate_confirmed"):
+        duplicate = listing_index.find(draft, attachments)
+        if duplicate:
+            draft["duplicate_of"] = duplicate
+            await message.answer(duplicate_text(duplicate), keyboard=kb_duplicate_inline())
             return
 
-        attachments = upload_resp.get("response", {}).get("attachments")
-
     try:
-        resp = send_to_scheduled(
-            text=text, attachments=attachments, delay_seconds=DEFAULT_SCHEDULE_DELAY
+        # В потоке: планировщик может перечитать очередь отложенных постов
+        resp = await asyncio.to_thread(
+            send_to_scheduled,
+            text=text,
+            attachments=attachments,
+            delay_seconds=DEFAULT_SCHEDULE_DELAY,
         )
     except Exception as e:
         await message.answer(
@@ -550,7 +607,23 @@ async def send_scheduled_handler(message: Message):
         return
 
     post_id = resp.get("response", {}).get("post_id")
+    publish_date = resp.get("response", {}).get("publish_date")
     if post_id:
+        listing_index.add(
+            post_id,
+            draft_fingerprint(draft),
+            (attachments or "").split(","),
+            postponed=True,
+            publish_date=publish_date,
+        )
+
+    if post_id and publish_date:
+        when = datetime.fromtimestamp(publish_date).strftime("%d.%m в %H:%M")
+        await message.answer(
+            f"✅ Готово — объявление отправлено в отложенные и будет опубликовано {when}.",
+            keyboard=main_menu_inline(),
+        )
+    elif post_id:
         await message.answer(
             f"✅ Готово — объявление отправлено в отложенные.",
             keyboard=main_menu_inline(),
@@ -561,15 +634,64 @@ async def send_scheduled_handler(message: Message):
             keyboard=main_menu_inline(),
         )
 
-    # Очищаем черновик и состояние
-    user_data.pop(uid, None)
-    try:
-        try:
-            await bot.state_dispenser.delete(peer)
-        except (KeyError, Exception):
-            pass
-    except:
-        pass
+    await finish_draft(uid, peer)
+
+
+@bot.on.message(text=Button.SEND_AS_NEW)
+async def send_as_new_handler(message: Message):
+    """Отправка объявления, несмотря на найденный дубликат."""
+    draft = user_data.get(str(message.from_id))
+    if draft:
+        draft["duplicate_confirmed"] = True
+    await send_scheduled_handler(message)
+
+
+@bot.on.message(text=Button.UPDATE_LISTING)
+async def update_listing_handler(message: Message):
+    """Замена найденного объявления текстом и фото черновика."""
+    uid = str(message.from_id)
+    peer = message.peer_id
+    draft = user_data.get(uid)
+    duplicate = (draft or {}).get("duplicate_of")
+
+    if not draft or not duplicate:
+        await message.answer(
+            "Нет черновика для обновления.", keyboard=main_menu_inline()
+        )
+        return
+
+    collected = await collect_draft_attachments(message, uid, draft)
+    if collected is None:
+        return
+    attachments: Optional[str] = collected["attachments"]
+
+    publish_date = duplicate["publish_date"] if duplicate["postponed"] else None
+    resp = await asyncio.to_thread(
+        edit_post,
+        duplicate["post_id"],
+        build_post_text(draft),
+        attachments,
+        publish_date,
+    )
+
+    if "error" in resp:
+        err = resp.get("error", {})
+        await message.answer(
+            f"Не удалось обновить объявление: {err.get('error_msg')}\n"
+            "Можно отправить его как новое.",
+            keyboard=kb_duplicate_inline(),
+        )
+        return
+
+    listing_index.add(
+        duplicate["post_id"],
+        draft_fingerprint(draft),
+        (attachments or "").split(","),
+        postponed=duplicate["postponed"],
+        publish_date=duplicate["publish_date"],
+    )
+    await message.answer("✅ Готово — объявление обновлено.", keyboard=main_menu_inline())
+    await finish_draft(uid, peer)
 
 
 # Обработчики редактирования полей из превью
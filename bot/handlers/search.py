@@ -2,8 +2,9 @@
 Обработчики для поиска объявлений.
 Включает FSM для поиска и отображение результатов.
 """
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from vkbottle.bot import Message
 
 from bot.bot_instance import bot, search_sessions
@@ -11,7 +12,9 @@ from bot.config import (
     GROUP_ID,
     MAX_SEARCHES_UNSUBSCRIBED,
     SEARCH_RESULTS_PAGE_SIZE,
+    SEARCH_RESULTS_MODE,
 )
+from bot.constants import Format
 from bot.states import SearchStates, SEARCH_PROMPTS
 from bot.keyboards import (
     main_menu_inline,
@@ -19,12 +22,17 @@ from bot.keyboards import (
     search_kb_for_state_inline,
     search_results_keyboard,
 )
-from bot.services import check_subscription, search_posts
-from bot.utils import extract_int, format_search_result, validate_search_district
+from bot.services import check_subscription, market_stats, search_page, SearchCursor
+from bot.services.text_index import query_terms
+from bot.services.search_render import RESULTS_MODE_WALL, render_results_page
+from bot.utils import extract_int, format_price_display, parse_rooms, parse_search_districts
 from storage import storage
 
 logger = logging.getLogger("search_handlers")
 
+# Сколько медиан цен показывать над результатами поиска
+MARKET_LINES_LIMIT = 4
+
 
 def get_search_session(uid: str) -> Dict[str, Any]:
     """Получает или создаёт сессию поиска для пользователя."""
@@ -36,56 +44,126 @@ def _search_reset(uid: str) -> None:
     search_sessions.pop(uid, None)
 
 
+def _as_list(value: Any) -> List[Any]:
+    if value is None or value == "" or value == []:
+        return [None]
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def market_summary(filters: Dict[str, Any]) -> List[str]:
+    """Медианы цен для районов и количества комнат из фильтров поиска (и за выбранный период)."""
+    recent_days = filters.get("recent_days")
+    days = recent_days if recent_days in market_stats.period_days else None
+    lines = []
+    for district in _as_list(filters.get("district")):
+        for rooms in _as_list(filters.get("rooms")):
+            median = market_stats.median(district, rooms, days)
+            if median is None:
+                continue
+            price = format_price_display(int(round(median, -2)))
+            if days is not None:
+                price += Format.MARKET_PERIOD.format(days=recent_days)
+            if district and rooms is not None:
+                lines.append(Format.MARKET_MEDIAN.format(rooms=rooms, district=district, price=price))
+            elif rooms is not None:
+                lines.append(Format.MARKET_MEDIAN_ROOMS.format(rooms=rooms, price=price))
+            elif district:
+                lines.append(Format.MARKET_MEDIAN_DISTRICT.format(district=district, price=price))
+            else:
+                lines.append(Format.MARKET_MEDIAN_ALL.format(price=price))
+            if len(lines) == MARKET_LINES_LIMIT:
+                return lines
+    return lines
+
+
 async def prompt_search_state(message: Message, state) -> None:
     """Отправляет промпт для состояния поиска."""
     prompt = SEARCH_PROMPTS.get(state, "Введите значение:")
     await message.answer(prompt, keyboard=search_kb_for_state_inline(state))
 
 
+def fetch_next_page(
+    session: Dict[str, Any], chunk_size: int = SEARCH_RESULTS_PAGE_SIZE
+) -> Tuple[List[Dict[str, Any]], Optional[SearchCursor], Optional[str]]:
+    """Загружает следующую страницу результатов по курсору сессии."""
+    cursor_data = session.get("cursor")
+    cursor = SearchCursor.from_dict(cursor_data) if cursor_data else None
+    return search_page(session.get("filters") or {}, cursor, page_size=chunk_size)
+
+
 async def send_search_results_chunk(
-    message: Message, uid: str, chunk_size: int = SEARCH_RESULTS_PAGE_SIZE
+    message: Message,
+    uid: str,
+    chunk_size: int = SEARCH_RESULTS_PAGE_SIZE,
+    header: str = "",
+    prefetched: Optional[Tuple[List[Dict[str, Any]], Optional[SearchCursor]]] = None,
 ) -> bool:
     """
-    Отправляет чанк результатов поиска.
+    Отправляет следующую страницу результатов поиска одним-двумя сообщениями.
+    В сессии хранится только курсор, страница загружается по запросу.
+    header выводится в начале страницы, prefetched - уже загруженная страница.
     Возвращает True, если есть ещё результаты.
     """
     session = get_search_session(uid)
-    results = session.get("results") or []
-    offset = session.get("results_offset", 0)
-    total = len(results)
 
-    if offset >= total:
+    if prefetched is None:
+        # wall.get и загрузка постов в индексы блокируют - выполняем вне цикла событий
+        page, next_cursor, error = await asyncio.to_thread(fetch_next_page, session, chunk_size)
+        if error:
+            # Курсор не сдвигаем, чтобы можно было повторить
+            await message.answer(
+                f"Не удалось получить объявления: {error}",
+                keyboard=search_results_keyboard(True, show_subscribe=True),
+            )
+            return True
+    else:
+        page, next_cursor = prefetched
+
+    shown = session.get("results_shown", 0)
+    session["cursor"] = next_cursor.to_dict() if next_cursor else None
+    has_more = next_cursor is not None
+
+    if not page:
+        await message.answer(
+            "Больше подходящих объявлений нет.",
+            keyboard=search_results_keyboard(False, show_subscribe=True),
+        )
         return False
 
-    next_offset = min(total, offset + chunk_size)
+    session["results_shown"] = shown + len(page)
+    if has_more:
+        footer = f"Показал {shown + len(page)}. Продолжить?"
+    else:
+        footer = "Это все подходящие объявления."
 
-    for index in range(offset, next_offset):
-        match = results[index]
-        item = match["item"]
-        text = format_search_result(index + 1, item)
-        post_id = item.get("id")
+    keyboard = search_results_keyboard(has_more, show_subscribe=True)
+    messages = render_results_page(page, shown + 1, footer, keyboard, mode=SEARCH_RESULTS_MODE, header=header)
 
-        if post_id is not None:
-            owner_part = -abs(int(GROUP_ID))
-            attachment = f"wall{owner_part}_{post_id}"
-            await message.answer(text, attachment=attachment)
-        else:
-            await message.answer(text)
+    if messages[0].template:
+        try:
+            await _send_results_message(message, messages[0])
+            messages = messages[1:]
+        except Exception as e:
+            # Карусель не прошла проверку VK (например, пропорции фото) - отправляем вложениями
+            logger.warning("Carousel rejected, falling back to wall attachments: %s", e)
+            messages = render_results_page(page, shown + 1, footer, keyboard, mode=RESULTS_MODE_WALL, header=header)
 
-    session["results_offset"] = next_offset
+    for result_message in messages:
+        await _send_results_message(message, result_message)
 
-    if next_offset < total:
-        await message.answer(
-            f"Показал {next_offset} из {total}. Продолжить?",
-            keyboard=search_results_keyboard(True, show_subscribe=True),
-        )
-        return True
+    return has_more
 
-    await message.answer(
-        "Это все подходящие объявления.",
-        keyboard=search_results_keyboard(False, show_subscribe=True),
-    )
-    return False
+
+async def _send_results_message(message: Message, result_message) -> None:
+    """Отправляет одно сообщение страницы результатов."""
+    params = {}
+    if result_message.attachment:
+        params["attachment"] = result_message.attachment
+    if result_message.template:
+        params["template"] = result_message.template
+    if result_message.keyboard:
+        params["keyboard"] = result_message.keyboard
+    await message.answer(result_message.text, **params)
 
 
 async def run_search_and_reply(message: Message, uid: str, is_subscribed: bool) -> None:
@@ -97,9 +175,13 @@ async def run_search_and_reply(message: Message, uid: str, is_subscribed: bool)
         "price_max": session.get("price_max"),
         "rooms": session.get("rooms"),
         "recent_days": session.get("recent_days"),
+        "keywords": session.get("keywords"),
     }
 
-    matches, error = search_posts(filters)
+    session["filters"] = filters
+    session["cursor"] = None
+    session["results_shown"] = 0
+    matches, next_cursor, error = await asyncio.to_thread(fetch_next_page, session)
 
     if error:
         await message.answer(
@@ -131,14 +213,11 @@ async def run_search_and_reply(message: Message, uid: str, is_subscribed: bool)
         _search_reset(uid)
         return
 
-    session["results"] = matches
-    session["results_offset"] = 0
-
-    total_found = len(matches)
-    await message.answer(f"Нашёл {total_found} подходящих объявлений.")
-
+    header = "\n".join(market_summary(filters) + ["Нашёл подходящие объявления:"])
     has_more = await send_search_results_chunk(
-        message, uid, chunk_size=SEARCH_RESULTS_PAGE_SIZE
+        message, uid, chunk_size=SEARCH_RESULTS_PAGE_SIZE,
+        header=header,
+        prefetched=(matches, next_cursor),
     )
 
     # Увеличиваем счетчик поисков ПОСЛЕ успешного показа результатов
@@ -207,7 +286,8 @@ async def check_subscription_handler(message: Message):
     """Проверка подписки на сообщество."""
     user_id = message.from_id
 
-    is_subscribed = await check_subscription(user_id)
+    # Пользователь мог только что подписаться - проверяем в обход кэша
+    is_subscribed = await check_subscription(user_id, force=True)
 
     if is_subscribed:
         # Сбрасываем счетчик поисков
@@ -246,15 +326,17 @@ async def search_district_handler(message: Message):
         await message.answer("Вы вернулись в меню.", keyboard=main_menu_inline())
         return
 
-    if not validate_search_district(text):
+    districts = parse_search_districts(text)
+    if districts is None:
         await message.answer(
-            "Пожалуйста, выберите район из кнопок или нажмите «Любой».",
+            "Пожалуйста, выберите район из кнопок (можно перечислить несколько через запятую) или нажмите «Любой».",
             keyboard=search_kb_for_state_inline(SearchStates.DISTRICT),
         )
         return
 
     session = get_search_session(uid)
-    session["district"] = None if text == "Любой" else text
+    # Один район хранится строкой, как в подписках до поддержки нескольких
+    session["district"] = (districts[0] if len(districts) == 1 else districts) or None
 
     await bot.state_dispenser.set(peer, SearchStates.PRICE_MIN)
     await prompt_search_state(message, SearchStates.PRICE_MIN)
@@ -373,14 +455,14 @@ async def search_rooms_handler(message: Message):
     if text.lower() in {"", "пропустить"}:
         session["rooms"] = None
     else:
-        value = extract_int(text)
-        if value is None:
+        rooms = parse_rooms(text)
+        if rooms is None:
             await message.answer(
-                "Количество комнат должно быть числом. Попробуйте ещё раз или нажмите «Пропустить».",
+                "Количество комнат должно быть числом (или несколько: 1, 2). Попробуйте ещё раз или нажмите «Пропустить».",
                 keyboard=search_kb_for_state_inline(SearchStates.ROOMS),
             )
             return
-        session["rooms"] = value
+        session["rooms"] = rooms[0] if len(rooms) == 1 else rooms
 
     await bot.state_dispenser.set(peer, SearchStates.RECENT_DAYS)
     await prompt_search_state(message, SearchStates.RECENT_DAYS)
@@ -423,6 +505,44 @@ async def search_recent_days_handler(message: Message):
         )
         return
 
+    await bot.state_dispenser.set(peer, SearchStates.KEYWORDS)
+    await prompt_search_state(message, SearchStates.KEYWORDS)
+
+
+@bot.on.message(state=SearchStates.KEYWORDS)
+async def search_keywords_handler(message: Message):
+    """Обработчик слов для поиска по описанию."""
+    uid = str(message.from_id)
+    peer = message.peer_id
+    text = (message.text or "").strip()
+
+    if text in {"Меню", "Выход"}:
+        _search_reset(uid)
+        try:
+            await bot.state_dispenser.delete(peer)
+        except (KeyError, Exception):
+            pass
+        await message.answer("Вы вернулись в меню.", keyboard=main_menu_inline())
+        return
+
+    if text == "Назад":
+        await bot.state_dispenser.set(peer, SearchStates.RECENT_DAYS)
+        await prompt_search_state(message, SearchStates.RECENT_DAYS)
+        return
+
+    session = get_search_session(uid)
+
+    if text.lower() in {"", "пропустить"}:
+        session["keywords"] = None
+    elif not query_terms(text):
+        await message.answer(
+            "Не нашёл в запросе слов для поиска. Попробуйте другие слова или нажмите «Пропустить».",
+            keyboard=search_kb_for_state_inline(SearchStates.KEYWORDS),
+        )
+        return
+    else:
+        session["keywords"] = text
+
     try:
         await bot.state_dispenser.delete(peer)
     except (KeyError, Exception):
@@ -449,7 +569,7 @@ async def search_results_handler(message: Message):
     text = (message.text or "").strip()
 
     session = search_sessions.get(uid)
-    if not session or not session.get("results"):
+    if not session or not session.get("results_shown"):
         try:
             await bot.state_dispenser.delete(peer)
         except (KeyError, Exception):
@@ -476,7 +596,10 @@ async def search_results_handler(message: Message):
         has_more = await send_search_results_chunk(
             message, uid, chunk_size=SEARCH_RESULTS_PAGE_SIZE
         )
-        if not has_more:
+        if has_more:
+            # Сохраняем новую позицию курсора вместе с состоянием
+            await bot.state_dispenser.set(peer, SearchStates.RESULTS)
+        else:
             try:
                 await bot.state_dispenser.delete(peer)
             except (KeyError, Exception):
@@ -485,7 +608,7 @@ async def search_results_handler(message: Message):
             # _search_reset(uid)
         return
 
-    has_more = session.get("results_offset", 0) < len(session.get("results", []))
+    has_more = session.get("cursor") is not None
     keyboard = search_results_keyboard(has_more, show_subscribe=True)
     await message.answer(
         "Пожалуйста, используйте кнопки для навигации по результатам.", keyboard=keyboard
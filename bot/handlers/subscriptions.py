@@ -4,7 +4,6 @@
 import logging
 import json
 from vkbottle.bot import Message
-from vkbottle import Keyboard, KeyboardButtonColor, Text, Callback
 
 from bot.bot_instance import bot, search_sessions
 from bot.constants import Button, Message as Msg, Format
@@ -12,7 +11,12 @@ from bot.keyboards import (
     main_menu_inline,
     subscriptions_list_keyboard,
     subscription_actions_keyboard,
+    subscription_duplicate_keyboard,
+    subscriptions_select_keyboard,
+    subscription_manage_keyboard,
+    subscription_delete_confirm_keyboard,
 )
+from bot.services.filter_index import format_values
 from bot.states import SearchStates
 from storage import storage
 
@@ -25,7 +29,7 @@ def format_filters(filters: dict) -> str:
 
     district = filters.get("district")
     if district:
-        parts.append(Format.FILTER_DISTRICT.format(district=district))
+        parts.append(Format.FILTER_DISTRICT.format(district=format_values(district)))
     else:
         parts.append(Format.FILTER_DISTRICT_ANY)
 
@@ -45,10 +49,14 @@ def format_filters(filters: dict) -> str:
 
     rooms = filters.get("rooms")
     if rooms:
-        parts.append(Format.FILTER_ROOMS.format(rooms=rooms))
+        parts.append(Format.FILTER_ROOMS.format(rooms=format_values(rooms)))
     else:
         parts.append(Format.FILTER_ROOMS_ANY)
 
+    keywords = filters.get("keywords")
+    if keywords:
+        parts.append(Format.FILTER_KEYWORDS.format(keywords=keywords))
+
     return "\n".join(parts)
 
 
@@ -60,7 +68,7 @@ async def subscribe_to_notifications(message: Message):
 
     # Получаем параметры последнего поиска
     session = search_sessions.get(uid)
-    if not session or not session.get("results"):
+    if not session or not session.get("results_shown"):
         await message.answer(
             Msg.ERROR_NO_SEARCH,
             keyboard=main_menu_inline(),
@@ -73,33 +81,29 @@ async def subscribe_to_notifications(message: Message):
         "price_min": session.get("price_min"),
         "price_max": session.get("price_max"),
         "rooms": session.get("rooms"),
+        "keywords": session.get("keywords"),
     }
 
-    # Проверяем на дубликаты
-    existing_subs = storage.get_user_subscriptions(user_id)
-    for existing_sub in existing_subs:
-        if existing_sub.get("filters") == filters:
-            # Создаём клавиатуру для дублирующей подписки
-            kb = Keyboard(inline=True)
-            kb.add(Text(Button.MY_SUBSCRIPTIONS), color=KeyboardButtonColor.PRIMARY)
-            kb.add(Text(Button.MENU), color=KeyboardButtonColor.SECONDARY)
+    # Проверка дубликата и создание подписки атомарны для пользователя
+    async with storage.user_lock(user_id):
+        existing_subs = storage.get_user_subscriptions(user_id)
+        is_duplicate = any(existing_sub.get("filters") == filters for existing_sub in existing_subs)
 
-            await message.answer(
-                Msg.SUBSCRIPTION_DUPLICATE,
-                keyboard=kb.get_json(),
-            )
-            return
+        # Создаём подписку
+        sub_id = None if is_duplicate else storage.add_subscription(user_id, filters)
 
-    # Создаём подписку
-    sub_id = storage.add_subscription(user_id, filters)
+    if is_duplicate:
+        await message.answer(
+            Msg.SUBSCRIPTION_DUPLICATE,
+            keyboard=subscription_duplicate_keyboard(),
+        )
+        return
 
     filter_text = format_filters(filters)
 
     # Проверяем, есть ли еще результаты для показа
     from bot.keyboards import search_results_keyboard
-    current_offset = session.get("offset", 0)
-    total_results = len(session.get("results", []))
-    has_more = current_offset < total_results
+    has_more = session.get("cursor") is not None
 
     await message.answer(
         f"{Msg.SUBSCRIPTION_CREATED}\n\n{Msg.SUBSCRIPTION_INFO.format(filters=filter_text)}",
@@ -133,22 +137,9 @@ async def show_subscriptions(message: Message):
         text += f"ID: {sub['id']}\n"
         text += f"{filter_text}\n\n"
 
-    # Создаём клавиатуру с кнопками для каждой подписки
-    kb = Keyboard(inline=True)
-
-    for idx, sub in enumerate(subscriptions, 1):
-        is_enabled = sub.get("enabled", True)
-        prefix = Format.SUBSCRIPTION_BUTTON_ACTIVE_PREFIX if is_enabled else Format.SUBSCRIPTION_BUTTON_PAUSED_PREFIX
-        kb.add(Text(f"{prefix}{idx}"))
-        if idx % 2 == 0:
-            kb.row()
-
-    if len(subscriptions) % 2 != 0:
-        kb.row()
-
-    kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
-
-    await message.answer(text, keyboard=kb.get_json())
+    # Клавиатура с кнопками для каждой подписки
+    statuses = tuple(bool(sub.get("enabled", True)) for sub in subscriptions)
+    await message.answer(text, keyboard=subscriptions_select_keyboard(statuses))
 
 
 @bot.on.message(text=Button.BACK_TO_SUBSCRIPTIONS)
@@ -201,13 +192,9 @@ async def delete_subscription_handler(message: Message):
         return
 
     # Показываем подтверждение
-    kb = Keyboard(inline=True)
-    kb.add(Text(Button.CONFIRM_DELETE), color=KeyboardButtonColor.NEGATIVE)
-    kb.add(Text(Button.CANCEL), color=KeyboardButtonColor.SECONDARY)
-
     await message.answer(
         Msg.SUBSCRIPTION_DELETE_CONFIRM,
-        keyboard=kb.get_json(),
+        keyboard=subscription_delete_confirm_keyboard(),
     )
 
 
@@ -308,18 +295,6 @@ async def select_subscription_handler(message: Message):
         f"Выберите действие:"
     )
 
-    # Создаём клавиатуру с действиями
-    kb = Keyboard(inline=True)
-
-    if is_enabled:
-        kb.add(Text(Button.TOGGLE_DISABLE))
-    else:
-        kb.add(Text(Button.TOGGLE_ENABLE), color=KeyboardButtonColor.POSITIVE)
-
-    kb.add(Text(Button.DELETE), color=KeyboardButtonColor.NEGATIVE)
-    kb.row()
-    kb.add(Text(Button.BACK_TO_SUBSCRIPTIONS), color=KeyboardButtonColor.PRIMARY)
-
-    await message.answer(response_text, keyboard=kb.get_json())
+    await message.answer(response_text, keyboard=subscription_manage_keyboard(is_enabled))
 
 
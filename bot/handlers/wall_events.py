@@ -8,8 +8,9 @@ from vkbottle.bot import Message
 from vkbottle import GroupEventType
 
 from bot.bot_instance import bot
+from bot.services.ingest import ingest_post, remove_post
 from bot.services.search import parse_post_text
-from bot.services.notifications import match_post_with_filters, send_notification
+from bot.services.notifications import send_notification, subscription_matcher
 from storage import storage
 
 logger = logging.getLogger("wall_events")
@@ -28,6 +29,11 @@ async def wall_post_new_handler(event: dict):
 
         logger.info("New wall post detected: ID=%s", post_id)
 
+        # Опубликованный отложенный пост получает новый ID
+        if obj.get("postponed_id"):
+            remove_post(obj["postponed_id"])
+        ingest_post(obj)
+
         # Парсим пост
         parsed = parse_post_text(text)
         if not parsed:
@@ -36,16 +42,14 @@ async def wall_post_new_handler(event: dict):
 
         logger.info("Post %s parsed successfully: %s", post_id, parsed)
 
-        # Получаем все активные подписки
-        active_subs = storage.get_all_active_subscriptions()
-        if not active_subs:
+        if not subscription_matcher.count():
             logger.info("No active subscriptions, skipping notifications")
             return
 
         notifications_sent = 0
 
-        # Проверяем каждую подписку
-        for user_id, subscription in active_subs:
+        # Подписки, которым подходит пост
+        for user_id, subscription in subscription_matcher.matching(parsed, text):
             filters = subscription.get("filters", {})
             sub_id = subscription.get("id")
             last_notified = subscription.get("last_notified_post_id")
@@ -54,28 +58,26 @@ async def wall_post_new_handler(event: dict):
             if last_notified is not None and post_id <= last_notified:
                 continue
 
-            # Проверяем соответствие фильтрам
-            if match_post_with_filters(parsed, filters):
-                # Формируем объект поста для отправки
-                post_obj = {
-                    "id": post_id,
-                    "text": text,
-                }
-
-                success = await send_notification(user_id, post_obj, filters)
-                if success:
-                    notifications_sent += 1
-                    # Обновляем ID последнего отправленного поста для этой подписки
-                    storage.update_subscription_last_notified_post(user_id, sub_id, post_id)
-                    logger.info(
-                        "Sent notification to user %s for post %s (subscription %s)",
-                        user_id,
-                        post_id,
-                        sub_id,
-                    )
-
-                # Небольшая задержка между отправками
-                await asyncio.sleep(0.5)
+            # Формируем объект поста для отправки
+            post_obj = {
+                "id": post_id,
+                "text": text,
+            }
+
+            success = await send_notification(user_id, post_obj, filters)
+            if success:
+                notifications_sent += 1
+                # Обновляем ID последнего отправленного поста для этой подписки
+                storage.update_subscription_last_notified_post(user_id, sub_id, post_id)
+                logger.info(
+                    "Sent notification to user %s for post %s (subscription %s)",
+                    user_id,
+                    post_id,
+                    sub_id,
+                )
+
+            # Небольшая задержка между отправками
+            await asyncio.sleep(0.5)
 
         logger.info("Processed post %s: sent %d notifications", post_id, notifications_sent)
 
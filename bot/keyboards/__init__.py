@@ -1,27 +1,50 @@
 """Клавиатуры бота."""
+from .registry import keyboard, registered_keyboards, warm_up, clear_cache
 from .menu import main_menu_inline, subscription_keyboard
 from .rent import (
     district_keyboard_inline,
     kb_for_state_inline,
     kb_preview_inline,
     kb_photos_inline,
+    kb_duplicate_inline,
 )
 from .search import (
     search_kb_for_state_inline,
     search_results_keyboard,
     subscriptions_list_keyboard,
     subscription_actions_keyboard,
+    subscription_duplicate_keyboard,
+    subscriptions_select_keyboard,
+    subscription_manage_keyboard,
+    subscription_delete_confirm_keyboard,
+)
+from .contract import (
+    contract_cancel_keyboard,
+    contract_result_keyboard,
+    contract_retry_keyboard,
 )
 
 __all__ = [
+    "keyboard",
+    "registered_keyboards",
+    "warm_up",
+    "clear_cache",
     "main_menu_inline",
     "subscription_keyboard",
     "district_keyboard_inline",
     "kb_for_state_inline",
     "kb_preview_inline",
     "kb_photos_inline",
+    "kb_duplicate_inline",
     "search_kb_for_state_inline",
     "search_results_keyboard",
     "subscriptions_list_keyboard",
     "subscription_actions_keyboard",
+    "subscription_duplicate_keyboard",
+    "subscriptions_select_keyboard",
+    "subscription_manage_keyboard",
+    "subscription_delete_confirm_keyboard",
+    "contract_cancel_keyboard",
+    "contract_result_keyboard",
+    "contract_retry_keyboard",
 ]
@@ -0,0 +1,40 @@
+"""
+Клавиатуры для проверки договоров.
+"""
+from vkbottle import Keyboard, KeyboardButtonColor, Text
+from bot.constants import Button
+from bot.keyboards.registry import keyboard
+
+
+@keyboard
+def contract_cancel_keyboard() -> str:
+    """Клавиатура ожидания документа с кнопкой отмены."""
+    kb = Keyboard(inline=True)
+    kb.add(Text(Button.CANCEL), color=KeyboardButtonColor.NEGATIVE)
+    return kb.get_json()
+
+
+@keyboard(
+    key=lambda deep_check=False: bool(deep_check),
+    variants=[(False,), (True,)],
+)
+def contract_result_keyboard(deep_check: bool = False) -> str:
+    """Клавиатура под результатом проверки."""
+    kb = Keyboard(inline=True)
+    if deep_check:
+        kb.add(Text(Button.DEEP_CHECK_CONTRACT), color=KeyboardButtonColor.PRIMARY)
+        kb.row()
+    kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
+    kb.row()
+    kb.add(Text(Button.MENU), color=KeyboardButtonColor.PRIMARY)
+    return kb.get_json()
+
+
+@keyboard
+def contract_retry_keyboard() -> str:
+    """Клавиатура после ошибки проверки: повторить или выйти в меню."""
+    kb = Keyboard(inline=True)
+    kb.add(Text(Button.CHECK_CONTRACT), color=KeyboardButtonColor.POSITIVE)
+    kb.row()
+    kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
+    return kb.get_json()
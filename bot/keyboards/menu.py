@@ -3,8 +3,10 @@
 """
 from vkbottle import Keyboard, KeyboardButtonColor, Text
 from bot.constants import Button
+from bot.keyboards.registry import keyboard
 
 
+@keyboard
 def main_menu_inline() -> str:
     """Главное меню бота."""
     kb = Keyboard(inline=True)
@@ -19,6 +21,7 @@ def main_menu_inline() -> str:
     return kb.get_json()
 
 
+@keyboard
 def subscription_keyboard() -> str:
     """Клавиатура с кнопкой подписки."""
     kb = Keyboard(inline=True)
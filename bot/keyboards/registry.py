@@ -0,0 +1,115 @@
+"""
+Реестр клавиатур с кэшированием готового JSON.
+Клавиатуры бота почти не меняются, поэтому каждая собирается один раз
+(статические - при запуске) и дальше отдается готовой строкой.
+"""
+import functools
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Зарегистрированные построители клавиатур: имя -> обертка с кэшем
+_registry: Dict[str, Callable[..., str]] = {}
+# Варианты аргументов, которые собираются заранее при запуске
+_variants: Dict[str, List[Tuple[tuple, dict]]] = {}
+
+
+def _default_key(args: tuple, kwargs: dict) -> Hashable:
+    """Ключ кэша по аргументам вызова."""
+    return args, frozenset(kwargs.items())
+
+
+def keyboard(
+    func: Optional[Callable[..., str]] = None,
+    *,
+    key: Optional[Callable[..., Hashable]] = None,
+    variants: Iterable[Any] = ((),),
+):
+    """
+    Регистрирует построитель клавиатуры и кэширует результат по аргументам.
+
+    Построитель должен быть чистой функцией: одинаковые аргументы -
+    одинаковая клавиатура.
+
+    Args:
+        func: Функция, возвращающая JSON клавиатуры
+        key: Функция ключа кэша с той же сигнатурой (для нехэшируемых
+             или не влияющих на клавиатуру аргументов)
+        variants: Аргументы для предварительной сборки при запуске:
+                  кортеж позиционных аргументов или словарь именованных
+
+    Пример:
+        @keyboard(variants=[(False,), (True,)])
+        def kb_photos_inline(editing: bool = False) -> str: ...
+    """
+    def decorator(builder: Callable[..., str]) -> Callable[..., str]:
+        cache: Dict[Hashable, str] = {}
+        lock = Lock()
+
+        @functools.wraps(builder)
+        def wrapper(*args, **kwargs) -> str:
+            cache_key = key(*args, **kwargs) if key else _default_key(args, kwargs)
+            try:
+                return cache[cache_key]
+            except KeyError:
+                pass
+            except TypeError:
+                # Нехэшируемые аргументы - собираем без кэша
+                return builder(*args, **kwargs)
+
+            result = builder(*args, **kwargs)
+            with lock:
+                cache.setdefault(cache_key, result)
+            return result
+
+        def cache_clear() -> None:
+            """Очищает кэш построителя."""
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_size = lambda: len(cache)
+
+        name = f"{builder.__module__}.{builder.__qualname__}"
+        _registry[name] = wrapper
+        _variants[name] = [
+            (variant, {}) if isinstance(variant, tuple) else ((), dict(variant))
+            for variant in variants
+        ]
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def registered_keyboards() -> Dict[str, Callable[..., str]]:
+    """Возвращает зарегистрированные построители клавиатур."""
+    return dict(_registry)
+
+
+def warm_up() -> int:
+    """
+    Собирает заранее все известные варианты клавиатур.
+
+    Returns:
+        Количество собранных клавиатур
+    """
+    built = 0
+    for name, wrapper in _registry.items():
+        for args, kwargs in _variants[name]:
+            try:
+                wrapper(*args, **kwargs)
+                built += 1
+            except Exception as e:
+                logger.warning("Failed to prebuild keyboard %s%s: %s", name, args, e)
+    logger.info("Prebuilt %d keyboards", built)
+    return built
+
+
+def clear_cache() -> None:
+    """Очищает кэш всех клавиатур."""
+    for wrapper in _registry.values():
+        wrapper.cache_clear()
@@ -2,9 +2,15 @@
 Клавиатуры для создания объявлений об аренде.
 """
 from vkbottle import Keyboard, KeyboardButtonColor, Text
+from bot.constants import Button
 from bot.states import RentStates
+from bot.keyboards.registry import keyboard
 
 
+@keyboard(
+    key=lambda editing=False: bool(editing),
+    variants=[(False,), (True,)],
+)
 def district_keyboard_inline(editing: bool = False) -> str:
     """Клавиатура выбора района."""
     kb = Keyboard(inline=True)
@@ -26,6 +32,16 @@ def district_keyboard_inline(editing: bool = False) -> str:
     return kb.get_json()
 
 
+# Для всех состояний, кроме выбора района, клавиатура одинаковая
+@keyboard(
+    key=lambda state, editing=False: (state == RentStates.DISTRICT, bool(editing)),
+    variants=[
+        (RentStates.DISTRICT, False),
+        (RentStates.DISTRICT, True),
+        (RentStates.ADDRESS, False),
+        (RentStates.ADDRESS, True),
+    ],
+)
 def kb_for_state_inline(state, editing: bool = False) -> str:
     """Универсальная клавиатура для состояния."""
     if state == RentStates.DISTRICT:
@@ -38,6 +54,8 @@ def kb_for_state_inline(state, editing: bool = False) -> str:
     return kb.get_json()
 
 
+# Клавиатура не зависит от содержимого черновика
+@keyboard(key=lambda draft: None, variants=[({},)])
 def kb_preview_inline(draft: dict) -> str:
     """Клавиатура предпросмотра объявления."""
     kb = Keyboard(inline=True)
@@ -58,6 +76,10 @@ def kb_preview_inline(draft: dict) -> str:
     return kb.get_json()
 
 
+@keyboard(
+    key=lambda editing=False: bool(editing),
+    variants=[(False,), (True,)],
+)
 def kb_photos_inline(editing: bool = False) -> str:
     """Клавиатура для загрузки фото."""
     kb = Keyboard(inline=True)
@@ -68,3 +90,15 @@ def kb_photos_inline(editing: bool = False) -> str:
     kb.add(Text(cancel_title), color=KeyboardButtonColor.NEGATIVE)
     kb.add(Text("Меню"), color=KeyboardButtonColor.NEGATIVE)
     return kb.get_json()
+
+
+@keyboard
+def kb_duplicate_inline() -> str:
+    """Клавиатура при найденном похожем объявлении."""
+    kb = Keyboard(inline=True)
+    kb.add(Text(Button.UPDATE_LISTING), color=KeyboardButtonColor.POSITIVE)
+    kb.row()
+    kb.add(Text(Button.SEND_AS_NEW), color=KeyboardButtonColor.SECONDARY)
+    kb.row()
+    kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
+    return kb.get_json()
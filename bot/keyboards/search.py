@@ -1,11 +1,20 @@
 """
 Клавиатуры для поиска объявлений.
 """
+from typing import Tuple
 from vkbottle import Keyboard, KeyboardButtonColor, Text
 from bot.states import SearchStates
-from bot.constants import Button
+from bot.constants import Button, Format
+from bot.keyboards.registry import keyboard
 
+# Состояния поиска со своей клавиатурой, у остальных она общая
+_STATE_KEYBOARDS = (SearchStates.DISTRICT, SearchStates.RECENT_DAYS)
 
+
+@keyboard(
+    key=lambda state: state if state in _STATE_KEYBOARDS else None,
+    variants=[(SearchStates.DISTRICT,), (SearchStates.RECENT_DAYS,), (SearchStates.PRICE_MIN,)],
+)
 def search_kb_for_state_inline(state) -> str:
     """Клавиатура для состояния поиска."""
     if state == SearchStates.DISTRICT:
@@ -45,6 +54,10 @@ def search_kb_for_state_inline(state) -> str:
     return kb.get_json()
 
 
+@keyboard(
+    key=lambda has_more, show_subscribe=False: (bool(has_more), bool(show_subscribe)),
+    variants=[(has_more, subscribe) for has_more in (False, True) for subscribe in (False, True)],
+)
 def search_results_keyboard(has_more: bool, show_subscribe: bool = False) -> str:
     """Клавиатура для результатов поиска."""
     kb = Keyboard(inline=True)
@@ -58,6 +71,7 @@ def search_results_keyboard(has_more: bool, show_subscribe: bool = False) -> str
     return kb.get_json()
 
 
+@keyboard
 def subscriptions_list_keyboard() -> str:
     """Клавиатура для списка подписок."""
     kb = Keyboard(inline=True)
@@ -65,6 +79,10 @@ def subscriptions_list_keyboard() -> str:
     return kb.get_json()
 
 
+@keyboard(
+    key=lambda is_enabled: bool(is_enabled),
+    variants=[(False,), (True,)],
+)
 def subscription_actions_keyboard(is_enabled: bool) -> str:
     """Клавиатура для действий с подпиской."""
     kb = Keyboard(inline=True)
@@ -78,3 +96,63 @@ def subscription_actions_keyboard(is_enabled: bool) -> str:
     kb.row()
     kb.add(Text(Button.BACK), color=KeyboardButtonColor.PRIMARY)
     return kb.get_json()
+
+
+@keyboard
+def subscription_duplicate_keyboard() -> str:
+    """Клавиатура при попытке создать уже существующую подписку."""
+    kb = Keyboard(inline=True)
+    kb.add(Text(Button.MY_SUBSCRIPTIONS), color=KeyboardButtonColor.PRIMARY)
+    kb.add(Text(Button.MENU), color=KeyboardButtonColor.SECONDARY)
+    return kb.get_json()
+
+
+@keyboard(variants=[((True,),), ((False,),)])
+def subscriptions_select_keyboard(statuses: Tuple[bool, ...]) -> str:
+    """
+    Клавиатура выбора подписки из списка.
+
+    Args:
+        statuses: Признаки активности подписок в порядке списка
+    """
+    kb = Keyboard(inline=True)
+
+    for idx, is_enabled in enumerate(statuses, 1):
+        prefix = Format.SUBSCRIPTION_BUTTON_ACTIVE_PREFIX if is_enabled else Format.SUBSCRIPTION_BUTTON_PAUSED_PREFIX
+        kb.add(Text(f"{prefix}{idx}"))
+        if idx % 2 == 0:
+            kb.row()
+
+    if len(statuses) % 2 != 0:
+        kb.row()
+
+    kb.add(Text(Button.MENU), color=KeyboardButtonColor.NEGATIVE)
+    return kb.get_json()
+
+
+@keyboard(
+    key=lambda is_enabled: bool(is_enabled),
+    variants=[(False,), (True,)],
+)
+def subscription_manage_keyboard(is_enabled: bool) -> str:
+    """Клавиатура действий с выбранной подпиской с возвратом к списку."""
+    kb = Keyboard(inline=True)
+
+    if is_enabled:
+        kb.add(Text(Button.TOGGLE_DISABLE))
+    else:
+        kb.add(Text(Button.TOGGLE_ENABLE), color=KeyboardButtonColor.POSITIVE)
+
+    kb.add(Text(Button.DELETE), color=KeyboardButtonColor.NEGATIVE)
+    kb.row()
+    kb.add(Text(Button.BACK_TO_SUBSCRIPTIONS), color=KeyboardButtonColor.PRIMARY)
+    return kb.get_json()
+
+
+@keyboard
+def subscription_delete_confirm_keyboard() -> str:
+    """Клавиатура подтверждения удаления подписки."""
+    kb = Keyboard(inline=True)
+    kb.add(Text(Button.CONFIRM_DELETE), color=KeyboardButtonColor.NEGATIVE)
+    kb.add(Text(Button.CANCEL), color=KeyboardButtonColor.SECONDARY)
+    return kb.get_json()
@@ -1,15 +1,41 @@
 """Сервисы для работы с VK API и бизнес-логикой."""
 from .vk_api import vk_api_call, extract_photo_urls_from_message
-from .post import upload_photos_to_group, send_to_scheduled
-from .subscription import check_subscription
-from .search import search_posts, parse_post_text
+from .post import upload_photo, upload_photos_to_group, send_to_scheduled, edit_post
+from .photo_prefetch import photo_prefetcher
+from .schedule import slot_planner
+from .subscription import check_subscription, update_membership, warm_up_membership
+from .duplicates import listing_index
+from .near_duplicates import near_duplicates
+from .filter_index import post_filters
+from .post_store import post_store
+from .market_stats import market_stats
+from .text_index import text_index
+from .ingest import crawl_wall, ingest_post, remove_post
+from .search import search_posts, search_page, SearchCursor, parse_post_text
 
 __all__ = [
     "vk_api_call",
     "extract_photo_urls_from_message",
+    "upload_photo",
     "upload_photos_to_group",
+    "photo_prefetcher",
+    "slot_planner",
     "send_to_scheduled",
+    "edit_post",
+    "listing_index",
+    "near_duplicates",
+    "post_filters",
+    "post_store",
+    "market_stats",
+    "text_index",
+    "crawl_wall",
+    "ingest_post",
+    "remove_post",
     "check_subscription",
+    "update_membership",
+    "warm_up_membership",
     "search_posts",
+    "search_page",
+    "SearchCursor",
     "parse_post_text",
 ]
@@ -0,0 +1,178 @@
+"""
+Кэш результатов анализа договоров.
+Ключ - хэш нормализованного текста договора и байтов изображений,
+поэтому один и тот же шаблон договора анализируется через API только один раз.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from bot.services.image_preprocessing import ContractImage
+from bot.services.json_writer import DEFAULT_FLUSH_INTERVAL, DeferredJsonWriter
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_contract_text(text: str) -> str:
+    """Нормализует текст договора: регистр и пробелы не влияют на ключ."""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def contract_cache_key(
+    text: str,
+    version: str = "",
+    images: Optional[List[ContractImage]] = None,
+) -> str:
+    """
+    Вычисляет ключ кэша для договора.
+
+    Текст нормализуется, изображения хэшируются по байтам. Версия правил
+    анализа входит в ключ, поэтому после смены правил старые записи не используются.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{version}\0".encode("utf-8"))
+    digest.update(normalize_contract_text(text).encode("utf-8"))
+
+    for image in images or []:
+        digest.update(image.data)
+
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Постоянный кэш сериализованных результатов анализа с TTL и ограничением размера."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int,
+        max_entries: int,
+        version: str = "",
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        """
+        Args:
+            path: Путь к JSON файлу кэша (пустая строка - только в памяти)
+            ttl_seconds: Время жизни записи в секундах
+            max_entries: Максимальное количество записей
+            version: Версия правил анализа (записи других версий не используются)
+            flush_interval: Задержка фоновой записи файла (0 - запись сразу)
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._writer = DeferredJsonWriter(path, self._dump, flush_interval)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Загружает кэш из файла."""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.exception("Error loading analysis cache: %s", e)
+            return {}
+
+    def _dump(self) -> str:
+        """Содержимое файла кэша (снимок под блокировкой)."""
+        with self._lock:
+            return json.dumps(self._entries, ensure_ascii=False)
+
+    def flush(self) -> None:
+        """Записывает кэш в файл."""
+        self._writer.flush()
+
+    def close(self) -> None:
+        """Сохраняет несохраненные изменения (при остановке бота)."""
+        self._writer.close()
+
+    def get(self, text: str, images: Optional[List[ContractImage]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает сохраненный результат анализа для договора.
+
+        Returns:
+            Сериализованный результат или None при промахе
+        """
+        key = contract_cache_key(text, self.version, images)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry["created_at"] <= self.ttl_seconds:
+                entry["used_at"] = now
+                self.hits += 1
+                return entry["result"]
+
+            if entry:
+                # Запись устарела
+                self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        text: str,
+        result: Dict[str, Any],
+        images: Optional[List[ContractImage]] = None,
+    ) -> None:
+        """Сохраняет сериализованный результат анализа."""
+        key = contract_cache_key(text, self.version, images)
+        now = time.time()
+
+        with self._lock:
+            self._entries[key] = {"created_at": now, "used_at": now, "result": result}
+            self._evict(now)
+        # Файл записывается в фоне, а не на каждый результат в обработчике
+        self._writer.mark_dirty()
+
+    def _evict(self, now: float) -> None:
+        """Удаляет устаревшие записи и самые давно использованные сверх лимита."""
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry["created_at"] > self.ttl_seconds
+        ]
+        for key in expired:
+            self._entries.pop(key, None)
+
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            by_usage = sorted(self._entries, key=lambda k: self._entries[k]["used_at"])
+            for key in by_usage[:overflow]:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        with self._lock:
+            self._entries = {}
+        self._writer.mark_dirty()
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля попаданий в кэш."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает статистику кэша."""
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "size": size,
+        }
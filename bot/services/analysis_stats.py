@@ -0,0 +1,90 @@
+"""
+Статистика гибридного анализа договоров.
+Показывает, какая доля договоров передается в LLM, и сколько времени
+и токенов экономят ответы правилами и из кэша.
+"""
+from threading import Lock
+from typing import Any, Dict
+
+# Уровни анализа
+TIER_RULES = "rules"  # ответ правилами без обращения к API
+TIER_CACHE = "cache"  # ответ из кэша результатов AI анализа
+TIER_LLM = "llm"      # запрос к Deepseek API
+TIER_FALLBACK = "fallback"  # AI не ответил (ошибка API или цепь разомкнута) - ответ правилами
+
+
+class TierStats:
+    """Счетчики ответов, задержек и сэкономленных токенов по уровням анализа."""
+
+    def __init__(self, price_per_1k_tokens: float = 0.0):
+        """
+        Args:
+            price_per_1k_tokens: Цена 1000 токенов API (0 - стоимость не считается)
+        """
+        self.price_per_1k_tokens = price_per_1k_tokens
+        self.escalated = 0
+        self.deep_requests = 0
+        self._lock = Lock()
+        self._tiers: Dict[str, Dict[str, float]] = {
+            tier: {"count": 0, "latency": 0.0, "tokens_saved": 0}
+            for tier in (TIER_RULES, TIER_CACHE, TIER_LLM, TIER_FALLBACK)
+        }
+
+    def record(self, tier: str, latency: float, tokens_saved: int = 0) -> None:
+        """
+        Учитывает ответ уровня tier.
+
+        Args:
+            tier: Уровень, который дал ответ
+            latency: Время ответа в секундах
+            tokens_saved: Оценка токенов, не отправленных в API
+        """
+        with self._lock:
+            counters = self._tiers[tier]
+            counters["count"] += 1
+            counters["latency"] += latency
+            counters["tokens_saved"] += tokens_saved
+
+    def record_escalation(self, deep: bool = False) -> None:
+        """Учитывает передачу договора в LLM (deep - по запросу пользователя)."""
+        with self._lock:
+            if deep:
+                self.deep_requests += 1
+            else:
+                self.escalated += 1
+
+    def avg_latency(self, tier: str) -> float:
+        """Среднее время ответа уровня в секундах."""
+        counters = self._tiers[tier]
+        return counters["latency"] / counters["count"] if counters["count"] else 0.0
+
+    @property
+    def escalation_rate(self) -> float:
+        """Доля договоров, которые правила не смогли оценить уверенно."""
+        decided = self._tiers[TIER_RULES]["count"] + self.escalated
+        return self.escalated / decided if decided else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает статистику по уровням."""
+        with self._lock:
+            llm_latency = self.avg_latency(TIER_LLM)
+            tiers = {}
+            for tier, counters in self._tiers.items():
+                saved_latency = 0.0
+                # Резервный ответ правилами получен после неудачного обращения к API - ничего не экономит
+                if tier not in (TIER_LLM, TIER_FALLBACK) and llm_latency:
+                    saved_latency = max(0.0, llm_latency - self.avg_latency(tier)) * counters["count"]
+                tiers[tier] = {
+                    "count": int(counters["count"]),
+                    "avg_latency_ms": round(self.avg_latency(tier) * 1000, 1),
+                    "latency_saved_s": round(saved_latency, 1),
+                    "tokens_saved": int(counters["tokens_saved"]),
+                    "cost_saved": round(counters["tokens_saved"] / 1000 * self.price_per_1k_tokens, 4),
+                }
+
+            return {
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalation_rate, 3),
+                "deep_requests": self.deep_requests,
+                "tiers": tiers,
+            }
@@ -2,13 +2,22 @@
 Сервис для анализа договоров аренды с использованием Deepseek AI.
 """
 import os
+import re
 import json
+import asyncio
 import logging
-import requests
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 
+from bot.services.analysis_cache import AnalysisCache
+from bot.services.analysis_stats import TIER_CACHE, TIER_FALLBACK, TIER_LLM, TIER_RULES, TierStats
+from bot.services.contract_chunker import chunk_contract
+from bot.services.contract_rules import RULE_ISSUE, RULE_POSITIVE, RULE_TERM, RuleEngine, RulePackManager
+from bot.services.deepseek_client import CircuitBreaker, DeepseekClient, DeepseekError
+from bot.services.image_preprocessing import ContractImage
+
 
 class RiskLevel(Enum):
     """Уровни риска."""
@@ -17,6 +26,10 @@ class RiskLevel(Enum):
     HIGH = "high"
 
 
+# Порядок уровней риска для сравнения
+RISK_ORDER = {RiskLevel.LOW: 0, RiskLevel.MEDIUM: 1, RiskLevel.HIGH: 2}
+
+
 @dataclass
 class ContractIssue:
     """Проблема в договоре."""
@@ -25,6 +38,7 @@ class ContractIssue:
     risk_level: RiskLevel
     section: Optional[str] = None
     recommendation: Optional[str] = None
+    spans: List[Tuple[int, int]] = field(default_factory=list)  # Найденные фрагменты текста
 
 
 @dataclass
@@ -36,12 +50,187 @@ class ContractAnalysisResult:
     positive_points: List[str]
     recommendations: List[str]
     key_terms: Dict[str, str]  # Ключевые условия (срок, цена, залог и т.д.)
+    tier: str = TIER_LLM  # Кто дал ответ: правила или AI
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализует результат в словарь, пригодный для JSON."""
+        data = asdict(self)
+        data["overall_risk"] = self.overall_risk.value
+        for issue in data["issues"]:
+            issue["risk_level"] = issue["risk_level"].value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ContractAnalysisResult":
+        """Восстанавливает результат из словаря, созданного to_dict()."""
+        issues = [
+            ContractIssue(
+                title=issue["title"],
+                description=issue["description"],
+                risk_level=RiskLevel(issue["risk_level"]),
+                section=issue.get("section"),
+                recommendation=issue.get("recommendation"),
+                spans=[tuple(span) for span in issue.get("spans", [])],
+            )
+            for issue in data.get("issues", [])
+        ]
+        return cls(
+            overall_risk=RiskLevel(data["overall_risk"]),
+            summary=data["summary"],
+            issues=issues,
+            positive_points=list(data.get("positive_points", [])),
+            recommendations=list(data.get("recommendations", [])),
+            key_terms=dict(data.get("key_terms", {})),
+            tier=data.get("tier", TIER_LLM),
+        )
+
+
+@dataclass
+class AnalysisUpdate:
+    """Промежуточный результат потокового анализа."""
+    kind: str  # "summary", "issue" или "result"
+    overall_risk: Optional[RiskLevel] = None
+    summary: Optional[str] = None
+    issue: Optional[ContractIssue] = None
+    result: Optional[ContractAnalysisResult] = None
+    streamed: bool = False  # Итог собран из потока, резюме и проблемы уже отданы
+    interrupted: bool = False  # Поток AI прервался после части проблем, итог - проверка правилами
+
+
+def _issue_key(issue: ContractIssue) -> str:
+    """Ключ для поиска дубликатов проблем из разных фрагментов договора."""
+    return re.sub(r'\W+', ' ', issue.title.lower()).strip()
+
+
+def _unique(items: List[str]) -> List[str]:
+    """Убирает повторы, сохраняя порядок."""
+    seen = set()
+    result = []
+    for item in items:
+        key = item.strip().lower()
+        if key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result
+
+
+def _issue_from_dict(issue_data: Dict[str, Any]) -> ContractIssue:
+    """Создает ContractIssue из словаря ответа AI."""
+    return ContractIssue(
+        title=issue_data.get('title', 'Неизвестная проблема'),
+        description=issue_data.get('description', ''),
+        risk_level=RiskLevel(issue_data.get('risk_level', 'medium')),
+        section=issue_data.get('section'),
+        recommendation=issue_data.get('recommendation')
+    )
+
+
+class StreamingResponseParser:
+    """
+    Инкрементальный разбор JSON ответа AI.
+
+    Отдает резюме и каждую проблему из массива issues, как только
+    соответствующий фрагмент JSON пришел полностью.
+    """
+
+    SUMMARY_PATTERN = re.compile(r'"summary"\s*:\s*"((?:[^"\\]|\\.)*)"')
+    RISK_PATTERN = re.compile(r'"overall_risk"\s*:\s*"(\w+)"')
+    ISSUES_PATTERN = re.compile(r'"issues"\s*:\s*\[')
+
+    def __init__(self):
+        self.buffer = ""
+        self._summary_sent = False
+        self._scan_pos: Optional[int] = None  # Позиция сканирования массива issues
+        self._issues_done = False
+        self._depth = 0
+        self._obj_start: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[AnalysisUpdate]:
+        """Добавляет фрагмент ответа и возвращает новые готовые части."""
+        self.buffer += chunk
+        updates: List[AnalysisUpdate] = []
+
+        if not self._summary_sent:
+            match = self.SUMMARY_PATTERN.search(self.buffer)
+            if match:
+                self._summary_sent = True
+                updates.append(AnalysisUpdate(
+                    kind="summary",
+                    overall_risk=self._parse_risk(),
+                    summary=json.loads(f'"{match.group(1)}"'),
+                ))
+
+        if self._scan_pos is None:
+            match = self.ISSUES_PATTERN.search(self.buffer)
+            if match:
+                self._scan_pos = match.end()
+
+        if self._scan_pos is not None and not self._issues_done:
+            updates.extend(self._scan_issues())
+
+        return updates
+
+    def _parse_risk(self) -> Optional[RiskLevel]:
+        """Извлекает общий уровень риска, если он уже пришел."""
+        match = self.RISK_PATTERN.search(self.buffer)
+        if not match:
+            return None
+        try:
+            return RiskLevel(match.group(1))
+        except ValueError:
+            return None
+
+    def _scan_issues(self) -> List[AnalysisUpdate]:
+        """Сканирует новые символы массива issues и отдает закрытые объекты."""
+        updates: List[AnalysisUpdate] = []
+        buffer = self.buffer
+        pos = self._scan_pos
+
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self._obj_start = pos
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    try:
+                        issue = _issue_from_dict(json.loads(buffer[self._obj_start:pos + 1]))
+                        updates.append(AnalysisUpdate(kind="issue", issue=issue))
+                    except (ValueError, AttributeError):
+                        pass
+                    self._obj_start = None
+            elif ch == ']' and self._depth == 0:
+                self._issues_done = True
+                pos += 1
+                break
+            pos += 1
+
+        self._scan_pos = pos
+        return updates
 
 
 class ContractAnalyzer:
     """Анализатор договоров аренды с использованием Deepseek API."""
 
-    DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+    DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
+
+    # Примерное число символов русского текста на один токен
+    CHARS_PER_TOKEN = 3
+    # Максимум изображений в одном запросе к мультимодальной модели
+    MAX_IMAGES = 5
 
     def __init__(self):
         """Инициализация анализатора."""
@@ -52,99 +241,458 @@ class ContractAnalyzer:
         if not self.api_key:
             self.logger.warning("DEEPSEEK_API_KEY не установлен. Будет использоваться анализ на основе правил.")
 
-    async def analyze_contract(self, text: str) -> ContractAnalysisResult:
+        # Асинхронный клиент с пулом соединений, повторами и circuit breaker
+        self.client = DeepseekClient(
+            api_key=self.api_key or "",
+            url=self.DEEPSEEK_API_URL,
+            timeout=float(os.getenv('DEEPSEEK_TIMEOUT', '30')),
+            max_concurrency=int(os.getenv('DEEPSEEK_MAX_CONCURRENCY', '4')),
+            max_retries=int(os.getenv('DEEPSEEK_MAX_RETRIES', '3')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('DEEPSEEK_BREAKER_FAILURES', '5')),
+                reset_timeout=float(os.getenv('DEEPSEEK_BREAKER_RESET', '60')),
+            ),
+        )
+
+        # Длинные договоры делятся на фрагменты такого размера и анализируются параллельно
+        self.chunk_chars = int(os.getenv('CONTRACT_CHUNK_CHARS', '5000'))
+
+        # Потоковая выдача результатов (резюме и первые проблемы приходят раньше)
+        self.stream_enabled = os.getenv('DEEPSEEK_STREAM', '1') == '1'
+
+        # Правила анализа без AI: компилируются один раз и перечитываются при изменении файла
+        self.rule_packs = RulePackManager(
+            path=os.getenv('CONTRACT_RULES_FILE', 'contract_rules.json'),
+            check_interval=float(os.getenv('CONTRACT_RULES_CHECK_INTERVAL', '5')),
+        )
+
+        # Кэш результатов AI анализа (одинаковые шаблоны договоров не отправляются повторно)
+        self.cache = AnalysisCache(
+            path=os.getenv('CONTRACT_CACHE_FILE', 'contract_cache.json'),
+            ttl_seconds=int(os.getenv('CONTRACT_CACHE_TTL', str(30 * 24 * 60 * 60))),
+            max_entries=int(os.getenv('CONTRACT_CACHE_MAX_ENTRIES', '500')),
+            version=self.rule_packs.version,
+        )
+
+        # Гибридный режим: уверенные оценки правил отдаются сразу, в AI идут только спорные договоры
+        self.hybrid = os.getenv('CONTRACT_ANALYSIS_MODE', 'hybrid') == 'hybrid'
+        self.hybrid_low_positives = int(os.getenv('CONTRACT_HYBRID_LOW_POSITIVES', '2'))
+        self.stats = TierStats(price_per_1k_tokens=float(os.getenv('DEEPSEEK_PRICE_PER_1K_TOKENS', '0')))
+
+    @property
+    def can_escalate(self) -> bool:
+        """Можно запросить глубокую проверку через AI."""
+        return bool(self.api_key) and self.client.available
+
+    async def analyze_contract(
+        self,
+        text: str,
+        deep: bool = False,
+        images: Optional[List[ContractImage]] = None,
+    ) -> ContractAnalysisResult:
         """
         Анализирует текст договора.
 
         Args:
             text: Текст договора
+            deep: Пропустить быструю оценку правилами и сразу проверить через AI
+            images: Изображения договора (фотографии без OCR)
 
         Returns:
             Результат анализа
         """
-        # Если есть API ключ, используем Deepseek
-        if self.api_key:
-            return await self._analyze_with_deepseek(text)
-        else:
-            # Используем встроенный анализ на основе правил
+        self._current_rules()
+
+        # Без API ключа используем встроенный анализ на основе правил
+        if not self.api_key:
             return await self._analyze_with_rules(text)
 
-    async def _analyze_with_deepseek(self, text: str) -> ContractAnalysisResult:
-        """Анализ с использованием Deepseek API."""
-        try:
-            # Проверяем, есть ли изображения в тексте
-            if "[IMAGE:" in text:
-                # Если есть изображения, используем мультимодальную модель Deepseek
-                messages = self._prepare_multimodal_messages(text)
-                model = "deepseek-vision"  # Модель для обработки изображений
-            else:
-                # Для текста используем обычную модель
-                prompt = self._create_analysis_prompt(text)
-                messages = [
-                    {
-                        "role": "system",
-                        "content": "Ты опытный юридический эксперт по договорам аренды жилья в России. Твоя задача - анализировать договоры и находить потенциальные риски для арендатора."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-                model = "deepseek-chat"
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+        started = time.monotonic()
+        quick = await self._rules_tier(text, deep, images)
+        if quick is not None:
+            return quick
+
+        cached = self.cache.get(text, images)
+        if cached is not None:
+            self.logger.info(f"Результат анализа взят из кэша (hit rate: {self.cache.hit_rate:.0%})")
+            self._record_tier(TIER_CACHE, started, text)
+            return ContractAnalysisResult.from_dict(cached)
+        if not self.client.available:
+            self.logger.warning("Deepseek API деградировал, используется анализ на основе правил")
+            analysis = await self._analyze_with_rules(text)
+            self._record_tier(TIER_FALLBACK, started)
+            return analysis
+
+        analysis = await self._analyze_with_deepseek(text, images)
+        # При ошибке API _analyze_with_deepseek отвечает правилами
+        self._record_tier(TIER_LLM if analysis.tier == TIER_LLM else TIER_FALLBACK, started)
+        return analysis
+
+    async def analyze_contract_stream(
+        self,
+        text: str,
+        deep: bool = False,
+        images: Optional[List[ContractImage]] = None,
+    ) -> AsyncIterator[AnalysisUpdate]:
+        """
+        Анализирует договор в потоковом режиме.
 
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.3,
-                "max_tokens": 4000,
-                "stream": False
-            }
+        Резюме и проблемы отдаются по мере получения ответа AI,
+        последним всегда приходит обновление kind="result".
+
+        Args:
+            text: Текст договора
+            deep: Пропустить быструю оценку правилами и сразу проверить через AI
+            images: Изображения договора (фотографии без OCR)
+
+        Yields:
+            Промежуточные и итоговый результаты анализа
+        """
+        if not self.api_key or not self.stream_enabled:
+            yield AnalysisUpdate(kind="result", result=await self.analyze_contract(text, deep, images))
+            return
+
+        self._current_rules()
+        started = time.monotonic()
+        quick = await self._rules_tier(text, deep, images)
+        if quick is not None:
+            yield AnalysisUpdate(kind="result", result=quick)
+            return
+
+        cached = self.cache.get(text, images)
+        if cached is not None:
+            self.logger.info(f"Результат анализа взят из кэша (hit rate: {self.cache.hit_rate:.0%})")
+            self._record_tier(TIER_CACHE, started, text)
+            yield AnalysisUpdate(kind="result", result=ContractAnalysisResult.from_dict(cached))
+            return
+
+        if not self.client.available:
+            self.logger.warning("Deepseek API деградировал, используется анализ на основе правил")
+            result = await self._analyze_with_rules(text)
+            self._record_tier(TIER_FALLBACK, started)
+            yield AnalysisUpdate(kind="result", result=result)
+            return
+
+        tier = TIER_LLM
+        async for update in self._stream_from_deepseek(text, images):
+            if update.kind == "result" and update.result.tier != TIER_LLM:
+                tier = TIER_FALLBACK
+            yield update
+        self._record_tier(tier, started)
+
+    async def _stream_from_deepseek(
+        self,
+        text: str,
+        images: Optional[List[ContractImage]] = None,
+    ) -> AsyncIterator[AnalysisUpdate]:
+        """Потоковый анализ через Deepseek API (с разбиением длинных договоров)."""
+        if self._needs_chunking(text, images):
+            async for update in self._analyze_chunked_stream(text):
+                yield update
+            return
+
+        parser = StreamingResponseParser()
+        streamed = False
 
-            response = requests.post(
-                self.DEEPSEEK_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=30
+        try:
+            async for chunk in self.client.chat_stream(self._build_payload(text, images=images)):
+                for update in parser.feed(chunk):
+                    streamed = True
+                    yield update
+        except Exception as e:
+            self.logger.error(f"Ошибка потокового ответа Deepseek API: {e}")
+            yield AnalysisUpdate(
+                kind="result", result=await self._analyze_with_rules(text), interrupted=streamed
             )
+            return
+
+        analysis = self._try_parse_ai_response(parser.buffer)
+        if analysis is None:
+            analysis = self._unparsed_result()
+        else:
+            self.cache.put(text, analysis.to_dict(), images)
+
+        yield AnalysisUpdate(kind="result", result=analysis, streamed=streamed)
+
+    async def _rules_tier(
+        self,
+        text: str,
+        deep: bool,
+        images: Optional[List[ContractImage]] = None,
+    ) -> Optional[ContractAnalysisResult]:
+        """
+        Быстрая оценка правилами в гибридном режиме.
 
-            if response.status_code == 200:
-                result = response.json()
-                content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-                return self._parse_ai_response(content)
+        Returns:
+            Результат правил, если договор однозначно низкого или высокого риска,
+            иначе None - договор нужно передать в AI
+        """
+        if not self.hybrid:
+            return None
+        if deep:
+            self.stats.record_escalation(deep=True)
+            return None
+
+        started = time.monotonic()
+        result = await self._analyze_with_rules(text)
+        if self._is_confident(result, images):
+            self._record_tier(TIER_RULES, started, text)
+            return result
+
+        self.stats.record_escalation()
+        return None
+
+    def _is_confident(self, result: ContractAnalysisResult, images: Optional[List[ContractImage]] = None) -> bool:
+        """Правила уверенно оценили договор (явно высокий или явно низкий риск)."""
+        if images:
+            # Правила не видят содержимое изображений
+            return False
+
+        if result.overall_risk == RiskLevel.HIGH:
+            return True
+        # Низкий риск считаем надежным, только если правила не нашли ни одной проблемы
+        return not result.issues and len(result.positive_points) >= self.hybrid_low_positives
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Оценка числа токенов запроса к API для текста договора."""
+        return int((len(text) + len(self._get_analysis_instructions())) / self.CHARS_PER_TOKEN)
+
+    def _record_tier(self, tier: str, started: float, text: Optional[str] = None) -> None:
+        """Учитывает ответ уровня tier в статистике гибридного анализа."""
+        tokens_saved = self._estimate_tokens(text) if text is not None and tier in (TIER_RULES, TIER_CACHE) else 0
+        self.stats.record(tier, time.monotonic() - started, tokens_saved)
+
+        stats = self.stats.stats()
+        self.logger.info(
+            f"Ответ уровня {tier}: в AI передано {stats['escalation_rate']:.0%} договоров, "
+            f"сэкономлено {stats['tiers'][tier]['latency_saved_s']} с и {stats['tiers'][tier]['tokens_saved']} токенов"
+        )
+
+    def _build_payload(
+        self,
+        text: str,
+        part: Optional[Tuple[int, int]] = None,
+        images: Optional[List[ContractImage]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Формирует тело запроса к Deepseek API.
+
+        Args:
+            text: Текст договора или его фрагмента
+            part: (номер фрагмента, всего фрагментов) для длинных договоров
+            images: Изображения договора
+        """
+        if images:
+            # Если есть изображения, используем мультимодальную модель Deepseek
+            messages = self._prepare_multimodal_messages(text, images)
+            model = "deepseek-vision"  # Модель для обработки изображений
+        else:
+            # Для текста используем обычную модель
+            if part:
+                prompt = self._create_chunk_prompt(text, *part)
             else:
-                self.logger.error(f"Ошибка Deepseek API: {response.status_code} - {response.text}")
-                return await self._analyze_with_rules(text)
+                prompt = self._create_analysis_prompt(text)
+            messages = [
+                {
+                    "role": "system",
+                    "content": "Ты опытный юридический эксперт по договорам аренды жилья в России. Твоя задача - анализировать договоры и находить потенциальные риски для арендатора."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+            model = "deepseek-chat"
+
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": 4000,
+            "stream": False
+        }
+
+    async def _analyze_with_deepseek(
+        self,
+        text: str,
+        images: Optional[List[ContractImage]] = None,
+    ) -> ContractAnalysisResult:
+        """Анализ с использованием Deepseek API."""
+        if self._needs_chunking(text, images):
+            return await self._analyze_chunked(text)
 
-        except requests.exceptions.Timeout:
-            self.logger.error("Таймаут при обращении к Deepseek API")
+        try:
+            result = await self.client.chat(self._build_payload(text, images=images))
+            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+            analysis = self._try_parse_ai_response(content)
+            if analysis is None:
+                return self._unparsed_result()
+            # Кэшируем только успешно разобранные ответы
+            self.cache.put(text, analysis.to_dict(), images)
+            return analysis
+
+        except DeepseekError as e:
+            self.logger.error(f"Deepseek API недоступен: {e}")
             return await self._analyze_with_rules(text)
         except Exception as e:
             self.logger.error(f"Ошибка Deepseek API: {e}")
             return await self._analyze_with_rules(text)
 
-    def _prepare_multimodal_messages(self, text: str) -> List[Dict]:
+    def _needs_chunking(self, text: str, images: Optional[List[ContractImage]] = None) -> bool:
+        """Договор слишком длинный для одного промпта."""
+        return not images and len(text) > self.chunk_chars
+
+    async def _analyze_chunk(self, chunk: str, index: int, total: int) -> ContractAnalysisResult:
+        """
+        Анализирует один фрагмент договора.
+
+        Raises:
+            DeepseekError: если API недоступен или ответ не удалось разобрать
+        """
+        result = await self.client.chat(self._build_payload(chunk, part=(index, total)))
+        content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+        analysis = self._try_parse_ai_response(content)
+        if analysis is None:
+            raise DeepseekError(f"Не удалось разобрать ответ для фрагмента {index}/{total}")
+        return analysis
+
+    async def _analyze_chunked(self, text: str) -> ContractAnalysisResult:
+        """Параллельно анализирует фрагменты длинного договора и объединяет результаты."""
+        chunks = chunk_contract(text, self.chunk_chars)
+        self.logger.info(f"Договор разбит на {len(chunks)} фрагментов")
+
+        results = await asyncio.gather(
+            *(self._analyze_chunk(chunk, i, len(chunks)) for i, chunk in enumerate(chunks, start=1)),
+            return_exceptions=True,
+        )
+
+        partial = [r for r in results if isinstance(r, ContractAnalysisResult)]
+        for error in results:
+            if isinstance(error, Exception):
+                self.logger.error(f"Ошибка анализа фрагмента: {error}")
+
+        if not partial:
+            return await self._analyze_with_rules(text)
+
+        merged = self._merge_results(partial)
+        # Неполный результат не кэшируем
+        if len(partial) == len(chunks):
+            self.cache.put(text, merged.to_dict())
+        return merged
+
+    async def _analyze_chunked_stream(self, text: str) -> AsyncIterator[AnalysisUpdate]:
+        """Как _analyze_chunked, но отдает новые проблемы по мере готовности фрагментов."""
+        chunks = chunk_contract(text, self.chunk_chars)
+        self.logger.info(f"Договор разбит на {len(chunks)} фрагментов")
+
+        tasks = [
+            asyncio.ensure_future(self._analyze_chunk(chunk, i, len(chunks)))
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+        partial: List[ContractAnalysisResult] = []
+        seen_issues = set()
+        streamed = False
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    chunk_result = await next_done
+                except Exception as e:
+                    self.logger.error(f"Ошибка анализа фрагмента: {e}")
+                    continue
+
+                partial.append(chunk_result)
+                for issue in chunk_result.issues:
+                    key = _issue_key(issue)
+                    if key not in seen_issues:
+                        seen_issues.add(key)
+                        streamed = True
+                        yield AnalysisUpdate(kind="issue", issue=issue)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if not partial:
+            # Проблемы отдаются только из успешных фрагментов - без них поток пуст
+            yield AnalysisUpdate(kind="result", result=await self._analyze_with_rules(text))
+            return
+
+        merged = self._merge_results(partial)
+        if len(partial) == len(chunks):
+            self.cache.put(text, merged.to_dict())
+        yield AnalysisUpdate(kind="result", result=merged, streamed=streamed)
+
+    def _merge_results(self, results: List[ContractAnalysisResult]) -> ContractAnalysisResult:
+        """
+        Объединяет результаты анализа фрагментов.
+
+        Одинаковые проблемы схлопываются (остается вариант с наибольшим риском),
+        общий уровень риска пересчитывается по объединенному списку.
+        """
+        issues_by_key: Dict[str, ContractIssue] = {}
+        key_terms: Dict[str, str] = {}
+        positive_points: List[str] = []
+        recommendations: List[str] = []
+
+        for result in results:
+            for issue in result.issues:
+                key = _issue_key(issue)
+                existing = issues_by_key.get(key)
+                if existing is None or RISK_ORDER[issue.risk_level] > RISK_ORDER[existing.risk_level]:
+                    issues_by_key[key] = issue
+            for term, value in result.key_terms.items():
+                if value and term not in key_terms:
+                    key_terms[term] = value
+            positive_points.extend(result.positive_points)
+            recommendations.extend(result.recommendations)
+
+        issues = list(issues_by_key.values())
+        overall_risk = self._compute_overall_risk(issues)
+        # Резюме берем из самого рискованного фрагмента
+        riskiest = max(results, key=lambda r: RISK_ORDER[r.overall_risk])
+
+        return ContractAnalysisResult(
+            overall_risk=overall_risk,
+            summary=riskiest.summary,
+            issues=issues,
+            positive_points=_unique(positive_points),
+            recommendations=_unique(recommendations),
+            key_terms=key_terms,
+        )
+
+    def _compute_overall_risk(
+        self, issues: List[ContractIssue], weights: Optional[List[int]] = None
+    ) -> RiskLevel:
+        """
+        Определяет общий уровень риска по списку проблем.
+
+        Args:
+            issues: Найденные проблемы
+            weights: Сколько раз учитывать каждую проблему (по умолчанию - один)
+        """
+        weights = weights or [1] * len(issues)
+        high_risk_count = sum(w for issue, w in zip(issues, weights) if issue.risk_level == RiskLevel.HIGH)
+        medium_risk_count = sum(w for issue, w in zip(issues, weights) if issue.risk_level == RiskLevel.MEDIUM)
+
+        if high_risk_count > 2 or (high_risk_count > 0 and medium_risk_count > 3):
+            return RiskLevel.HIGH
+        elif high_risk_count > 0 or medium_risk_count > 2:
+            return RiskLevel.MEDIUM
+        return RiskLevel.LOW
+
+    def _prepare_multimodal_messages(self, text: str, images: List[ContractImage]) -> List[Dict]:
         """
         Подготавливает сообщения для мультимодальной модели Deepseek.
 
         Args:
-            text: Текст с маркерами изображений [IMAGE:base64]
+            text: Текст договора, распознанный из остальных файлов
+            images: Изображения договора
 
         Returns:
             Список сообщений для API
         """
-        import re
-
-        # Извлекаем все изображения из текста
-        image_pattern = r'\[IMAGE:(.*?)\]'
-        images = re.findall(image_pattern, text)
-
-        # Убираем маркеры изображений из текста
-        clean_text = re.sub(image_pattern, '[Изображение договора]', text)
+        # Текст из остальных файлов (например, текстовые страницы PDF) передаем вместе с фотографиями
+        text_part = f"\n\nТекст остальных страниц договора:\n{text}" if text.strip() else ""
 
         # Формируем сообщения с изображениями
         content = [
@@ -155,16 +703,16 @@ class ContractAnalyzer:
 {self._get_analysis_instructions()}
 
 Если на изображениях есть текст, прочитай его и проанализируй.
-Верни результат в формате JSON как указано выше."""
+Верни результат в формате JSON как указано выше.{text_part}"""
             }
         ]
 
         # Добавляем изображения
-        for i, base64_image in enumerate(images[:5]):  # Ограничиваем до 5 изображений
+        for image in images[:self.MAX_IMAGES]:
             content.append({
                 "type": "image_url",
                 "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
+                    "url": image.to_data_url()
                 }
             })
 
@@ -186,6 +734,16 @@ class ContractAnalyzer:
 ДОГОВОР:
 {text[:5000]}  # Ограничиваем размер для экономии токенов
 
+{self._get_analysis_instructions()}"""
+
+    def _create_chunk_prompt(self, text: str, index: int, total: int) -> str:
+        """Создает промпт для анализа одного фрагмента длинного договора."""
+        return f"""Проанализируй фрагмент {index} из {total} договора аренды жилья и найди потенциальные проблемы и подвохи.
+Оценивай только условия этого фрагмента. Не отмечай отсутствие разделов - они могут быть в других фрагментах.
+
+ФРАГМЕНТ ДОГОВОРА:
+{text}
+
 {self._get_analysis_instructions()}"""
 
     def _get_analysis_instructions(self) -> str:
@@ -227,9 +785,12 @@ class ContractAnalyzer:
 
     def _parse_ai_response(self, response: str) -> ContractAnalysisResult:
         """Парсит ответ AI."""
+        return self._try_parse_ai_response(response) or self._unparsed_result()
+
+    def _try_parse_ai_response(self, response: str) -> Optional[ContractAnalysisResult]:
+        """Парсит ответ AI, возвращает None если ответ не удалось разобрать."""
         try:
             # Пытаемся извлечь JSON из ответа
-            import re
             json_match = re.search(r'\{.*\}', response, re.DOTALL)
             if json_match:
                 data = json.loads(json_match.group())
@@ -237,15 +798,7 @@ class ContractAnalyzer:
                 data = json.loads(response)
 
             # Конвертируем в наши структуры данных
-            issues = []
-            for issue_data in data.get('issues', []):
-                issues.append(ContractIssue(
-                    title=issue_data.get('title', 'Неизвестная проблема'),
-                    description=issue_data.get('description', ''),
-                    risk_level=RiskLevel(issue_data.get('risk_level', 'medium')),
-                    section=issue_data.get('section'),
-                    recommendation=issue_data.get('recommendation')
-                ))
+            issues = [_issue_from_dict(issue_data) for issue_data in data.get('issues', [])]
 
             return ContractAnalysisResult(
                 overall_risk=RiskLevel(data.get('overall_risk', 'medium')),
@@ -258,82 +811,60 @@ class ContractAnalyzer:
 
         except Exception as e:
             self.logger.error(f"Ошибка парсинга ответа AI: {e}")
-            # Возвращаем базовый результат
-            return ContractAnalysisResult(
-                overall_risk=RiskLevel.MEDIUM,
-                summary="Не удалось полностью проанализировать договор. Рекомендуется проконсультироваться с юристом.",
-                issues=[],
-                positive_points=[],
-                recommendations=["Обратитесь к юристу для детальной проверки договора"],
-                key_terms={}
-            )
+            return None
+
+    def _unparsed_result(self) -> ContractAnalysisResult:
+        """Базовый результат, когда ответ AI не удалось разобрать."""
+        return ContractAnalysisResult(
+            overall_risk=RiskLevel.MEDIUM,
+            summary="Не удалось полностью проанализировать договор. Рекомендуется проконсультироваться с юристом.",
+            issues=[],
+            positive_points=[],
+            recommendations=["Обратитесь к юристу для детальной проверки договора"],
+            key_terms={}
+        )
+
+    async def close(self) -> None:
+        """Закрывает соединения с Deepseek API и сохраняет кэш результатов."""
+        await self.client.close()
+        self.cache.close()
+
+    def _current_rules(self) -> RuleEngine:
+        """Действующий набор правил; при смене версии кэш перестает отдавать старые результаты."""
+        engine = self.rule_packs.current()
+        if self.cache.version != engine.version:
+            self.logger.info(f"Правила анализа обновлены до версии {engine.version}")
+            self.cache.version = engine.version
+        return engine
 
     async def _analyze_with_rules(self, text: str) -> ContractAnalysisResult:
         """Анализ на основе правил (без AI)."""
-        text_lower = text.lower()
         issues = []
+        risk_weights = []
         positive_points = []
         key_terms = {}
 
-        # Проверка на наличие ключевых разделов
-        required_sections = {
-            'предмет договора': 'Описание арендуемого помещения',
-            'срок аренды': 'Период действия договора',
-            'арендная плата': 'Размер и порядок оплаты',
-            'права и обязанности': 'Права и обязанности сторон',
-            'ответственность сторон': 'Штрафы и неустойки',
-            'расторжение договора': 'Условия прекращения договора'
-        }
-
-        for section, description in required_sections.items():
-            if section not in text_lower:
+        # Все правила применяются за один проход по тексту
+        for match in self._current_rules().evaluate(text):
+            rule = match.rule
+            if rule.kind == RULE_ISSUE:
+                risk_weights.append(match.weight)
                 issues.append(ContractIssue(
-                    title=f"Отсутствует раздел: {description}",
-                    description=f"В договоре не найден важный раздел '{section}'",
-                    risk_level=RiskLevel.MEDIUM,
-                    recommendation="Требуйте добавить этот раздел в договор"
+                    title=rule.title,
+                    description=match.text,
+                    risk_level=RiskLevel(rule.risk_level),
+                    recommendation=rule.recommendation,
+                    spans=match.spans
                 ))
+            elif rule.kind == RULE_POSITIVE:
+                positive_points.append(match.text)
+            elif rule.kind == RULE_TERM:
+                key_terms[rule.key] = match.text
 
-        # Проверка на подозрительные условия
-        suspicious_terms = {
-            'штраф': self._check_penalties,
-            'неустойка': self._check_penalties,
-            'пеня': self._check_penalties,
-            'комиссия': self._check_commissions,
-            'залог': self._check_deposit,
-            'досрочное расторжение': self._check_early_termination,
-            'выселение': self._check_eviction
-        }
-
-        for term, check_func in suspicious_terms.items():
-            if term in text_lower:
-                issue = check_func(text)
-                if issue:
-                    issues.append(issue)
-
-        # Поиск положительных моментов
-        if 'акт приема-передачи' in text_lower:
-            positive_points.append("Предусмотрен акт приема-передачи помещения")
-
-        if 'показания счетчиков' in text_lower:
-            positive_points.append("Фиксируются показания счетчиков")
-
-        if 'форс-мажор' in text_lower or 'обстоятельства непреодолимой силы' in text_lower:
-            positive_points.append("Прописаны форс-мажорные обстоятельства")
-
-        # Извлечение ключевых условий
-        key_terms = self._extract_key_terms(text)
-
-        # Определение общего уровня риска
+        # Определение общего уровня риска. Проблема со штрафами показывается
+        # один раз, но в риске учитывается за каждое слово штраф/неустойка/пеня
         high_risk_count = sum(1 for issue in issues if issue.risk_level == RiskLevel.HIGH)
-        medium_risk_count = sum(1 for issue in issues if issue.risk_level == RiskLevel.MEDIUM)
-
-        if high_risk_count > 2 or (high_risk_count > 0 and medium_risk_count > 3):
-            overall_risk = RiskLevel.HIGH
-        elif high_risk_count > 0 or medium_risk_count > 2:
-            overall_risk = RiskLevel.MEDIUM
-        else:
-            overall_risk = RiskLevel.LOW
+        overall_risk = self._compute_overall_risk(issues, risk_weights)
 
         # Формирование резюме
         if overall_risk == RiskLevel.HIGH:
@@ -361,167 +892,21 @@ class ContractAnalyzer:
             issues=issues,
             positive_points=positive_points,
             recommendations=recommendations,
-            key_terms=key_terms
+            key_terms=key_terms,
+            tier=TIER_RULES
         )
 
-    def _check_penalties(self, text: str) -> Optional[ContractIssue]:
-        """Проверка штрафов и неустоек."""
-        import re
-
-        # Ищем упоминания больших штрафов
-        penalty_patterns = [
-            r'штраф.*?(\d+)\s*(?:%|процент)',
-            r'неустойк.*?(\d+)\s*(?:%|процент)',
-            r'пен.*?(\d+)\s*(?:%|процент)',
-            r'штраф.*?(\d+\s*\d+)\s*(?:руб|₽)',
-            r'неустойк.*?(\d+\s*\d+)\s*(?:руб|₽)'
-        ]
-
-        for pattern in penalty_patterns:
-            matches = re.findall(pattern, text.lower())
-            for match in matches:
-                amount = int(re.sub(r'\D', '', match))
-                if '%' in text and amount > 1:  # Больше 1% в день - подозрительно
-                    return ContractIssue(
-                        title="Завышенные штрафы",
-                        description=f"Обнаружены высокие штрафы/неустойки: {amount}%",
-                        risk_level=RiskLevel.HIGH,
-                        recommendation="Требуйте снизить размер штрафов до разумных пределов (0.1-0.5% в день)"
-                    )
-                elif amount > 50000:  # Фиксированный штраф больше 50000 руб
-                    return ContractIssue(
-                        title="Крупные штрафы",
-                        description=f"Установлены крупные фиксированные штрафы: {amount} руб",
-                        risk_level=RiskLevel.MEDIUM,
-                        recommendation="Обсудите необходимость таких больших штрафов"
-                    )
-
-        return None
-
-    def _check_commissions(self, text: str) -> Optional[ContractIssue]:
-        """Проверка комиссий."""
-        if 'комиссия' in text.lower() and 'агент' not in text.lower():
-            return ContractIssue(
-                title="Дополнительные комиссии",
-                description="В договоре упоминаются комиссии, не связанные с агентским вознаграждением",
-                risk_level=RiskLevel.MEDIUM,
-                recommendation="Уточните все дополнительные платежи"
-            )
-        return None
-
-    def _check_deposit(self, text: str) -> Optional[ContractIssue]:
-        """Проверка условий залога."""
-        text_lower = text.lower()
-
-        if 'залог' in text_lower:
-            if 'не возвращается' in text_lower or 'удерживается' in text_lower:
-                return ContractIssue(
-                    title="Невозвратный залог",
-                    description="Обнаружены условия невозврата залога",
-                    risk_level=RiskLevel.HIGH,
-                    recommendation="Залог должен возвращаться при отсутствии ущерба"
-                )
-
-            if 'условия возврата' not in text_lower and 'возврат залога' not in text_lower:
-                return ContractIssue(
-                    title="Нет условий возврата залога",
-                    description="В договоре не прописаны четкие условия возврата залога",
-                    risk_level=RiskLevel.MEDIUM,
-                    recommendation="Требуйте прописать условия и сроки возврата залога"
-                )
-
-        return None
-
-    def _check_early_termination(self, text: str) -> Optional[ContractIssue]:
-        """Проверка условий досрочного расторжения."""
-        text_lower = text.lower()
-
-        if 'досрочное расторжение' in text_lower:
-            if 'только арендодатель' in text_lower or 'по инициативе арендодателя' in text_lower:
-                return ContractIssue(
-                    title="Одностороннее расторжение",
-                    description="Только арендодатель может расторгнуть договор досрочно",
-                    risk_level=RiskLevel.HIGH,
-                    recommendation="Требуйте равных прав на досрочное расторжение"
-                )
-
-            if 'без объяснения причин' in text_lower:
-                return ContractIssue(
-                    title="Расторжение без причин",
-                    description="Арендодатель может расторгнуть договор без объяснения причин",
-                    risk_level=RiskLevel.HIGH,
-                    recommendation="Требуйте указать конкретные основания для расторжения"
-                )
-
-        return None
-
-    def _check_eviction(self, text: str) -> Optional[ContractIssue]:
-        """Проверка условий выселения."""
-        text_lower = text.lower()
-
-        if 'выселение' in text_lower:
-            import re
-            days_pattern = r'выселение.*?(\d+)\s*(?:дн|день|дня|дней)'
-            matches = re.findall(days_pattern, text_lower)
-
-            for match in matches:
-                days = int(match)
-                if days < 30:
-                    return ContractIssue(
-                        title="Короткий срок выселения",
-                        description=f"Срок для выселения всего {days} дней",
-                        risk_level=RiskLevel.HIGH,
-                        recommendation="По закону минимальный срок предупреждения - 3 месяца"
-                    )
-
-        return None
-
-    def _extract_key_terms(self, text: str) -> Dict[str, str]:
-        """Извлечение ключевых условий договора."""
-        import re
-        key_terms = {}
-
-        # Поиск суммы аренды
-        rent_patterns = [
-            r'арендная плата.*?(\d+\s*\d*)\s*(?:руб|₽)',
-            r'ежемесячн.*?оплат.*?(\d+\s*\d*)\s*(?:руб|₽)',
-            r'стоимость.*?аренд.*?(\d+\s*\d*)\s*(?:руб|₽)'
-        ]
-
-        for pattern in rent_patterns:
-            match = re.search(pattern, text.lower())
-            if match:
-                key_terms['rent_amount'] = f"{match.group(1)} руб/мес"
-                break
-
-        # Поиск залога
-        deposit_pattern = r'залог.*?(\d+\s*\d*)\s*(?:руб|₽)'
-        match = re.search(deposit_pattern, text.lower())
-        if match:
-            key_terms['deposit'] = f"{match.group(1)} руб"
+    RISK_EMOJI = {
+        RiskLevel.LOW: "🟢",
+        RiskLevel.MEDIUM: "🟡",
+        RiskLevel.HIGH: "🔴"
+    }
 
-        # Поиск срока аренды
-        term_patterns = [
-            r'срок.*?договор.*?(\d+)\s*(?:месяц|год|лет)',
-            r'договор.*?заключ.*?(\d+)\s*(?:месяц|год|лет)'
-        ]
-
-        for pattern in term_patterns:
-            match = re.search(pattern, text.lower())
-            if match:
-                key_terms['term'] = match.group(0)
-                break
-
-        # Коммунальные платежи
-        if 'коммунальные' in text.lower():
-            if 'включены' in text.lower() or 'входят' in text.lower():
-                key_terms['utilities'] = "Включены в стоимость"
-            elif 'отдельно' in text.lower() or 'дополнительно' in text.lower():
-                key_terms['utilities'] = "Оплачиваются отдельно"
-            else:
-                key_terms['utilities'] = "Упоминаются (уточните условия)"
-
-        return key_terms
+    RISK_TEXT = {
+        RiskLevel.LOW: "НИЗКИЙ РИСК",
+        RiskLevel.MEDIUM: "СРЕДНИЙ РИСК",
+        RiskLevel.HIGH: "ВЫСОКИЙ РИСК"
+    }
 
     def format_analysis_for_vk(self, result: ContractAnalysisResult) -> str:
         """
@@ -533,40 +918,8 @@ class ContractAnalyzer:
         Returns:
             Отформатированный текст для VK сообщения
         """
-        lines = []
-
-        # Заголовок с уровнем риска
-        risk_emoji = {
-            RiskLevel.LOW: "🟢",
-            RiskLevel.MEDIUM: "🟡",
-            RiskLevel.HIGH: "🔴"
-        }
-
-        risk_text = {
-            RiskLevel.LOW: "НИЗКИЙ РИСК",
-            RiskLevel.MEDIUM: "СРЕДНИЙ РИСК",
-            RiskLevel.HIGH: "ВЫСОКИЙ РИСК"
-        }
-
-        lines.append("📋 РЕЗУЛЬТАТЫ ПРОВЕРКИ ДОГОВОРА")
-        lines.append("=" * 30)
-        lines.append(f"\n{risk_emoji[result.overall_risk]} Общий уровень риска: {risk_text[result.overall_risk]}")
-        lines.append(f"\n📝 {result.summary}")
-
-        # Ключевые условия
-        if result.key_terms:
-            lines.append("\n📌 КЛЮЧЕВЫЕ УСЛОВИЯ:")
-            term_names = {
-                'rent_amount': '• Арендная плата',
-                'deposit': '• Залог',
-                'term': '• Срок аренды',
-                'utilities': '• Коммунальные услуги',
-                'early_termination': '• Досрочное расторжение'
-            }
-
-            for key, value in result.key_terms.items():
-                if key in term_names:
-                    lines.append(f"{term_names[key]}: {value}")
+        lines = self._format_header_lines(result.overall_risk, result.summary)
+        lines.extend(self._format_key_terms_lines(result))
 
         # Обнаруженные проблемы
         if result.issues:
@@ -594,6 +947,57 @@ class ContractAnalyzer:
                 for issue in low_issues[:2]:
                     lines.append(f"• {issue.title}")
 
+        lines.extend(self._format_closing_lines(result))
+        return "\n".join(lines)
+
+    def format_summary_for_vk(self, overall_risk: Optional[RiskLevel], summary: str) -> str:
+        """Форматирует заголовок и резюме, пришедшие из потока."""
+        return "\n".join(self._format_header_lines(overall_risk, summary))
+
+    def format_issues_for_vk(self, issues: List[ContractIssue], with_header: bool = False) -> str:
+        """Форматирует проблемы, пришедшие из потока, в порядке поступления."""
+        lines = ["⚠️ ОБНАРУЖЕННЫЕ ПРОБЛЕМЫ:"] if with_header else []
+        for issue in issues:
+            lines.append(f"{self.RISK_EMOJI[issue.risk_level]} {issue.title}")
+            if issue.recommendation and issue.risk_level == RiskLevel.HIGH:
+                lines.append(f"  → {issue.recommendation}")
+        return "\n".join(lines)
+
+    def format_details_for_vk(self, result: ContractAnalysisResult) -> str:
+        """Форматирует окончание отчета после потоковой выдачи резюме и проблем."""
+        lines = self._format_key_terms_lines(result) + self._format_closing_lines(result)
+        return "\n".join(lines).strip()
+
+    def _format_header_lines(self, overall_risk: Optional[RiskLevel], summary: str) -> List[str]:
+        """Заголовок отчета с уровнем риска и резюме."""
+        lines = ["📋 РЕЗУЛЬТАТЫ ПРОВЕРКИ ДОГОВОРА", "=" * 30]
+        if overall_risk is not None:
+            lines.append(f"\n{self.RISK_EMOJI[overall_risk]} Общий уровень риска: {self.RISK_TEXT[overall_risk]}")
+        lines.append(f"\n📝 {summary}")
+        return lines
+
+    def _format_key_terms_lines(self, result: ContractAnalysisResult) -> List[str]:
+        """Ключевые условия договора."""
+        lines: List[str] = []
+        if result.key_terms:
+            lines.append("\n📌 КЛЮЧЕВЫЕ УСЛОВИЯ:")
+            term_names = {
+                'rent_amount': '• Арендная плата',
+                'deposit': '• Залог',
+                'term': '• Срок аренды',
+                'utilities': '• Коммунальные услуги',
+                'early_termination': '• Досрочное расторжение'
+            }
+
+            for key, value in result.key_terms.items():
+                if key in term_names:
+                    lines.append(f"{term_names[key]}: {value}")
+        return lines
+
+    def _format_closing_lines(self, result: ContractAnalysisResult) -> List[str]:
+        """Положительные моменты, рекомендации и дисклеймер."""
+        lines: List[str] = []
+
         # Положительные моменты
         if result.positive_points:
             lines.append("\n✅ ПОЛОЖИТЕЛЬНЫЕ МОМЕНТЫ:")
@@ -609,5 +1013,4 @@ class ContractAnalyzer:
         # Дисклеймер
         lines.append("\n" + "─" * 30)
         lines.append("⚖️ Это автоматический анализ. Для полной юридической оценки обратитесь к юристу.")
-
-        return "\n".join(lines)
\ No newline at end of file
+        return lines
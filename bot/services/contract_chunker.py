@@ -0,0 +1,90 @@
+"""
+Разбиение длинных договоров на фрагменты по разделам.
+Используется для параллельного анализа договоров, которые не помещаются в один промпт.
+"""
+import re
+from typing import List
+
+# Заголовки разделов: "1. ПРЕДМЕТ ДОГОВОРА", "Раздел 2. Права и обязанности", "Статья 5"
+SECTION_HEADING = re.compile(
+    r'^[ \t]*(?:'
+    r'\d{1,2}\.?[ \t]+[А-ЯЁA-Z][А-ЯЁA-Z \t,\-]{3,}'
+    r'|(?:[Рр]аздел|[Сс]татья|[Гг]лава|РАЗДЕЛ|СТАТЬЯ|ГЛАВА)[ \t]+[\dIVXLC]+\.?.*'
+    r')[ \t]*$',
+    re.MULTILINE,
+)
+
+
+def split_sections(text: str) -> List[str]:
+    """
+    Делит текст договора на разделы по заголовкам.
+
+    Текст до первого заголовка (шапка договора) становится отдельным разделом.
+    """
+    starts = [match.start() for match in SECTION_HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    sections = []
+    for begin, end in zip(starts, starts[1:] + [len(text)]):
+        section = text[begin:end].strip()
+        if section:
+            sections.append(section)
+    return sections
+
+
+def _split_oversized(section: str, max_chars: int) -> List[str]:
+    """Делит слишком большой раздел по абзацам, а абзацы - по длине."""
+    pieces: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    for paragraph in section.split("\n"):
+        while len(paragraph) > max_chars:
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+
+        if current and current_len + len(paragraph) + 1 > max_chars:
+            pieces.append("\n".join(current))
+            current = []
+            current_len = 0
+
+        current.append(paragraph)
+        current_len += len(paragraph) + 1
+
+    if current:
+        pieces.append("\n".join(current))
+    return [piece for piece in pieces if piece.strip()]
+
+
+def chunk_contract(text: str, max_chars: int) -> List[str]:
+    """
+    Группирует разделы договора во фрагменты не длиннее max_chars.
+
+    Разделы не разрываются, если помещаются во фрагмент целиком.
+
+    Args:
+        text: Текст договора
+        max_chars: Максимальная длина фрагмента
+
+    Returns:
+        Список фрагментов в исходном порядке
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_len = 0
+
+    for section in split_sections(text):
+        parts = [section] if len(section) <= max_chars else _split_oversized(section, max_chars)
+
+        for part in parts:
+            if current and current_len + len(part) + 2 > max_chars:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_len = 0
+            current.append(part)
+            current_len += len(part) + 2
+
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
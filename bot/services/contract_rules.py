@@ -0,0 +1,660 @@
+"""
+Декларативные правила проверки договоров аренды.
+
+Правила описываются данными (ключевые слова, шаблоны, пороги, уровень риска,
+рекомендация) и компилируются один раз: все ключевые слова объединяются в одно
+регулярное выражение, которое находит их за один проход по тексту.
+
+Набор правил можно вынести во внешний файл (JSON или YAML). Файл
+перечитывается при изменении без перезапуска бота; некорректный файл
+отклоняется, и продолжает работать предыдущий набор правил.
+"""
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field, fields
+from threading import Lock
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+    # PyYAML опционален - наборы правил можно хранить в JSON
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+
+# Виды правил
+RULE_ISSUE = "issue"        # проблема в договоре
+RULE_POSITIVE = "positive"  # положительный момент
+RULE_TERM = "term"          # ключевое условие (сумма, срок и т.д.)
+
+RULE_KINDS = (RULE_ISSUE, RULE_POSITIVE, RULE_TERM)
+RISK_LEVELS = ("low", "medium", "high")
+
+_NON_DIGITS = re.compile(r'\D')
+# Цифры в регулярном выражении: \d, [0-9] или сама цифра
+_DIGIT_CLASS = re.compile(r'\\d|0-9|(?<!\\)\d')
+
+
+def _first_group(pattern: str) -> Optional[str]:
+    """Текст первой захватывающей группы шаблона или None, если групп нет."""
+    depth = 0
+    start = None
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            if start is not None:
+                depth += 1
+            elif not pattern.startswith('(?', index) or pattern.startswith('(?P<', index):
+                # (?:...), (?=...) и т.п. не захватывают; именованная группа захватывает
+                start = index + 1
+        elif char == ')' and start is not None:
+            if depth == 0:
+                return pattern[start:index]
+            depth -= 1
+        index += 1
+    return None
+
+
+class RulePackError(ValueError):
+    """Набор правил некорректен и не может быть загружен."""
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Правило проверки договора.
+
+    Правило срабатывает, если в тексте есть все слова all_of, хотя бы одно
+    из any_of и нет ни одного из none_of. Если заданы patterns, дополнительно
+    нужно совпадение шаблона; число из первой группы сравнивается с порогами
+    min_value/max_value (строго больше/меньше). Из правил одной группы
+    срабатывает только первое. Проблема с risk_per_keyword учитывается в
+    общем уровне риска столько раз, сколько слов any_of найдено в тексте.
+    """
+    id: str
+    kind: str = RULE_ISSUE
+    title: str = ""
+    description: str = ""
+    risk_level: str = "medium"
+    recommendation: Optional[str] = None
+    all_of: Tuple[str, ...] = ()
+    any_of: Tuple[str, ...] = ()
+    none_of: Tuple[str, ...] = ()
+    patterns: Tuple[str, ...] = ()
+    min_value: Optional[int] = None
+    max_value: Optional[int] = None
+    group: Optional[str] = None
+    key: Optional[str] = None  # ключ в key_terms для правил вида term
+    risk_per_keyword: bool = False
+
+    def keywords(self) -> Tuple[str, ...]:
+        """Все ключевые слова правила."""
+        return self.all_of + self.any_of + self.none_of
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Rule":
+        """
+        Создает правило из словаря (элемента набора правил).
+
+        Raises:
+            RulePackError: если правило описано некорректно
+        """
+        if not isinstance(data, dict):
+            raise RulePackError(f"Правило должно быть объектом, получено: {data!r}")
+
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise RulePackError(f"Неизвестные поля правила {data.get('id')!r}: {sorted(unknown)}")
+        if not data.get("id"):
+            raise RulePackError(f"У правила нет id: {data!r}")
+
+        values = dict(data)
+        for name in ("all_of", "any_of", "none_of", "patterns"):
+            items = values.get(name, ())
+            if isinstance(items, str) or not all(isinstance(item, str) and item for item in items):
+                raise RulePackError(f"Правило {data['id']!r}: поле {name} должно быть списком строк")
+            values[name] = tuple(item.lower() if name != "patterns" else item for item in items)
+
+        rule = cls(**values)
+        rule.validate()
+        return rule
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализует правило, опуская поля со значениями по умолчанию."""
+        defaults = {f.name: f.default for f in fields(self)}
+        data = {}
+        for name, value in asdict(self).items():
+            if name == "id" or value != defaults[name]:
+                data[name] = list(value) if isinstance(value, tuple) else value
+        return data
+
+    def validate(self) -> None:
+        """
+        Проверяет согласованность полей правила.
+
+        Raises:
+            RulePackError: если правило описано некорректно
+        """
+        if self.kind not in RULE_KINDS:
+            raise RulePackError(f"Правило {self.id!r}: неизвестный вид {self.kind!r}")
+        if self.risk_level not in RISK_LEVELS:
+            raise RulePackError(f"Правило {self.id!r}: неизвестный уровень риска {self.risk_level!r}")
+        if self.kind in (RULE_ISSUE, RULE_POSITIVE) and not self.title:
+            raise RulePackError(f"Правило {self.id!r}: не задан title")
+        if self.kind == RULE_TERM and not self.key:
+            raise RulePackError(f"Правило {self.id!r}: не задан key")
+        for name in ("min_value", "max_value"):
+            value = getattr(self, name)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+                raise RulePackError(f"Правило {self.id!r}: {name} должно быть целым числом")
+        if not isinstance(self.risk_per_keyword, bool):
+            raise RulePackError(f"Правило {self.id!r}: risk_per_keyword должно быть true или false")
+        if (self.min_value is not None or self.max_value is not None) and not self.patterns:
+            raise RulePackError(f"Правило {self.id!r}: пороги заданы без patterns")
+
+        has_threshold = self.min_value is not None or self.max_value is not None
+        for pattern in self.patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise RulePackError(f"Правило {self.id!r}: некорректный шаблон {pattern!r}: {e}")
+            # Порог сравнивается с числом из первой группы - она должна содержать цифры
+            group = _first_group(pattern)
+            if has_threshold and (group is None or not _DIGIT_CLASS.search(group)):
+                raise RulePackError(
+                    f"Правило {self.id!r}: шаблон {pattern!r} с порогом должен захватывать число "
+                    f"в первой группе (например, (\\d+))"
+                )
+
+        try:
+            self.description.format(value="0", match="")
+        except (KeyError, IndexError, ValueError) as e:
+            raise RulePackError(f"Правило {self.id!r}: некорректная подстановка в description: {e}")
+
+
+@dataclass
+class RuleMatch:
+    """Сработавшее правило."""
+    rule: Rule
+    text: str  # Описание (или значение ключевого условия) с подставленными данными
+    spans: List[Span] = field(default_factory=list)
+    weight: int = 1  # Сколько раз проблема учитывается в общем уровне риска
+
+
+def _trie_pattern(words: Sequence[str]) -> str:
+    """
+    Строит регулярное выражение-префиксное дерево для набора слов.
+
+    В отличие от простого перечисления через |, движок проверяет каждый
+    символ один раз, поэтому проход по тексту не зависит от числа слов.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Слово может закончиться в этом узле - продолжение необязательно
+        return '(?:' + body + ')?' if '' in node else body
+
+    return build(trie)
+
+
+class RuleEngine:
+    """Скомпилированный набор правил."""
+
+    def __init__(self, rules: Sequence[Rule], version: str = ""):
+        self.rules = list(rules)
+        self.version = version
+
+        keywords = sorted({kw for rule in self.rules for kw in rule.keywords()})
+        # Опережающая проверка находит и перекрывающиеся вхождения. Дерево
+        # возвращает самое длинное слово в позиции, а его префиксы учитываются через _prefixes
+        self._scanner: Optional[Pattern] = None
+        if keywords:
+            first_chars = re.escape(''.join(sorted({kw[0] for kw in keywords})))
+            self._scanner = re.compile('(?=[' + first_chars + '])(?=(' + _trie_pattern(keywords) + '))')
+        self._prefixes: Dict[str, List[str]] = {
+            kw: [other for other in keywords if other != kw and kw.startswith(other)]
+            for kw in keywords
+        }
+        self._patterns: Dict[str, List[Pattern]] = {
+            rule.id: [re.compile(pattern) for pattern in rule.patterns]
+            for rule in self.rules
+        }
+
+    def scan(self, text_lower: str) -> Dict[str, List[Span]]:
+        """Находит все вхождения ключевых слов за один проход."""
+        hits: Dict[str, List[Span]] = {}
+        if self._scanner is None:
+            return hits
+
+        for match in self._scanner.finditer(text_lower):
+            keyword = match.group(1)
+            start = match.start()
+            hits.setdefault(keyword, []).append((start, start + len(keyword)))
+            for prefix in self._prefixes[keyword]:
+                hits.setdefault(prefix, []).append((start, start + len(prefix)))
+        return hits
+
+    def evaluate(self, text: str) -> List[RuleMatch]:
+        """
+        Применяет правила к тексту договора.
+
+        Returns:
+            Сработавшие правила в порядке их объявления
+        """
+        text_lower = text.lower()
+        hits = self.scan(text_lower)
+        fired_groups = set()
+        matches: List[RuleMatch] = []
+
+        for rule in self.rules:
+            if rule.group and rule.group in fired_groups:
+                continue
+            if not all(kw in hits for kw in rule.all_of):
+                continue
+            if rule.any_of and not any(kw in hits for kw in rule.any_of):
+                continue
+            if any(kw in hits for kw in rule.none_of):
+                continue
+
+            spans = [hits[kw][0] for kw in rule.all_of + rule.any_of if kw in hits]
+            text_out = rule.description if rule.kind != RULE_POSITIVE else rule.title
+
+            if rule.patterns:
+                found = self._match_patterns(rule, text_lower)
+                if found is None:
+                    continue
+                match, value = found
+                spans.append(match.span())
+                text_out = text_out.format(value=value, match=match.group(0))
+
+            weight = sum(1 for kw in rule.any_of if kw in hits) if rule.risk_per_keyword else 1
+            matches.append(RuleMatch(rule=rule, text=text_out, spans=spans, weight=weight))
+            if rule.group:
+                fired_groups.add(rule.group)
+
+        return matches
+
+    def _match_patterns(self, rule: Rule, text_lower: str) -> Optional[Tuple[re.Match, str]]:
+        """Первое совпадение шаблонов правила, удовлетворяющее порогам."""
+        has_threshold = rule.min_value is not None or rule.max_value is not None
+
+        for pattern in self._patterns[rule.id]:
+            for match in pattern.finditer(text_lower):
+                value = match.group(1) if pattern.groups else match.group(0)
+                if not has_threshold:
+                    return match, value
+
+                digits = _NON_DIGITS.sub('', value)
+                if not digits:
+                    continue
+                number = int(digits)
+                if rule.min_value is not None and number <= rule.min_value:
+                    continue
+                if rule.max_value is not None and number >= rule.max_value:
+                    continue
+                return match, str(number)
+
+        return None
+
+
+# Суммы штрафов и неустоек (проценты и фиксированные суммы)
+_PENALTY_PATTERNS = (
+    r'штраф.*?(\d+)\s*(?:%|процент)',
+    r'неустойк.*?(\d+)\s*(?:%|процент)',
+    r'пен.*?(\d+)\s*(?:%|процент)',
+    r'штраф.*?(\d+\s*\d+)\s*(?:руб|₽)',
+    r'неустойк.*?(\d+\s*\d+)\s*(?:руб|₽)',
+)
+
+# Правила по умолчанию
+DEFAULT_RULES: List[Rule] = [
+    # Обязательные разделы
+    *[
+        Rule(
+            id=f"missing_section:{section}",
+            title=f"Отсутствует раздел: {description}",
+            description=f"В договоре не найден важный раздел '{section}'",
+            risk_level="medium",
+            recommendation="Требуйте добавить этот раздел в договор",
+            none_of=(section,),
+        )
+        for section, description in (
+            ('предмет договора', 'Описание арендуемого помещения'),
+            ('срок аренды', 'Период действия договора'),
+            ('арендная плата', 'Размер и порядок оплаты'),
+            ('права и обязанности', 'Права и обязанности сторон'),
+            ('ответственность сторон', 'Штрафы и неустойки'),
+            ('расторжение договора', 'Условия прекращения договора'),
+        )
+    ],
+
+    # Штрафы и неустойки
+    Rule(
+        id="penalty_percent",
+        title="Завышенные штрафы",
+        description="Обнаружены высокие штрафы/неустойки: {value}%",
+        risk_level="high",
+        recommendation="Требуйте снизить размер штрафов до разумных пределов (0.1-0.5% в день)",
+        all_of=('%',),
+        any_of=('штраф', 'неустойка', 'пеня'),
+        patterns=_PENALTY_PATTERNS,
+        min_value=1,  # Больше 1% в день - подозрительно
+        group="penalty",
+        risk_per_keyword=True,
+    ),
+    Rule(
+        id="penalty_fixed",
+        title="Крупные штрафы",
+        description="Установлены крупные фиксированные штрафы: {value} руб",
+        risk_level="medium",
+        recommendation="Обсудите необходимость таких больших штрафов",
+        any_of=('штраф', 'неустойка', 'пеня'),
+        patterns=_PENALTY_PATTERNS,
+        min_value=50000,
+        group="penalty",
+        risk_per_keyword=True,
+    ),
+
+    # Комиссии
+    Rule(
+        id="commission",
+        title="Дополнительные комиссии",
+        description="В договоре упоминаются комиссии, не связанные с агентским вознаграждением",
+        risk_level="medium",
+        recommendation="Уточните все дополнительные платежи",
+        all_of=('комиссия',),
+        none_of=('агент',),
+    ),
+
+    # Залог
+    Rule(
+        id="deposit_non_refundable",
+        title="Невозвратный залог",
+        description="Обнаружены условия невозврата залога",
+        risk_level="high",
+        recommendation="Залог должен возвращаться при отсутствии ущерба",
+        all_of=('залог',),
+        any_of=('не возвращается', 'удерживается'),
+        group="deposit",
+    ),
+    Rule(
+        id="deposit_no_return_terms",
+        title="Нет условий возврата залога",
+        description="В договоре не прописаны четкие условия возврата залога",
+        risk_level="medium",
+        recommendation="Требуйте прописать условия и сроки возврата залога",
+        all_of=('залог',),
+        none_of=('условия возврата', 'возврат залога'),
+        group="deposit",
+    ),
+
+    # Досрочное расторжение
+    Rule(
+        id="termination_one_sided",
+        title="Одностороннее расторжение",
+        description="Только арендодатель может расторгнуть договор досрочно",
+        risk_level="high",
+        recommendation="Требуйте равных прав на досрочное расторжение",
+        all_of=('досрочное расторжение',),
+        any_of=('только арендодатель', 'по инициативе арендодателя'),
+        group="termination",
+    ),
+    Rule(
+        id="termination_without_reason",
+        title="Расторжение без причин",
+        description="Арендодатель может расторгнуть договор без объяснения причин",
+        risk_level="high",
+        recommendation="Требуйте указать конкретные основания для расторжения",
+        all_of=('досрочное расторжение', 'без объяснения причин'),
+        group="termination",
+    ),
+
+    # Выселение
+    Rule(
+        id="eviction_short_notice",
+        title="Короткий срок выселения",
+        description="Срок для выселения всего {value} дней",
+        risk_level="high",
+        recommendation="По закону минимальный срок предупреждения - 3 месяца",
+        all_of=('выселение',),
+        patterns=(r'выселение.*?(\d+)\s*(?:дн|день|дня|дней)',),
+        max_value=30,
+    ),
+
+    # Положительные моменты
+    Rule(
+        id="acceptance_act",
+        kind=RULE_POSITIVE,
+        title="Предусмотрен акт приема-передачи помещения",
+        any_of=('акт приема-передачи',),
+    ),
+    Rule(
+        id="meter_readings",
+        kind=RULE_POSITIVE,
+        title="Фиксируются показания счетчиков",
+        any_of=('показания счетчиков',),
+    ),
+    Rule(
+        id="force_majeure",
+        kind=RULE_POSITIVE,
+        title="Прописаны форс-мажорные обстоятельства",
+        any_of=('форс-мажор', 'обстоятельства непреодолимой силы'),
+    ),
+
+    # Ключевые условия
+    Rule(
+        id="rent_amount",
+        kind=RULE_TERM,
+        key="rent_amount",
+        description="{value} руб/мес",
+        patterns=(
+            r'арендная плата.*?(\d+\s*\d*)\s*(?:руб|₽)',
+            r'ежемесячн.*?оплат.*?(\d+\s*\d*)\s*(?:руб|₽)',
+            r'стоимость.*?аренд.*?(\d+\s*\d*)\s*(?:руб|₽)',
+        ),
+    ),
+    Rule(
+        id="deposit_amount",
+        kind=RULE_TERM,
+        key="deposit",
+        description="{value} руб",
+        patterns=(r'залог.*?(\d+\s*\d*)\s*(?:руб|₽)',),
+    ),
+    Rule(
+        id="lease_term",
+        kind=RULE_TERM,
+        key="term",
+        description="{match}",
+        patterns=(
+            r'срок.*?договор.*?(\d+)\s*(?:месяц|год|лет)',
+            r'договор.*?заключ.*?(\d+)\s*(?:месяц|год|лет)',
+        ),
+    ),
+    Rule(
+        id="utilities_included",
+        kind=RULE_TERM,
+        key="utilities",
+        description="Включены в стоимость",
+        all_of=('коммунальные',),
+        any_of=('включены', 'входят'),
+        group="utilities",
+    ),
+    Rule(
+        id="utilities_separate",
+        kind=RULE_TERM,
+        key="utilities",
+        description="Оплачиваются отдельно",
+        all_of=('коммунальные',),
+        any_of=('отдельно', 'дополнительно'),
+        group="utilities",
+    ),
+    Rule(
+        id="utilities_mentioned",
+        kind=RULE_TERM,
+        key="utilities",
+        description="Упоминаются (уточните условия)",
+        all_of=('коммунальные',),
+        group="utilities",
+    ),
+]
+
+# Версия встроенного набора правил
+DEFAULT_RULES_VERSION = "builtin"
+
+
+def parse_rule_pack(data: Any) -> RuleEngine:
+    """
+    Проверяет и компилирует набор правил.
+
+    Формат: {"version": "...", "rules": [{...}, ...]}
+
+    Raises:
+        RulePackError: если набор правил некорректен
+    """
+    if not isinstance(data, dict):
+        raise RulePackError("Набор правил должен быть объектом с полями version и rules")
+
+    version = data.get("version")
+    if version is None or str(version) == "":
+        raise RulePackError("В наборе правил не указана версия (version)")
+
+    raw_rules = data.get("rules")
+    if not isinstance(raw_rules, list) or not raw_rules:
+        raise RulePackError("Набор правил пуст (rules)")
+
+    rules = [Rule.from_dict(item) for item in raw_rules]
+    ids = [rule.id for rule in rules]
+    duplicates = sorted({rule_id for rule_id in ids if ids.count(rule_id) > 1})
+    if duplicates:
+        raise RulePackError(f"Повторяющиеся id правил: {duplicates}")
+
+    try:
+        return RuleEngine(rules, version=str(version))
+    except re.error as e:
+        raise RulePackError(f"Не удалось скомпилировать правила: {e}")
+
+
+def load_rule_pack(path: str) -> RuleEngine:
+    """
+    Загружает набор правил из файла JSON или YAML.
+
+    Raises:
+        RulePackError: если файл не читается или набор правил некорректен
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+    except OSError as e:
+        raise RulePackError(f"Не удалось прочитать {path}: {e}")
+
+    if path.endswith((".yaml", ".yml")):
+        if not YAML_AVAILABLE:
+            raise RulePackError("PyYAML не установлен - используйте набор правил в JSON")
+        try:
+            data = yaml.safe_load(raw)
+        except yaml.YAMLError as e:
+            raise RulePackError(f"Некорректный YAML в {path}: {e}")
+    else:
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise RulePackError(f"Некорректный JSON в {path}: {e}")
+
+    return parse_rule_pack(data)
+
+
+def dump_rule_pack(rules: Sequence[Rule], version: str) -> Dict[str, Any]:
+    """Сериализует правила в формат набора правил."""
+    return {"version": version, "rules": [rule.to_dict() for rule in rules]}
+
+
+class RulePackManager:
+    """
+    Текущий набор правил с перезагрузкой при изменении файла.
+
+    Файл проверяется не чаще раза в check_interval секунд. Новый набор
+    сначала полностью компилируется и только затем подменяет текущий;
+    при ошибке продолжает работать предыдущий набор.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        """
+        Args:
+            path: Путь к файлу набора правил (пустая строка - только встроенные правила)
+            check_interval: Минимальный интервал между проверками файла в секундах
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._engine = RuleEngine(DEFAULT_RULES, version=DEFAULT_RULES_VERSION)
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+        self.reload()
+
+    @property
+    def version(self) -> str:
+        """Версия действующего набора правил."""
+        return self._engine.version
+
+    def current(self) -> RuleEngine:
+        """Возвращает действующий набор правил, перечитав файл при изменении."""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._engine
+
+    def reload(self) -> bool:
+        """
+        Перечитывает файл, если он изменился.
+
+        Returns:
+            True, если набор правил был заменен
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not self.path:
+                return False
+
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                # Файла нет - продолжаем работать с текущими правилами
+                return False
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+
+            try:
+                engine = load_rule_pack(self.path)
+            except RulePackError as e:
+                logger.error("Rule pack %s rejected, keeping version %s: %s", self.path, self.version, e)
+                return False
+
+            self._engine = engine
+            logger.info("Rule pack %s loaded: version %s, %d rules", self.path, engine.version, len(engine.rules))
+            return True
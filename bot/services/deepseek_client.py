@@ -0,0 +1,288 @@
+"""
+Асинхронный клиент Deepseek API.
+Переиспользует соединения, ограничивает число одновременных запросов,
+повторяет запросы при 429/5xx и отключает API при деградации (circuit breaker).
+Поддерживает потоковые ответы (Server-Sent Events).
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Коды ответа, при которых запрос стоит повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DeepseekError(Exception):
+    """Deepseek API недоступен или вернул ошибку."""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для внешнего API.
+
+    После failure_threshold ошибок подряд цепь размыкается на reset_timeout
+    секунд. Затем пропускается один пробный запрос: успех замыкает цепь,
+    ошибка снова размыкает.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Цепь разомкнута и пробный запрос ещё не разрешен."""
+        if self.opened_at is None:
+            return False
+        if self._probe_in_flight:
+            return True
+        return time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow_request(self) -> bool:
+        """Проверяет, можно ли выполнить запрос сейчас."""
+        if self.opened_at is None:
+            return True
+        if self.is_open:
+            return False
+        # Полуоткрытое состояние - пропускаем один пробный запрос
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """Снимает блокировку пробного запроса, если он был отменен."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """Отмечает успешный запрос."""
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Отмечает неудачный запрос."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Deepseek circuit opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class DeepseekClient:
+    """Клиент Deepseek chat completions на aiohttp с пулом соединений."""
+
+    def __init__(
+        self,
+        api_key: str,
+        url: str,
+        timeout: float = 30.0,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Args:
+            api_key: API ключ Deepseek
+            url: URL метода chat/completions
+            timeout: Таймаут одного запроса в секундах
+            max_concurrency: Максимум одновременных запросов к API
+            max_retries: Количество повторов при 429/5xx и сетевых ошибках
+            backoff_base: Базовая задержка между повторами
+            backoff_max: Максимальная задержка между повторами
+            breaker: Размыкатель цепи (по умолчанию создается новый)
+        """
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def available(self) -> bool:
+        """API доступен (цепь не разомкнута)."""
+        return not self.breaker.is_open
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию, создавая её при первом обращении."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Задержка перед повтором: Retry-After или экспонента с полным джиттером."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Выполняет запрос chat/completions.
+
+        Args:
+            payload: Тело запроса
+
+        Returns:
+            Распарсенный JSON ответ
+
+        Raises:
+            DeepseekError: если цепь разомкнута или все попытки исчерпаны
+        """
+        if not self.breaker.allow_request():
+            raise DeepseekError("Deepseek API временно отключен (circuit open)")
+
+        try:
+            async with self._semaphore:
+                response = await self._post_with_retries(payload)
+                try:
+                    data = await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.breaker.record_failure()
+                    raise DeepseekError(f"{type(e).__name__}: {e}")
+                finally:
+                    response.release()
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+
+        self.breaker.record_success()
+        return data
+
+    async def chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Выполняет потоковый запрос chat/completions (SSE).
+
+        Повторы возможны только до получения первого байта ответа.
+
+        Args:
+            payload: Тело запроса (поле stream выставляется автоматически)
+
+        Yields:
+            Фрагменты текста ответа по мере поступления
+
+        Raises:
+            DeepseekError: если цепь разомкнута, попытки исчерпаны или поток оборвался
+        """
+        if not self.breaker.allow_request():
+            raise DeepseekError("Deepseek API временно отключен (circuit open)")
+
+        stream_payload = dict(payload, stream=True)
+        # Общий таймаут не ограничиваем - длинный ответ может идти дольше timeout
+        stream_timeout = aiohttp.ClientTimeout(total=None, sock_read=self.timeout)
+
+        try:
+            async with self._semaphore:
+                response = await self._post_with_retries(stream_payload, timeout=stream_timeout)
+                try:
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+
+                        chunk = json.loads(data)
+                        delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.breaker.record_failure()
+                    raise DeepseekError(f"Поток прерван: {type(e).__name__}: {e}")
+                finally:
+                    response.release()
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release_probe()
+            raise
+
+        self.breaker.record_success()
+
+    async def _post_with_retries(
+        self,
+        payload: Dict[str, Any],
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ) -> aiohttp.ClientResponse:
+        """
+        Отправляет запрос с повторами при временных ошибках.
+
+        Returns:
+            Ответ со статусом 200 (вызывающий код должен вызвать release())
+        """
+        last_error = "unknown error"
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                session = self._get_session()
+                request_kwargs: Dict[str, Any] = {"json": payload}
+                if timeout is not None:
+                    request_kwargs["timeout"] = timeout
+                response = await session.post(self.url, **request_kwargs)
+                if response.status == 200:
+                    return response
+
+                try:
+                    body = await response.text()
+                finally:
+                    response.release()
+                last_error = f"{response.status} - {body[:200]}"
+                if response.status not in RETRYABLE_STATUSES:
+                    # Ошибка запроса (400/401/...) - повторять бессмысленно. Она не
+                    # говорит о состоянии API: счетчик ошибок не меняем, только
+                    # снимаем блокировку пробного запроса
+                    self.breaker.release_probe()
+                    raise DeepseekError(last_error)
+                retry_after = response.headers.get("Retry-After")
+
+            except DeepseekError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+
+            if attempt < self.max_retries:
+                delay = self._backoff_delay(attempt, retry_after)
+                logger.warning(
+                    "Deepseek request failed (%s), retry %d/%d in %.2fs",
+                    last_error, attempt + 1, self.max_retries, delay,
+                )
+                await asyncio.sleep(delay)
+
+        self.breaker.record_failure()
+        raise DeepseekError(last_error)
+
+    async def close(self) -> None:
+        """Закрывает пул соединений."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
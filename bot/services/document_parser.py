@@ -5,11 +5,19 @@
 import os
 import tempfile
 import requests
-from typing import Optional, List, Any
+from dataclasses import dataclass, field
+from typing import Optional, List, Any, Iterator
 import logging
-import base64
 import io
 
+from bot.services.image_hash import ImageHashIndex, dhash
+from bot.services.image_preprocessing import (
+    PIL_AVAILABLE,
+    ContractImage,
+    prepare_for_vision,
+    preprocess_for_ocr,
+)
+
 # Импорты для работы с документами
 try:
     import PyPDF2
@@ -26,14 +34,39 @@ except ImportError:
     logging.warning("python-docx не установлен. DOCX файлы не будут обрабатываться.")
 
 try:
-    from PIL import Image
     import pytesseract
-    OCR_AVAILABLE = True
+    OCR_AVAILABLE = PIL_AVAILABLE
 except ImportError:
     OCR_AVAILABLE = False
     # OCR библиотеки опциональны - изображения можно обрабатывать через Deepseek API
 
 
+@dataclass
+class PdfPage:
+    """Страница PDF, извлеченная потоково."""
+    number: int
+    text: str
+    scanned: bool = False  # Страница содержит только изображение (скан)
+    images: Optional[List[bytes]] = None
+
+
+@dataclass
+class ContractDocument:
+    """Содержимое документа: распознанный текст и изображения для мультимодальной модели."""
+    text: str = ""
+    images: List[ContractImage] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        """В документе нет ни текста, ни изображений."""
+        return not self.text.strip() and not self.images
+
+    def extend(self, other: "ContractDocument") -> None:
+        """Добавляет содержимое другого документа."""
+        if other.text:
+            self.text = f"{self.text}\n{other.text}" if self.text else other.text
+        self.images.extend(other.images)
+
+
 class DocumentParser:
     """Парсер документов различных форматов."""
 
@@ -41,9 +74,33 @@ class DocumentParser:
     SUPPORTED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
     SUPPORTED_DOCUMENT_FORMATS = ['.pdf', '.docx', '.txt']
 
-    def __init__(self):
-        """Инициализация парсера документов."""
+    # Бюджет символов текста из одного документа (анализатор всё равно обрезает промпт)
+    MAX_TEXT_CHARS = int(os.getenv("CONTRACT_MAX_TEXT_CHARS", "20000"))
+    # Если на странице меньше символов и есть изображение - считаем её сканом
+    SCANNED_PAGE_MIN_CHARS = 20
+    # Максимум отсканированных страниц, отправляемых в OCR
+    MAX_SCANNED_PAGES = 5
+    # Сторона перцептивного хэша страницы (256 бит - страницы текста похожи друг на друга)
+    PAGE_HASH_SIZE = 16
+    OCR_FAILED_TEXT = "[Не удалось распознать текст в изображении]"
+
+    def __init__(self, max_text_chars: Optional[int] = None):
+        """
+        Инициализация парсера документов.
+
+        Args:
+            max_text_chars: Бюджет символов на документ (по умолчанию MAX_TEXT_CHARS)
+        """
         self.logger = logging.getLogger(__name__)
+        self.max_text_chars = max_text_chars if max_text_chars is not None else self.MAX_TEXT_CHARS
+
+        # Распознанный текст уже присланных страниц (поиск только среди страниц того же пользователя)
+        self.page_index = ImageHashIndex(
+            path=os.getenv("CONTRACT_PAGE_INDEX_FILE", ""),
+            hash_bits=self.PAGE_HASH_SIZE ** 2,
+            max_distance=int(os.getenv("CONTRACT_PAGE_HASH_DISTANCE", "4")),
+            ttl_seconds=int(os.getenv("CONTRACT_PAGE_INDEX_TTL", str(24 * 60 * 60))),
+        )
 
     async def download_file(self, url: str) -> Optional[bytes]:
         """
@@ -79,6 +136,80 @@ class DocumentParser:
             self.logger.error(f"Ошибка загрузки файла: {e}")
             return None
 
+    def iter_pdf_pages(
+        self,
+        content: bytes,
+        max_chars: Optional[int] = None,
+        max_scanned_pages: Optional[int] = None,
+    ) -> Iterator[PdfPage]:
+        """
+        Лениво извлекает страницы PDF одну за другой.
+
+        Останавливается, как только набран бюджет символов, поэтому
+        последние страницы длинных договоров не разбираются вовсе.
+
+        Args:
+            content: Содержимое PDF файла
+            max_chars: Бюджет символов текстового слоя (по умолчанию self.max_text_chars)
+            max_scanned_pages: У скольких отсканированных страниц извлекать
+                изображения (по умолчанию MAX_SCANNED_PAGES); у следующих images=None
+
+        Yields:
+            PdfPage для каждой обработанной страницы
+        """
+        budget = max_chars if max_chars is not None else self.max_text_chars
+        scan_limit = max_scanned_pages if max_scanned_pages is not None else self.MAX_SCANNED_PAGES
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+
+        collected = 0
+        scanned_pages = 0
+        for page_num, page in enumerate(pdf_reader.pages, start=1):
+            text = (page.extract_text() or "").strip()
+
+            if len(text) < self.SCANNED_PAGE_MIN_CHARS and self._page_has_images(page):
+                scanned_pages += 1
+                yield PdfPage(
+                    number=page_num,
+                    text=text,
+                    scanned=True,
+                    # Изображения лишних сканов все равно не распознаются - не декодируем их
+                    images=self._page_images(page) if scanned_pages <= scan_limit else None,
+                )
+                continue
+
+            yield PdfPage(number=page_num, text=text)
+
+            collected += len(text)
+            if budget and collected >= budget:
+                self.logger.info(f"PDF: достигнут бюджет {budget} символов на странице {page_num}")
+                break
+
+    def _page_has_images(self, page: Any) -> bool:
+        """Проверяет наличие изображений на странице без их декодирования."""
+        try:
+            resources = page.get("/Resources")
+            if resources is None:
+                return False
+            resources = resources.get_object()
+            xobjects = resources.get("/XObject")
+            if xobjects is None:
+                return False
+            xobjects = xobjects.get_object()
+            for name in xobjects:
+                if xobjects[name].get_object().get("/Subtype") == "/Image":
+                    return True
+        except Exception as e:
+            self.logger.debug(f"Не удалось проверить изображения страницы: {e}")
+        return False
+
+    def _page_images(self, page: Any) -> List[bytes]:
+        """Возвращает байты изображений отсканированной страницы."""
+        try:
+            return [image.data for image in page.images]
+        except Exception as e:
+            self.logger.warning(f"Не удалось извлечь изображения страницы: {e}")
+            return []
+
     def extract_text_from_pdf(self, content: bytes) -> Optional[str]:
         """
         Извлекает текст из PDF файла.
@@ -89,19 +220,56 @@ class DocumentParser:
         Returns:
             Извлеченный текст или None при ошибке
         """
+        document = self.extract_document_from_pdf(content)
+        return document.text if document else None
+
+    def extract_document_from_pdf(self, content: bytes, owner: str = "") -> Optional[ContractDocument]:
+        """
+        Извлекает содержимое PDF файла.
+
+        Отсканированные страницы (только изображение) передаются в OCR,
+        а без OCR - сохраняются как изображения для мультимодальной модели.
+        Распознанный текст сканов входит в бюджет символов наравне с
+        текстовым слоем.
+
+        Args:
+            content: Содержимое PDF файла
+            owner: Пользователь, приславший документ (для поиска повторных страниц)
+
+        Returns:
+            Содержимое документа или None при ошибке
+        """
         if not PDF_AVAILABLE:
             return None
 
         try:
-            pdf_file = io.BytesIO(content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            parts: List[str] = []
+            images: List[ContractImage] = []
+            scanned_pages = 0
+            collected = 0
+
+            for page in self.iter_pdf_pages(content):
+                if not page.scanned:
+                    if page.text:
+                        parts.append(page.text)
+                        collected += len(page.text)
+                else:
+                    scanned_pages += 1
+                    for image_bytes in page.images or []:
+                        image_document = self.process_image(image_bytes, owner)
+                        if image_document.text:
+                            parts.append(image_document.text)
+                            collected += len(image_document.text)
+                        images.extend(image_document.images)
 
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
+                if self.max_text_chars and collected >= self.max_text_chars:
+                    self.logger.info(f"PDF: бюджет {self.max_text_chars} символов набран с учетом сканов на странице {page.number}")
+                    break
 
-            return text.strip()
+            if scanned_pages:
+                self.logger.info(f"PDF: найдено отсканированных страниц: {scanned_pages}")
+
+            return ContractDocument(text="\n".join(parts).strip(), images=images)
 
         except Exception as e:
             self.logger.error(f"Ошибка извлечения текста из PDF: {e}")
@@ -141,32 +309,53 @@ class DocumentParser:
             self.logger.error(f"Ошибка извлечения текста из DOCX: {e}")
             return None
 
+    def process_image(self, content: bytes, owner: str = "") -> ContractDocument:
+        """
+        Распознает текст изображения или готовит его для Deepseek.
+
+        Повторно присланная страница не распознается заново - текст берется из индекса.
+
+        Args:
+            content: Содержимое изображения
+            owner: Пользователь, приславший изображение
+
+        Returns:
+            Документ с текстом (OCR) или с изображением (без OCR)
+        """
+        if not OCR_AVAILABLE:
+            # Если OCR недоступен, передаем уменьшенное изображение в мультимодальную модель
+            return ContractDocument(images=[prepare_for_vision(content)])
+
+        page_hash = dhash(content, self.PAGE_HASH_SIZE)
+        if page_hash is not None:
+            cached_text = self.page_index.get(page_hash, namespace=owner)
+            if cached_text is not None:
+                self.logger.info("Страница уже распознавалась, OCR пропущен")
+                return ContractDocument(text=cached_text)
+
+        text = self.extract_text_from_image(content) or ""
+        if page_hash is not None and text and text != self.OCR_FAILED_TEXT:
+            self.page_index.put(page_hash, text, namespace=owner)
+        return ContractDocument(text=text)
+
     def extract_text_from_image(self, content: bytes) -> Optional[str]:
         """
-        Извлекает текст из изображения с помощью OCR или возвращает base64 для Deepseek.
+        Извлекает текст из изображения с помощью OCR.
+
+        Изображение предварительно поворачивается по EXIF, переводится
+        в оттенки серого, выравнивается и уменьшается.
 
         Args:
             content: Содержимое изображения
 
         Returns:
-            Извлеченный текст, base64 строка или None при ошибке
+            Извлеченный текст или None, если OCR недоступен
         """
         if not OCR_AVAILABLE:
-            # Если OCR недоступен, конвертируем изображение в base64 для отправки в Deepseek
-            try:
-                import base64
-                base64_image = base64.b64encode(content).decode('utf-8')
-                return f"[IMAGE:{base64_image}]"
-            except Exception as e:
-                self.logger.error(f"Ошибка кодирования изображения в base64: {e}")
-                return "[Изображение документа - не удалось обработать]"
+            return None
 
         try:
-            image = Image.open(io.BytesIO(content))
-
-            # Конвертация в RGB если необходимо
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            image = preprocess_for_ocr(content)
 
             # OCR с русским языком
             text = pytesseract.image_to_string(image, lang='rus+eng')
@@ -175,7 +364,7 @@ class DocumentParser:
 
         except Exception as e:
             self.logger.error(f"Ошибка OCR: {e}")
-            return "[Не удалось распознать текст в изображении]"
+            return self.OCR_FAILED_TEXT
 
     def extract_text_from_txt(self, content: bytes) -> Optional[str]:
         """
@@ -212,6 +401,20 @@ class DocumentParser:
         Returns:
             Извлеченный текст или None при ошибке
         """
+        document = await self.extract_document_from_attachment(attachment)
+        return document.text if document and document.text else None
+
+    async def extract_document_from_attachment(self, attachment: Any, owner: str = "") -> Optional[ContractDocument]:
+        """
+        Извлекает содержимое вложения VK.
+
+        Args:
+            attachment: Объект вложения из VK API (VKBottle Pydantic model)
+            owner: Пользователь, приславший вложение (для поиска повторных страниц)
+
+        Returns:
+            Текст и изображения документа или None при ошибке
+        """
         try:
             # VKBottle использует Pydantic модели, получаем тип через атрибут
             attachment_type = getattr(attachment, 'type', None)
@@ -233,14 +436,15 @@ class DocumentParser:
 
                 # Извлекаем текст в зависимости от типа
                 if ext == 'pdf' or url.lower().endswith('.pdf'):
-                    return self.extract_text_from_pdf(content)
+                    return self.extract_document_from_pdf(content, owner)
                 elif ext == 'docx' or url.lower().endswith('.docx'):
-                    return self.extract_text_from_docx(content)
+                    text = self.extract_text_from_docx(content)
                 elif ext == 'txt' or url.lower().endswith('.txt'):
-                    return self.extract_text_from_txt(content)
+                    text = self.extract_text_from_txt(content)
                 else:
                     self.logger.warning(f"Неподдерживаемый тип документа: {ext}")
                     return None
+                return ContractDocument(text=text) if text is not None else None
 
             # Обработка изображений
             elif attachment_type == 'photo':
@@ -267,8 +471,8 @@ class DocumentParser:
                 if not content:
                     return None
 
-                # Извлекаем текст с помощью OCR
-                return self.extract_text_from_image(content)
+                # Извлекаем текст с помощью OCR или готовим изображение для Deepseek
+                return self.process_image(content, owner)
 
             else:
                 self.logger.warning(f"Неподдерживаемый тип вложения: {attachment_type}")
@@ -0,0 +1,199 @@
+"""
+Поиск повторно поданных объявлений.
+Для каждого опубликованного и отложенного поста хранится отпечаток из
+нормализованных адреса, цены, количества комнат и телефона, а также
+его фотографии. Фото, которые уже загружались, получают то же вложение
+(см. индекс загруженных фото в post.py), поэтому совпадение вложения -
+совпадение фото. Проверка черновика - несколько обращений к словарям.
+"""
+import logging
+import re
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from bot.services.search import parse_post_text
+
+logger = logging.getLogger("duplicates")
+
+# Сокращения в адресах, которые пишут по-разному
+ADDRESS_WORDS = {
+    "улица": "ул",
+    "проспект": "пр",
+    "пр-т": "пр",
+    "просп": "пр",
+    "переулок": "пер",
+    "бульвар": "б-р",
+    "шоссе": "ш",
+    "площадь": "пл",
+    "дом": "д",
+    "корпус": "к",
+    "корп": "к",
+    "квартира": "кв",
+}
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """Адрес в нижнем регистре без знаков препинания и с единообразными сокращениями."""
+    if not address:
+        return ""
+    words = re.findall(r"[0-9a-zа-яё\-]+", address.lower().replace("ё", "е"))
+    return " ".join(ADDRESS_WORDS.get(word, word) for word in words)
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Последние 10 цифр номера (+7 и 8 в начале дают один и тот же номер)."""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:]
+
+
+def listing_fingerprint(
+    address: Optional[str],
+    price: Optional[int],
+    rooms: Optional[int],
+    phone: Optional[str],
+) -> Optional[str]:
+    """
+    Отпечаток объявления.
+
+    Returns:
+        Строка-ключ или None, если адреса или телефона нет
+    """
+    address_key = normalize_address(address)
+    phone_key = normalize_phone(phone)
+    if not address_key or not phone_key:
+        return None
+    return f"{address_key}|{price or ''}|{rooms or ''}|{phone_key}"
+
+
+def draft_fingerprint(draft: Dict[str, Any]) -> Optional[str]:
+    """Отпечаток черновика объявления."""
+    return listing_fingerprint(
+        draft.get("address"), draft.get("price"), draft.get("rooms"), draft.get("phone")
+    )
+
+
+def post_photos(item: Dict[str, Any]) -> List[str]:
+    """Вложения photo<owner>_<id> поста."""
+    photos = []
+    for attachment in item.get("attachments") or []:
+        if attachment.get("type") != "photo":
+            continue
+        photo = attachment.get("photo") or {}
+        if photo.get("owner_id") is not None and photo.get("id") is not None:
+            photos.append(f"photo{photo['owner_id']}_{photo['id']}")
+    return photos
+
+
+class ListingIndex:
+    """Индекс объявлений сообщества по отпечатку и фотографиям."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._posts: Dict[int, Dict[str, Any]] = {}
+        self._by_fingerprint: Dict[str, int] = {}
+        self._by_photo: Dict[str, int] = {}
+
+    def _remove(self, post_id: int) -> None:
+        entry = self._posts.pop(post_id, None)
+        if entry is None:
+            return
+        if self._by_fingerprint.get(entry["fingerprint"]) == post_id:
+            del self._by_fingerprint[entry["fingerprint"]]
+        for photo in entry["photos"]:
+            if self._by_photo.get(photo) == post_id:
+                del self._by_photo[photo]
+
+    def add(
+        self,
+        post_id: int,
+        fingerprint: Optional[str],
+        photos: Iterable[str],
+        postponed: bool = False,
+        publish_date: Optional[int] = None,
+    ) -> None:
+        """Добавляет или заменяет запись поста."""
+        photos = [photo for photo in photos if photo]
+        with self._lock:
+            self._remove(post_id)
+            if not fingerprint and not photos:
+                return
+            self._posts[post_id] = {
+                "fingerprint": fingerprint,
+                "photos": photos,
+                "postponed": postponed,
+                "publish_date": publish_date,
+            }
+            if fingerprint:
+                self._by_fingerprint[fingerprint] = post_id
+            for photo in photos:
+                self._by_photo[photo] = post_id
+
+    def add_post(
+        self,
+        item: Dict[str, Any],
+        postponed: bool = False,
+        parsed: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Добавляет пост стены (из wall.get или события wall_post_new)."""
+        post_id = item.get("id")
+        if post_id is None:
+            return
+        if parsed is None:
+            parsed = parse_post_text(item.get("text") or "")
+        fingerprint = listing_fingerprint(
+            parsed.get("address"),
+            parsed.get("price_value"),
+            parsed.get("rooms_value"),
+            parsed.get("phone"),
+        )
+        self.add(post_id, fingerprint, post_photos(item), postponed, item.get("date"))
+
+    def remove(self, post_id: int) -> None:
+        """Удаляет пост из индекса."""
+        with self._lock:
+            self._remove(post_id)
+
+    def find(self, draft: Dict[str, Any], attachments: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ищет объявление, совпадающее с черновиком.
+
+        Args:
+            draft: Черновик объявления
+            attachments: Вложения загруженных фото черновика
+
+        Returns:
+            {"post_id", "postponed", "publish_date", "match": "fields"|"photo"} или None
+        """
+        fingerprint = draft_fingerprint(draft)
+        photos: Set[str] = set(filter(None, (attachments or "").split(",")))
+
+        with self._lock:
+            post_id, match = None, None
+            if fingerprint and fingerprint in self._by_fingerprint:
+                post_id, match = self._by_fingerprint[fingerprint], "fields"
+            else:
+                for photo in photos:
+                    if photo in self._by_photo:
+                        post_id, match = self._by_photo[photo], "photo"
+                        break
+            if post_id is None:
+                return None
+            entry = self._posts[post_id]
+            return {
+                "post_id": post_id,
+                "postponed": entry["postponed"],
+                "publish_date": entry["publish_date"],
+                "match": match,
+            }
+
+    def stats(self) -> Dict[str, int]:
+        """Размер индекса."""
+        with self._lock:
+            return {
+                "posts": len(self._posts),
+                "fingerprints": len(self._by_fingerprint),
+                "photos": len(self._by_photo),
+            }
+
+
+listing_index = ListingIndex()
@@ -0,0 +1,222 @@
+"""
+Битовые индексы для фильтров с несколькими значениями.
+Фильтр района и количества комнат может быть одним значением или
+списком ("Канавинский или Сормовский", "1 или 2 комнаты"). Для каждого
+значения поля хранится битовая маска (целое число Python) записей с этим
+значением, поэтому условие по полю - OR масок его значений, а сочетание
+полей - AND. Один и тот же индекс используется для постов (какие посты
+подходят под поиск) и для подписок (каким подпискам подходит пост).
+"""
+from threading import Lock
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional
+
+# Поля фильтров с несколькими значениями: поле фильтра -> поле поста
+FILTER_FIELDS = {
+    "district": "district",
+    "rooms": "rooms_value",
+}
+
+
+def _normalize(field: str, value: Any) -> Any:
+    """Значение поля в виде для сравнения."""
+    if field == "district":
+        return str(value).strip().lower()
+    if field == "rooms":
+        return int(value)
+    return value
+
+
+def filter_values(filters: Dict[str, Any], field: str) -> Optional[FrozenSet[Any]]:
+    """
+    Допустимые значения поля фильтра.
+
+    Returns:
+        Множество значений или None, если поле не ограничено
+    """
+    value = filters.get(field)
+    if value is None or value == "" or value == []:
+        return None
+    values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+    result = set()
+    for item in values:
+        try:
+            result.add(_normalize(field, item))
+        except (TypeError, ValueError):
+            continue
+    return frozenset(result) or None
+
+
+def post_values(parsed: Dict[str, Any], field: str) -> Optional[Any]:
+    """Значение поля фильтра у распарсенного поста (None - поле не указано)."""
+    value = parsed.get(FILTER_FIELDS[field])
+    if value is None or value == "":
+        return None
+    return _normalize(field, value)
+
+
+def format_values(value: Any) -> str:
+    """Значение фильтра для показа пользователю."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    """Номера установленных битов маски."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+class BitmapIndex:
+    """
+    Индекс записей по значениям полей фильтров.
+
+    Каждая запись получает номер бита. Для записи-поста у поля одно
+    значение (или ни одного), для записи-подписки - множество допустимых
+    значений или "любое" (None).
+    """
+
+    def __init__(self, fields: Iterable[str] = tuple(FILTER_FIELDS)):
+        self.fields = tuple(fields)
+        self._lock = Lock()
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Optional[Hashable]] = []
+        self._free: List[int] = []
+        self._entries: Dict[Hashable, Dict[str, Optional[FrozenSet[Any]]]] = {}
+        self._bits: Dict[str, Dict[Any, int]] = {field: {} for field in self.fields}
+        self._any: Dict[str, int] = {field: 0 for field in self.fields}
+        self._all = 0
+
+    def _clear_bit(self, field: str, value: Any, bit: int) -> None:
+        bitmaps = self._bits[field]
+        bitmaps[value] &= ~bit
+        if not bitmaps[value]:
+            del bitmaps[value]
+
+    def _remove(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        bit = 1 << slot
+        for field, values in self._entries.pop(key).items():
+            if values is None:
+                self._any[field] &= ~bit
+            else:
+                for value in values:
+                    self._clear_bit(field, value, bit)
+        self._all &= ~bit
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def add(self, key: Hashable, values: Dict[str, Optional[Iterable[Any]]]) -> None:
+        """
+        Добавляет или заменяет запись.
+
+        Args:
+            key: Ключ записи (ID поста, подписка)
+            values: Поле -> допустимые значения (None - любое значение)
+        """
+        entry = {
+            field: None if values.get(field) is None else frozenset(values[field])
+            for field in self.fields
+        }
+        with self._lock:
+            self._remove(key)
+            if self._free:
+                slot = self._free.pop()
+                self._keys[slot] = key
+            else:
+                slot = len(self._keys)
+                self._keys.append(key)
+            bit = 1 << slot
+            self._slots[key] = slot
+            self._entries[key] = entry
+            for field, field_values in entry.items():
+                if field_values is None:
+                    self._any[field] |= bit
+                else:
+                    for value in field_values:
+                        bitmaps = self._bits[field]
+                        bitmaps[value] = bitmaps.get(value, 0) | bit
+            self._all |= bit
+
+    def add_post(self, post_id: int, parsed: Dict[str, Any]) -> None:
+        """Добавляет пост: у каждого поля одно значение или ни одного."""
+        values = {}
+        for field in self.fields:
+            value = post_values(parsed, field)
+            values[field] = () if value is None else (value,)
+        self.add(post_id, values)
+
+    def add_filters(self, key: Hashable, filters: Dict[str, Any]) -> None:
+        """Добавляет фильтры подписки: незаданное поле подходит под любое значение."""
+        self.add(key, {field: filter_values(filters, field) for field in self.fields})
+
+    def remove(self, key: Hashable) -> None:
+        """Удаляет запись."""
+        with self._lock:
+            self._remove(key)
+
+    def select(self, values: Dict[str, Optional[Iterable[Any]]]) -> int:
+        """
+        Маска записей, подходящих под значения полей.
+
+        Для поля с ограничением запись подходит, если у нее есть одно из
+        значений или она допускает любое значение; поля без ограничения
+        (None) не проверяются.
+        """
+        with self._lock:
+            result = self._all
+            for field in self.fields:
+                field_values = values.get(field)
+                if field_values is None:
+                    continue
+                bitmaps = self._bits[field]
+                field_bits = self._any[field]
+                for value in field_values:
+                    field_bits |= bitmaps.get(value, 0)
+                result &= field_bits
+                if not result:
+                    break
+            return result
+
+    def select_filters(self, filters: Dict[str, Any]) -> int:
+        """Маска постов, подходящих под фильтры поиска."""
+        return self.select({field: filter_values(filters, field) for field in self.fields})
+
+    def select_post(self, parsed: Dict[str, Any]) -> int:
+        """Маска подписок, которым подходит пост."""
+        values = {}
+        for field in self.fields:
+            value = post_values(parsed, field)
+            values[field] = () if value is None else (value,)
+        return self.select(values)
+
+    def keys(self, bitmap: int) -> List[Hashable]:
+        """Ключи записей маски."""
+        with self._lock:
+            keys = [self._keys[slot] for slot in iter_bits(bitmap) if slot < len(self._keys)]
+        return [key for key in keys if key is not None]
+
+    def contains(self, bitmap: int, key: Hashable) -> bool:
+        """Входит ли запись в маску."""
+        with self._lock:
+            slot = self._slots.get(key)
+        return slot is not None and bool(bitmap >> slot & 1)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def stats(self) -> Dict[str, int]:
+        """Размер индекса."""
+        with self._lock:
+            result = {"entries": len(self._slots)}
+            for field in self.fields:
+                result[f"{field}_values"] = len(self._bits[field])
+            return result
+
+
+# Опубликованные посты, загруженные в индексы (см. ingest.py)
+post_filters = BitmapIndex()
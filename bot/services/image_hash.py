@@ -0,0 +1,235 @@
+"""
+Перцептивные хэши изображений и индекс уже обработанных изображений.
+Повторно присланная страница договора или фотография квартиры находится
+по хэшу (с допуском на пересжатие) вместе с результатом прошлой обработки:
+распознанным текстом или вложением VK.
+"""
+import io
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Set, Tuple
+
+from bot.services.json_writer import DEFAULT_FLUSH_INTERVAL, DeferredJsonWriter
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    # Pillow опционален - без него дубликаты изображений не ищутся
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(content: bytes, hash_size: int = 8) -> Optional[int]:
+    """
+    Вычисляет разностный хэш (dHash) изображения.
+
+    Изображение уменьшается до (hash_size + 1) x hash_size в оттенках серого,
+    каждый бит - сравнение соседних пикселей строки. Хэш устойчив
+    к пересжатию и изменению размера.
+
+    Args:
+        content: Байты изображения
+        hash_size: Сторона хэша (хэш содержит hash_size^2 бит)
+
+    Returns:
+        Хэш или None, если Pillow недоступен или изображение не читается
+    """
+    if not PIL_AVAILABLE:
+        return None
+
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(content))).convert("L")
+        image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    except Exception as e:
+        logger.warning("Failed to hash image: %s", e)
+        return None
+
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Количество различающихся бит двух хэшей."""
+    return bin(a ^ b).count("1")
+
+
+class ImageHashIndex:
+    """
+    Индекс обработанных изображений по перцептивному хэшу.
+
+    Похожие хэши (расстояние Хэмминга не больше max_distance) ищутся без
+    полного перебора: хэш делится на max_distance + 1 полос, и у похожих
+    хэшей хотя бы одна полоса совпадает точно.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hash_bits: int = 64,
+        max_distance: int = 4,
+        ttl_seconds: int = 30 * 24 * 60 * 60,
+        max_entries: int = 5000,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        """
+        Args:
+            path: Путь к JSON файлу индекса (пустая строка - только в памяти)
+            hash_bits: Длина хэша в битах
+            max_distance: Максимальное расстояние Хэмминга для дубликата
+            ttl_seconds: Время жизни записи в секундах
+            max_entries: Максимальное количество записей
+            flush_interval: Задержка фоновой записи файла (0 - запись сразу)
+        """
+        self.path = path
+        self.hash_bits = hash_bits
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+        bands = max_distance + 1
+        self._band_width = max(1, -(-hash_bits // bands))
+        self._band_count = -(-hash_bits // self._band_width)
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._bands: Dict[Tuple[str, int, int], Set[str]] = {}
+        for key, entry in self._load().items():
+            self._add(key, entry)
+        self._writer = DeferredJsonWriter(path, self._dump, flush_interval)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Загружает индекс из файла."""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.exception("Error loading image index: %s", e)
+            return {}
+
+    def _dump(self) -> str:
+        """Содержимое файла индекса (снимок под блокировкой)."""
+        with self._lock:
+            return json.dumps(self._entries, ensure_ascii=False)
+
+    def close(self) -> None:
+        """Сохраняет несохраненные изменения (при остановке бота)."""
+        self._writer.close()
+
+    def _band_keys(self, namespace: str, value: int):
+        """Ключи полос хэша."""
+        mask = (1 << self._band_width) - 1
+        for band in range(self._band_count):
+            yield namespace, band, (value >> (band * self._band_width)) & mask
+
+    def _add(self, key: str, entry: Dict[str, Any]) -> None:
+        """Добавляет запись в индекс полос."""
+        self._entries[key] = entry
+        for band_key in self._band_keys(entry["namespace"], int(entry["hash"], 16)):
+            self._bands.setdefault(band_key, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        """Удаляет запись из индекса."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry["namespace"], int(entry["hash"], 16)):
+            keys = self._bands.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band_key]
+
+    def get(self, value: int, namespace: str = "") -> Optional[str]:
+        """
+        Ищет ранее обработанное похожее изображение.
+
+        Args:
+            value: Перцептивный хэш изображения
+            namespace: Область поиска (например, пользователь)
+
+        Returns:
+            Сохраненный результат обработки или None
+        """
+        now = time.time()
+
+        with self._lock:
+            candidates: Set[str] = set()
+            for band_key in self._band_keys(namespace, value):
+                candidates.update(self._bands.get(band_key, ()))
+
+            best_key, best_distance = None, self.max_distance + 1
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry["created_at"] > self.ttl_seconds:
+                    continue
+                distance = hamming_distance(value, int(entry["hash"], 16))
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best_key]
+            entry["used_at"] = now
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, value: int, result: str, namespace: str = "") -> None:
+        """Сохраняет результат обработки изображения."""
+        now = time.time()
+        key = f"{namespace}:{value:x}"
+
+        with self._lock:
+            self._remove(key)
+            self._add(key, {
+                "namespace": namespace,
+                "hash": f"{value:x}",
+                "value": result,
+                "created_at": now,
+                "used_at": now,
+            })
+            self._evict(now)
+        self._writer.mark_dirty()
+
+    def _evict(self, now: float) -> None:
+        """Удаляет устаревшие записи и самые давно использованные сверх лимита."""
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry["created_at"] > self.ttl_seconds
+        ]
+        for key in expired:
+            self._remove(key)
+
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            by_usage = sorted(self._entries, key=lambda k: self._entries[k]["used_at"])
+            for key in by_usage[:overflow]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает статистику индекса."""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": size,
+        }
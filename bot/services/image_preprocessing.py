@@ -0,0 +1,150 @@
+"""
+Предобработка изображений договоров перед OCR и отправкой в Deepseek.
+Поворот по EXIF, перевод в оттенки серого, выравнивание наклона и
+уменьшение до разрешения, которого достаточно для распознавания текста.
+"""
+import base64
+import io
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps, ImageStat
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    # Pillow опционален - без него изображения передаются как есть
+
+logger = logging.getLogger(__name__)
+
+# Длинная сторона для OCR: ~200 dpi для листа A4, больше tesseract не нужно
+OCR_MAX_SIDE = int(os.getenv("CONTRACT_OCR_MAX_SIDE", "2300"))
+# Длинная сторона изображения для мультимодальной модели
+VISION_MAX_SIDE = int(os.getenv("CONTRACT_VISION_MAX_SIDE", "1600"))
+VISION_JPEG_QUALITY = 85
+
+# Перебор углов наклона при выравнивании (градусы)
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+# Размер уменьшенной копии, на которой ищется угол наклона
+DESKEW_SAMPLE_SIDE = 600
+
+
+@dataclass
+class ContractImage:
+    """Изображение договора, подготовленное для отправки в API."""
+    data: bytes
+    mime_type: str = "image/jpeg"
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    def to_data_url(self) -> str:
+        """Изображение в виде data URL для мультимодальной модели."""
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def _detect_mime_type(content: bytes) -> str:
+    """Определяет тип изображения по сигнатуре."""
+    if content.startswith(b"\x89PNG"):
+        return "image/png"
+    if content.startswith(b"BM"):
+        return "image/bmp"
+    if content.startswith((b"II*\x00", b"MM\x00*")):
+        return "image/tiff"
+    return "image/jpeg"
+
+
+def _downscale(image: "Image.Image", max_side: int) -> "Image.Image":
+    """Уменьшает изображение так, чтобы длинная сторона не превышала max_side."""
+    if max_side and max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def _projection_score(sample: "Image.Image", angle: float) -> float:
+    """
+    Резкость горизонтальной проекции при повороте на angle.
+
+    Строки текста выровнены, когда суммы по строкам пикселей
+    максимально различаются (тёмные строки чередуются со светлыми).
+    """
+    rotated = sample.rotate(angle, resample=Image.BILINEAR, fillcolor=0)
+    profile = rotated.resize((1, rotated.height), Image.BOX)
+    return ImageStat.Stat(profile).var[0]
+
+
+def estimate_skew(image: "Image.Image") -> float:
+    """
+    Оценивает угол наклона текста методом проекций.
+
+    Returns:
+        Угол в градусах, на который нужно повернуть изображение
+    """
+    sample = _downscale(image.convert("L"), DESKEW_SAMPLE_SIDE)
+    # Инвертируем и бинаризуем: текст - белый на черном фоне
+    sample = ImageOps.invert(ImageOps.autocontrast(sample)).point(lambda value: 255 if value > 128 else 0)
+
+    best_angle, best_score = 0.0, _projection_score(sample, 0.0)
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        if angle == 0:
+            continue
+        score = _projection_score(sample, angle)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def _normalize(image: "Image.Image") -> "Image.Image":
+    """Поворот по EXIF и перевод в оттенки серого."""
+    image = ImageOps.exif_transpose(image)
+    return image.convert("L")
+
+
+def preprocess_for_ocr(content: bytes) -> "Image.Image":
+    """
+    Готовит фотографию договора к OCR.
+
+    Args:
+        content: Исходные байты изображения
+
+    Returns:
+        Выровненное изображение в оттенках серого не больше OCR_MAX_SIDE
+    """
+    image = _downscale(_normalize(Image.open(io.BytesIO(content))), OCR_MAX_SIDE)
+
+    angle = estimate_skew(image)
+    if angle:
+        logger.debug("Deskew: rotating image by %.1f degrees", angle)
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return image
+
+
+def prepare_for_vision(content: bytes) -> ContractImage:
+    """
+    Готовит изображение договора к отправке в мультимодальную модель.
+
+    Без Pillow изображение передается без изменений.
+
+    Args:
+        content: Исходные байты изображения
+
+    Returns:
+        Сжатое изображение не больше VISION_MAX_SIDE
+    """
+    if not PIL_AVAILABLE:
+        return ContractImage(data=content, mime_type=_detect_mime_type(content))
+
+    try:
+        image = _downscale(_normalize(Image.open(io.BytesIO(content))), VISION_MAX_SIDE)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning("Image preprocessing failed, sending original: %s", e)
+        return ContractImage(data=content, mime_type=_detect_mime_type(content))
+
+    return ContractImage(data=buffer.getvalue(), width=image.width, height=image.height)
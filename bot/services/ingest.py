@@ -0,0 +1,173 @@
+"""
+Загрузка постов стены в индексы бота.
+При запуске стена (опубликованные и отложенные посты) читается один раз,
+дальше индексы обновляются по событиям публикации и постами, которые
+встретились при поиске. Каждый пост обрабатывается один раз, пока его
+не отредактируют.
+"""
+import logging
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+
+from bot.config import GROUP_ID, USER_TOKEN, UPLOAD_TOKEN, GROUP_TOKEN, WALL_CRAWL_LIMIT
+from bot.services.duplicates import listing_index
+from bot.services.filter_index import post_filters
+from bot.services.market_stats import market_stats
+from bot.services.near_duplicates import near_duplicates
+from bot.services.post_store import post_store
+from bot.services.search import parse_post_text
+from bot.services.text_index import listing_text, text_index
+from bot.services.vk_api import vk_api_call
+
+logger = logging.getLogger("ingest")
+
+WALL_GET_PAGE = 100
+
+# ID поста -> версия (дата правки, отложен ли), с которой он загружен
+_ingested: Dict[int, Any] = {}
+# Опубликованные посты для выдачи результатов по индексам
+_posts: Dict[int, Dict[str, Any]] = {}
+_ingested_lock = Lock()
+# Последние WALL_CRAWL_LIMIT постов стены загружены без ошибок
+_wall_indexed = False
+
+
+def ingest_post(item: Dict[str, Any], postponed: bool = False) -> bool:
+    """
+    Добавляет пост стены в индексы.
+
+    Returns:
+        True если пост обработан, False если эта версия уже загружена
+    """
+    post_id = item.get("id")
+    if post_id is None:
+        return False
+
+    version = (item.get("edited") or item.get("date"), postponed)
+    with _ingested_lock:
+        if _ingested.get(post_id) == version:
+            return False
+        _ingested[post_id] = version
+        if not postponed:
+            _posts[post_id] = item
+
+    text = item.get("text") or ""
+    parsed = parse_post_text(text)
+    listing_index.add_post(item, postponed=postponed, parsed=parsed)
+    if not postponed:
+        near_duplicates.add_post(item, parsed)
+        market_stats.add(post_id, parsed, item.get("date"))
+        if parsed:
+            text_index.add(post_id, listing_text(text, parsed))
+            post_filters.add_post(post_id, parsed)
+            post_store.add(post_id, parsed, item.get("date"))
+        else:
+            # Пост без полей объявления (в том числе после правки) в поиск не попадает
+            text_index.remove(post_id)
+            post_filters.remove(post_id)
+            post_store.remove(post_id)
+    return True
+
+
+def remove_post(post_id: int) -> None:
+    """Удаляет пост из индексов."""
+    with _ingested_lock:
+        _ingested.pop(post_id, None)
+        _posts.pop(post_id, None)
+    listing_index.remove(post_id)
+    near_duplicates.remove(post_id)
+    text_index.remove(post_id)
+    post_filters.remove(post_id)
+    post_store.remove(post_id)
+    market_stats.remove(post_id)
+
+
+def get_post(post_id: int) -> Optional[Dict[str, Any]]:
+    """Загруженный опубликованный пост."""
+    with _ingested_lock:
+        return _posts.get(post_id)
+
+
+def wall_indexed() -> bool:
+    """Загружены ли в индексы последние WALL_CRAWL_LIMIT постов стены."""
+    return _wall_indexed
+
+
+def iter_wall(
+    token: str,
+    wall_filter: Optional[str] = None,
+    limit: int = WALL_CRAWL_LIMIT,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Читает посты сообщества от новых к старым.
+
+    Args:
+        token: Токен с доступом к wall.get
+        wall_filter: Фильтр wall.get (postponed - отложенные)
+        limit: Максимум постов
+
+    Raises:
+        RuntimeError: wall.get вернул ошибку
+    """
+    owner_id = -abs(int(GROUP_ID))
+    offset = 0
+    while offset < limit:
+        params = {
+            "owner_id": owner_id,
+            "offset": offset,
+            "count": min(WALL_GET_PAGE, limit - offset),
+        }
+        if wall_filter:
+            params["filter"] = wall_filter
+        resp = vk_api_call("wall.get", params, token=token)
+        if "error" in resp:
+            raise RuntimeError(f"wall.get ({wall_filter or 'all'}) failed: {resp['error']}")
+
+        items: List[Dict[str, Any]] = resp.get("response", {}).get("items", [])
+        yield from items
+        offset += len(items)
+        if len(items) < params["count"]:
+            return
+
+
+def crawl_wall(limit: int = WALL_CRAWL_LIMIT) -> int:
+    """
+    Загружает в индексы последние limit постов и все отложенные посты.
+
+    Returns:
+        Количество загруженных постов
+    """
+    global _wall_indexed
+    if not GROUP_ID:
+        return 0
+
+    count = 0
+    wall_token = USER_TOKEN or UPLOAD_TOKEN
+    if wall_token:
+        try:
+            for item in iter_wall(wall_token, limit=limit):
+                ingest_post(item)
+                count += 1
+            _wall_indexed = True
+        except RuntimeError as e:
+            logger.warning("%s", e)
+
+    postponed_token = UPLOAD_TOKEN or GROUP_TOKEN
+    if postponed_token:
+        try:
+            for item in iter_wall(postponed_token, "postponed"):
+                ingest_post(item, postponed=True)
+                count += 1
+        except RuntimeError as e:
+            logger.warning("%s", e)
+
+    logger.info(
+        "Wall crawled: %d posts, listing index %s, near duplicates %s, text index %s, post store %s, market stats %s",
+        count,
+        listing_index.stats(),
+        near_duplicates.stats(),
+        text_index.stats(),
+        post_store.stats(),
+        market_stats.stats(),
+    )
+    return count
@@ -0,0 +1,83 @@
+"""
+Отложенная запись JSON файлов кэшей и индексов.
+Как и хранилище (storage.py), файл не переписывается при каждом
+изменении: изменение только отмечается, а запись выполняется фоновым
+таймером не чаще раза в flush_interval секунд и при остановке бота.
+"""
+import logging
+import os
+import threading
+from threading import Lock
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Задержка фоновой записи по умолчанию, секунды
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+
+class DeferredJsonWriter:
+    """Фоновая запись JSON файла по отметке об изменении."""
+
+    def __init__(self, path: str, dump: Callable[[], str], flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        """
+        Args:
+            path: Путь к файлу (пустая строка - ничего не записывается)
+            dump: Возвращает содержимое файла; вызывается из потока таймера
+                и сам берет блокировку владельца данных
+            flush_interval: Задержка записи (0 - запись сразу)
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._dump = dump
+        self._flush_lock = Lock()
+        self._write_lock = Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._dirty = False
+
+    def mark_dirty(self) -> None:
+        """
+        Отмечает данные измененными и планирует запись.
+
+        Вызывается после освобождения блокировки владельца данных.
+        """
+        if not self.path:
+            return
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+
+        with self._flush_lock:
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Атомарно записывает текущее содержимое в файл."""
+        with self._flush_lock:
+            self._dirty = False
+            self._flush_timer = None
+        if not self.path:
+            return
+
+        with self._write_lock:
+            try:
+                content = self._dump()
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.exception("Error saving %s: %s", self.path, e)
+
+    def close(self) -> None:
+        """Отменяет отложенную запись и сохраняет изменения."""
+        with self._flush_lock:
+            timer, self._flush_timer = self._flush_timer, None
+            dirty = self._dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.flush()
@@ -0,0 +1,246 @@
+"""
+Статистика цен аренды по районам и количеству комнат.
+Для каждой пары (район, комнаты), а также для района целиком, для
+количества комнат по всему городу и для всех объявлений хранится
+потоковая гистограмма цен. Корзины растут в геометрической прогрессии,
+поэтому квантиль считается с относительной ошибкой не больше
+RELATIVE_ERROR. Гистограмма обновляется при загрузке каждого поста;
+в отличие от t-digest из нее можно вычесть цену отредактированного или
+удаленного поста, и ничего не пересчитывается заново при запросе.
+Для периодов поиска ("за 7 / 30 дней") ведутся такие же гистограммы:
+посты, ставшие старше периода, вычитаются из них по очереди дат.
+"""
+import heapq
+import math
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Относительная ошибка квантилей (ширина корзины - 2 * RELATIVE_ERROR)
+RELATIVE_ERROR = 0.01
+# Меньше стольких цен статистика не показывается
+MIN_SAMPLES = 5
+# Периоды в днях, для которых ведутся отдельные гистограммы (фильтр периода в поиске)
+PERIOD_DAYS = (7, 30)
+DAY = 24 * 60 * 60
+
+_GAMMA = (1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Ключ гистограммы: (район в нижнем регистре или None, комнаты или None)
+StatsKey = Tuple[Optional[str], Optional[int]]
+# Цена поста: (район, комнаты, корзина, дата публикации или None)
+PostEntry = Tuple[Optional[str], Optional[int], int, Optional[int]]
+
+
+def _bucket(price: int) -> int:
+    return math.ceil(math.log(price) / _LOG_GAMMA)
+
+
+def _bucket_value(bucket: int) -> float:
+    """Середина корзины (ошибка относительно любой цены в ней - не больше RELATIVE_ERROR)."""
+    return 2 * _GAMMA ** bucket / (_GAMMA + 1)
+
+
+class PriceHistogram:
+    """Количество цен в логарифмических корзинах."""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self._sorted: Optional[List[int]] = None
+
+    def add(self, bucket: int, delta: int = 1) -> None:
+        """Добавляет (delta > 0) или вычитает цену корзины."""
+        count = self.counts.get(bucket, 0) + delta
+        if count > 0:
+            if bucket not in self.counts:
+                self._sorted = None
+            self.counts[bucket] = count
+        else:
+            self.counts.pop(bucket, None)
+            self._sorted = None
+        self.count += delta
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Квантиль цены (0 <= q <= 1)."""
+        if self.count <= 0:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self.counts)
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in self._sorted:
+            seen += self.counts[bucket]
+            if seen > rank:
+                return _bucket_value(bucket)
+        return _bucket_value(self._sorted[-1])
+
+
+class MarketStats:
+    """Гистограммы цен опубликованных объявлений."""
+
+    def __init__(self, period_days: Tuple[int, ...] = PERIOD_DAYS):
+        """
+        Args:
+            period_days: Периоды в днях с отдельными гистограммами
+        """
+        self._lock = Lock()
+        self._histograms: Dict[StatsKey, PriceHistogram] = {}
+        # ID поста -> (район, комнаты, корзина, дата) для вычитания при правке
+        self._posts: Dict[int, PostEntry] = {}
+        # Название района для показа (как в первом посте)
+        self._district_names: Dict[str, str] = {}
+        # Период -> гистограммы постов за период, их ID и очередь (дата, ID) для вычитания
+        self._periods: Dict[int, Dict[StatsKey, PriceHistogram]] = {days: {} for days in period_days}
+        self._period_posts: Dict[int, Set[int]] = {days: set() for days in period_days}
+        self._period_queues: Dict[int, List[Tuple[int, int]]] = {days: [] for days in period_days}
+
+    @staticmethod
+    def _keys(district: Optional[str], rooms: Optional[int]) -> List[StatsKey]:
+        keys = [(district, rooms), (district, None), (None, rooms), (None, None)]
+        return list(dict.fromkeys(keys))
+
+    def _apply(self, histograms: Dict[StatsKey, PriceHistogram], entry: PostEntry, delta: int) -> None:
+        district, rooms, bucket, _ = entry
+        for key in self._keys(district, rooms):
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = PriceHistogram()
+            histogram.add(bucket, delta)
+            if histogram.count <= 0:
+                del histograms[key]
+
+    def _expire(self, now: float) -> None:
+        """Вычитает из гистограмм периодов посты старше периода."""
+        for days, queue in self._period_queues.items():
+            threshold = now - days * DAY
+            members = self._period_posts[days]
+            while queue and queue[0][0] < threshold:
+                date, post_id = heapq.heappop(queue)
+                entry = self._posts.get(post_id)
+                # В очереди могут остаться даты прежних версий поста
+                if post_id in members and entry is not None and entry[3] == date:
+                    members.discard(post_id)
+                    self._apply(self._periods[days], entry, -1)
+
+    def _remove(self, post_id: int) -> None:
+        previous = self._posts.pop(post_id, None)
+        if previous is None:
+            return
+        self._apply(self._histograms, previous, -1)
+        for days, members in self._period_posts.items():
+            if post_id in members:
+                members.discard(post_id)
+                self._apply(self._periods[days], previous, -1)
+
+    def add(self, post_id: int, parsed: Dict[str, Any], date: Optional[int] = None) -> None:
+        """Учитывает цену поста (заменяя прежнюю версию); date - время публикации."""
+        price = parsed.get("price_value")
+        district = (parsed.get("district") or "").strip()
+        rooms = parsed.get("rooms_value")
+        date = date if isinstance(date, int) else None
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+            self._remove(post_id)
+            if not price or price <= 0:
+                return
+            key = district.lower() or None
+            if key:
+                self._district_names.setdefault(key, district)
+            entry = (key, rooms, _bucket(price), date)
+            self._posts[post_id] = entry
+            self._apply(self._histograms, entry, 1)
+            if date is None:
+                return
+            for days, members in self._period_posts.items():
+                if date >= now - days * DAY:
+                    members.add(post_id)
+                    heapq.heappush(self._period_queues[days], (date, post_id))
+                    self._apply(self._periods[days], entry, 1)
+
+    def remove(self, post_id: int) -> None:
+        """Вычитает цену поста."""
+        with self._lock:
+            self._remove(post_id)
+
+    @property
+    def period_days(self) -> Tuple[int, ...]:
+        """Периоды в днях, для которых есть статистика."""
+        return tuple(self._periods)
+
+    def quantiles(
+        self,
+        district: Optional[str] = None,
+        rooms: Optional[int] = None,
+        qs: Tuple[float, ...] = (0.25, 0.5, 0.75),
+        days: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Квантили цен для района и количества комнат (None - все).
+
+        Без days считаются все загруженные посты, с days - посты за
+        последние days дней (только для периодов из period_days).
+
+        Returns:
+            {"count", "quantiles": [...]} или None, если цен меньше MIN_SAMPLES
+            или для периода нет статистики
+        """
+        key = ((district or "").strip().lower() or None, rooms)
+        with self._lock:
+            if days is None:
+                histograms = self._histograms
+            elif days in self._periods:
+                self._expire(time.time())
+                histograms = self._periods[days]
+            else:
+                return None
+            histogram = histograms.get(key)
+            if histogram is None or histogram.count < MIN_SAMPLES:
+                return None
+            return {"count": histogram.count, "quantiles": [histogram.quantile(q) for q in qs]}
+
+    def median(
+        self,
+        district: Optional[str] = None,
+        rooms: Optional[int] = None,
+        days: Optional[int] = None,
+    ) -> Optional[float]:
+        """Медиана цены (за последние days дней) или None, если данных мало."""
+        result = self.quantiles(district, rooms, (0.5,), days)
+        return result["quantiles"][0] if result else None
+
+    def table(self) -> List[Dict[str, Any]]:
+        """
+        Все гистограммы с квартилями.
+
+        Returns:
+            [{"district", "rooms", "count", "p25", "median", "p75"}, ...],
+            сначала районы по алфавиту (None - весь город), внутри - по комнатам
+        """
+        with self._lock:
+            rows = []
+            for (district, rooms), histogram in self._histograms.items():
+                rows.append({
+                    "district": self._district_names.get(district, district) if district else None,
+                    "rooms": rooms,
+                    "count": histogram.count,
+                    "p25": histogram.quantile(0.25),
+                    "median": histogram.quantile(0.5),
+                    "p75": histogram.quantile(0.75),
+                })
+        rows.sort(key=lambda row: (row["district"] is None, row["district"] or "", row["rooms"] is None, row["rooms"] or 0))
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        """Размер статистики."""
+        with self._lock:
+            stats = {"posts": len(self._posts), "groups": len(self._histograms)}
+            for days, members in self._period_posts.items():
+                stats[f"posts_{days}d"] = len(members)
+            return stats
+
+
+market_stats = MarketStats()
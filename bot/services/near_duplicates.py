@@ -0,0 +1,175 @@
+"""
+Поиск почти одинаковых постов (репосты, слегка измененные объявления).
+Для каждого поста один раз при загрузке считается MinHash-подпись по
+словам текста и распознанным полям, похожие посты находятся через LSH
+(совпадение полосы подписи) и объединяются в кластеры. Поиск показывает
+из кластера только самое новое подходящее объявление.
+"""
+import hashlib
+import random
+import re
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bot.services.search import parse_post_text
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Минимальная оценка сходства Жаккара для почти дубликата
+SIMILARITY_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Фиксированные коэффициенты: подписи сравнимы между запусками
+_rng = random.Random(1)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+FIELDS = ("district", "address", "price_value", "rooms_value", "floor_value", "phone")
+
+
+def _hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def shingles(text: str, parsed: Optional[Dict[str, Any]] = None) -> Set[str]:
+    """Тройки соседних слов текста и значения полей объявления."""
+    words = re.findall(r"[0-9a-zа-яё]+", (text or "").lower().replace("ё", "е"))
+    result = {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    } if words else set()
+    for field in FIELDS:
+        value = (parsed or {}).get(field)
+        if value not in (None, ""):
+            result.add(f"{field}={str(value).lower()}")
+    return result
+
+
+def minhash(tokens: Set[str]) -> Tuple[int, ...]:
+    """MinHash-подпись множества."""
+    hashes = [_hash(token) for token in tokens]
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Оценка сходства Жаккара по подписям."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """LSH-индекс подписей постов с кластерами почти дубликатов."""
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        """
+        Args:
+            threshold: Минимальное сходство для объединения постов
+        """
+        self.threshold = threshold
+        self._lock = Lock()
+        self._signatures: Dict[int, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        self._parent: Dict[int, int] = {}
+
+    def _bands(self, signature: Tuple[int, ...]):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def _find(self, post_id: int) -> int:
+        root = post_id
+        while self._parent.get(root, root) != root:
+            root = self._parent[root]
+        while post_id != root:
+            self._parent[post_id], post_id = root, self._parent[post_id]
+        return root
+
+    def _union(self, a: int, b: int) -> None:
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            # Корень кластера - пост с наибольшим ID (самый новый)
+            low, high = sorted((root_a, root_b))
+            self._parent[low] = high
+
+    def _unlink(self, post_id: int) -> None:
+        signature = self._signatures.pop(post_id, None)
+        if signature is None:
+            return
+        for key in self._bands(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(post_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def add(self, post_id: int, text: str, parsed: Optional[Dict[str, Any]] = None) -> None:
+        """Считает подпись поста и присоединяет его к кластеру похожих."""
+        signature = minhash(shingles(text, parsed))
+        with self._lock:
+            self._unlink(post_id)
+            self._signatures[post_id] = signature
+            self._parent.setdefault(post_id, post_id)
+
+            candidates: Set[int] = set()
+            for key in self._bands(signature):
+                bucket = self._buckets.setdefault(key, set())
+                candidates.update(bucket)
+                bucket.add(post_id)
+
+            for other in candidates:
+                if other != post_id and similarity(signature, self._signatures[other]) >= self.threshold:
+                    self._union(post_id, other)
+
+    def add_post(self, item: Dict[str, Any], parsed: Optional[Dict[str, Any]] = None) -> None:
+        """Добавляет пост стены."""
+        post_id = item.get("id")
+        if post_id is None:
+            return
+        text = item.get("text") or ""
+        self.add(post_id, text, parsed if parsed is not None else parse_post_text(text))
+
+    def remove(self, post_id: int) -> None:
+        """
+        Удаляет подпись поста.
+
+        Связи в кластерах остаются: кластер лишь перестает находить
+        новые посты через удаленный.
+        """
+        with self._lock:
+            self._unlink(post_id)
+
+    def cluster_of(self, post_id: int) -> Optional[int]:
+        """ID кластера поста (None - пост не загружен)."""
+        with self._lock:
+            if post_id not in self._parent:
+                return None
+            return self._find(post_id)
+
+    def clusters(self) -> List[List[int]]:
+        """Кластеры из нескольких постов."""
+        with self._lock:
+            groups: Dict[int, List[int]] = {}
+            for post_id in self._signatures:
+                groups.setdefault(self._find(post_id), []).append(post_id)
+        return [sorted(group) for group in groups.values() if len(group) > 1]
+
+    def stats(self) -> Dict[str, int]:
+        """Размер индекса."""
+        clusters = self.clusters()
+        return {
+            "posts": len(self._signatures),
+            "clusters": len(clusters),
+            "collapsed": sum(len(group) - 1 for group in clusters),
+        }
+
+
+near_duplicates = NearDuplicateIndex()
@@ -5,11 +5,14 @@
 import logging
 import asyncio
 import random
-from typing import Dict, Any, List, Optional
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
 
 from bot.config import GROUP_ID, TOKEN_FOR_BOT
 from bot.services.vk_api import vk_api_call
+from bot.services.filter_index import BitmapIndex, filter_values, format_values, post_values
 from bot.services.search import parse_post_text
+from bot.services.text_index import matches_keywords
 from storage import storage
 
 logger = logging.getLogger("notifications")
@@ -20,23 +23,26 @@ def _random_id() -> int:
     return random.randint(-2_147_483_648, 2_147_483_647)
 
 
-def match_post_with_filters(parsed_post: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+def match_post_with_filters(
+    parsed_post: Dict[str, Any],
+    filters: Dict[str, Any],
+    text: Optional[str] = None,
+) -> bool:
     """
     Проверяет, соответствует ли пост фильтрам подписки.
 
     Args:
         parsed_post: Распарсенные данные поста
         filters: Фильтры подписки
+        text: Текст поста (нужен для фильтра по словам)
 
     Returns:
         True если пост подходит под фильтры
     """
-    # Фильтр по району
-    district_filter = filters.get("district")
-    if district_filter:
-        district = parsed_post.get("district")
-        if not district or district.lower() != district_filter.lower():
-            return False
+    # Фильтр по районам
+    districts = filter_values(filters, "district")
+    if districts is not None and post_values(parsed_post, "district") not in districts:
+        return False
 
     # Фильтр по цене
     price_value = parsed_post.get("price_value")
@@ -50,16 +56,74 @@ def match_post_with_filters(parsed_post: Dict[str, Any], filters: Dict[str, Any]
         if price_value is None or price_value > price_max:
             return False
 
-    # Фильтр по комнатам
-    rooms_value = parsed_post.get("rooms_value")
-    rooms_filter = filters.get("rooms")
-    if rooms_filter is not None:
-        if rooms_value is None or rooms_value != rooms_filter:
-            return False
+    # Фильтр по количеству комнат
+    rooms = filter_values(filters, "rooms")
+    if rooms is not None and post_values(parsed_post, "rooms") not in rooms:
+        return False
+
+    # Фильтр по словам в описании
+    if filters.get("keywords") and not matches_keywords(text or "", parsed_post, filters["keywords"]):
+        return False
 
     return True
 
 
+class SubscriptionMatcher:
+    """
+    Битовый индекс активных подписок по районам и количеству комнат.
+
+    Для нового поста маска подходящих подписок - AND по полям от OR масок
+    значений поста и подписок без ограничения поля; цена и слова
+    проверяются только у подписок из маски. Индекс перестраивается, когда
+    меняется набор подписок в хранилище.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._index = BitmapIndex()
+        self._subscriptions: Dict[Tuple[int, str], Tuple[int, Dict[str, Any]]] = {}
+        self._revision: Optional[int] = None
+
+    def _refresh(self) -> None:
+        revision = storage.get_subscriptions_revision()
+        if revision == self._revision:
+            return
+        index = BitmapIndex()
+        subscriptions = {}
+        for user_id, subscription in storage.get_all_active_subscriptions():
+            key = (user_id, subscription.get("id"))
+            index.add_filters(key, subscription.get("filters") or {})
+            subscriptions[key] = (user_id, subscription)
+        self._index, self._subscriptions, self._revision = index, subscriptions, revision
+
+    def count(self) -> int:
+        """Количество активных подписок."""
+        with self._lock:
+            self._refresh()
+            return len(self._subscriptions)
+
+    def matching(self, parsed_post: Dict[str, Any], text: Optional[str] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Активные подписки, которым подходит пост.
+
+        Returns:
+            Список кортежей (user_id, subscription)
+        """
+        with self._lock:
+            self._refresh()
+            index, subscriptions = self._index, self._subscriptions
+
+        result = []
+        for key in index.keys(index.select_post(parsed_post)):
+            user_id, subscription = subscriptions[key]
+            if match_post_with_filters(parsed_post, subscription.get("filters") or {}, text):
+                result.append((user_id, subscription))
+        return result
+
+
+subscription_matcher = SubscriptionMatcher()
+
+
 async def send_notification(user_id: int, post: Dict[str, Any], filters: Dict[str, Any]) -> bool:
     """
     Отправляет уведомление пользователю о новом объявлении.
@@ -80,13 +144,13 @@ async def send_notification(user_id: int, post: Dict[str, Any], filters: Dict[st
         # Формируем текст уведомления
         filter_parts = []
         if filters.get("district"):
-            filter_parts.append(f"Район: {filters['district']}")
+            filter_parts.append(f"Район: {format_values(filters['district'])}")
         if filters.get("price_min"):
             filter_parts.append(f"Цена от: {filters['price_min']}")
         if filters.get("price_max"):
             filter_parts.append(f"Цена до: {filters['price_max']}")
         if filters.get("rooms"):
-            filter_parts.append(f"Комнат: {filters['rooms']}")
+            filter_parts.append(f"Комнат: {format_values(filters['rooms'])}")
 
         filter_text = ", ".join(filter_parts) if filter_parts else "все параметры"
 
@@ -185,9 +249,7 @@ async def check_new_posts_and_notify() -> int:
 
         logger.info("Found %d new posts to process", len(new_posts))
 
-        # Получаем все активные подписки
-        active_subs = storage.get_all_active_subscriptions()
-        if not active_subs:
+        if not subscription_matcher.count():
             logger.info("No active subscriptions, skipping notifications")
             # Обновляем last_checked_post_id чтобы не проверять эти посты снова
             if latest_post_id:
@@ -204,8 +266,8 @@ async def check_new_posts_and_notify() -> int:
 
             # Обрабатываем пост только если он содержит данные объявления
             if parsed:
-                # Проверяем каждую подписку
-                for user_id, subscription in active_subs:
+                # Подписки, которым подходит пост
+                for user_id, subscription in subscription_matcher.matching(parsed, text):
                     filters = subscription.get("filters", {})
                     sub_id = subscription.get("id")
                     last_notified = subscription.get("last_notified_post_id")
@@ -214,21 +276,20 @@ async def check_new_posts_and_notify() -> int:
                     if last_notified is not None and post_id <= last_notified:
                         continue
 
-                    if match_post_with_filters(parsed, filters):
-                        success = await send_notification(user_id, post, filters)
-                        if success:
-                            notifications_sent += 1
-                            # Обновляем ID последнего отправленного поста для этой подписки
-                            storage.update_subscription_last_notified_post(user_id, sub_id, post_id)
-                            logger.info(
-                                "Sent notification to user %s for post %s (subscription %s)",
-                                user_id,
-                                post_id,
-                                sub_id,
-                            )
-
-                        # Небольшая задержка между отправками
-                        await asyncio.sleep(0.5)
+                    success = await send_notification(user_id, post, filters)
+                    if success:
+                        notifications_sent += 1
+                        # Обновляем ID последнего отправленного поста для этой подписки
+                        storage.update_subscription_last_notified_post(user_id, sub_id, post_id)
+                        logger.info(
+                            "Sent notification to user %s for post %s (subscription %s)",
+                            user_id,
+                            post_id,
+                            sub_id,
+                        )
+
+                    # Небольшая задержка между отправками
+                    await asyncio.sleep(0.5)
 
             # Обновляем last_checked_post_id после обработки каждого поста
             storage.set_last_checked_post_id(post_id)
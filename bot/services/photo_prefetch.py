@@ -0,0 +1,167 @@
+"""
+Фоновая загрузка фото объявления, пока пользователь заполняет черновик.
+Каждое фото начинает загружаться в сообщество сразу после получения,
+готовые вложения photo<owner>_<id> сохраняются в черновике, поэтому при
+отправке объявления остается только вызвать wall.post.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from bot.config import PHOTO_UPLOAD_WORKERS
+from bot.services.post import MAX_POST_PHOTOS, upload_photo
+
+logger = logging.getLogger("photo_prefetch")
+
+# Ключ черновика с готовыми вложениями: {url: "photo<owner>_<id>"}
+ATTACHMENTS_KEY = "photo_attachments"
+
+
+class PhotoPrefetcher:
+    """Загрузки фото черновиков в фоне с ограничением параллельности."""
+
+    def __init__(self, workers: int = PHOTO_UPLOAD_WORKERS):
+        """
+        Args:
+            workers: Сколько фото загружается одновременно
+        """
+        self.workers = max(1, workers)
+        self.uploaded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, Dict[str, asyncio.Task]] = {}
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Создается в цикле событий бота при первой загрузке
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    @staticmethod
+    def _wanted(draft: Dict[str, Any]) -> List[str]:
+        """URL фото, которые попадут в объявление."""
+        return (draft.get("photo_urls") or [])[:MAX_POST_PHOTOS]
+
+    async def _upload(self, uid: str, draft: Dict[str, Any], url: str) -> Dict[str, Any]:
+        """Загружает фото и сохраняет вложение в черновик."""
+        async with self._get_semaphore():
+            result = await asyncio.to_thread(upload_photo, url, uid)
+
+        if "error" in result:
+            self.failed += 1
+            logger.warning("Background upload of %s failed: %s", url, result["error"])
+            return result
+
+        self.uploaded += 1
+        if url in self._wanted(draft):
+            draft.setdefault(ATTACHMENTS_KEY, {})[url] = result["response"]["attachment"]
+        return result
+
+    def _forget(self, uid: str, url: str, task: asyncio.Task) -> None:
+        tasks = self._tasks.get(uid)
+        if tasks and tasks.get(url) is task:
+            del tasks[url]
+            if not tasks:
+                del self._tasks[uid]
+
+    def schedule(self, uid: str, draft: Dict[str, Any]) -> int:
+        """
+        Запускает загрузку новых фото черновика.
+
+        Returns:
+            Количество запущенных загрузок
+        """
+        ready = draft.get(ATTACHMENTS_KEY) or {}
+        tasks = self._tasks.setdefault(uid, {})
+        started = 0
+
+        for url in self._wanted(draft):
+            if url in ready or url in tasks:
+                continue
+            task = asyncio.create_task(self._upload(uid, draft, url))
+            task.add_done_callback(lambda t, url=url: self._forget(uid, url, t))
+            tasks[url] = task
+            started += 1
+
+        if not tasks:
+            del self._tasks[uid]
+        return started
+
+    def discard(self, uid: str, draft: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Отменяет загрузки фото, которых больше нет в черновике.
+
+        Без draft отменяются все загрузки пользователя (черновик удален
+        или начат заново). Загрузка, уже переданная в поток, доработает,
+        но ее результат не попадет в черновик; само фото останется в
+        индексе загруженных фото и пригодится, если пользователь пришлет
+        его снова.
+        """
+        wanted = set(self._wanted(draft)) if draft is not None else set()
+
+        for url, task in list(self._tasks.get(uid, {}).items()):
+            if url not in wanted:
+                task.cancel()
+                self.cancelled += 1
+
+        if draft is not None and draft.get(ATTACHMENTS_KEY):
+            draft[ATTACHMENTS_KEY] = {
+                url: attachment
+                for url, attachment in draft[ATTACHMENTS_KEY].items()
+                if url in wanted
+            }
+
+    def pending(self, draft: Dict[str, Any]) -> int:
+        """Сколько фото черновика еще не загружено."""
+        ready = draft.get(ATTACHMENTS_KEY) or {}
+        return sum(1 for url in self._wanted(draft) if url not in ready)
+
+    async def collect(self, uid: str, draft: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Возвращает вложения всех фото черновика, дожидаясь фоновых загрузок.
+
+        Фото без готового вложения (загрузка не запускалась, отменена
+        или завершилась ошибкой) загружаются сейчас.
+
+        Returns:
+            {"response": {"attachments": "photo<owner>_<id>,..."}} или {"error": {...}}
+        """
+        self.discard(uid, draft)
+        attachments: List[str] = []
+
+        for url in self._wanted(draft):
+            ready = draft.get(ATTACHMENTS_KEY) or {}
+            if url not in ready:
+                task = self._tasks.get(uid, {}).get(url)
+                if task is not None:
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+                ready = draft.get(ATTACHMENTS_KEY) or {}
+
+            if url in ready:
+                attachments.append(ready[url])
+                continue
+
+            result = await asyncio.to_thread(upload_photo, url, uid)
+            if "error" in result:
+                return result
+            attachment = result["response"]["attachment"]
+            draft.setdefault(ATTACHMENTS_KEY, {})[url] = attachment
+            attachments.append(attachment)
+
+        return {"response": {"attachments": ",".join(attachments) or None}}
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает статистику загрузок."""
+        return {
+            "in_progress": sum(len(tasks) for tasks in self._tasks.values()),
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+
+photo_prefetcher = PhotoPrefetcher()
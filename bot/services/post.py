@@ -14,26 +14,43 @@ from bot.config import (
     API_V,
     REQUEST_TIMEOUT,
     DEFAULT_SCHEDULE_DELAY,
+    PHOTO_INDEX_FILE,
+    PHOTO_HASH_DISTANCE,
 )
+from bot.services.image_hash import ImageHashIndex, dhash
+from bot.services.schedule import slot_planner
 from bot.services.vk_api import vk_api_call
 
 logger = logging.getLogger("post_service")
 
+# Уже загруженные в сообщество фото: перцептивный хэш -> вложение photo<owner>_<id>
+photo_index = ImageHashIndex(
+    path=PHOTO_INDEX_FILE,
+    max_distance=PHOTO_HASH_DISTANCE,
+    ttl_seconds=365 * 24 * 60 * 60,
+)
+
+
+# Сколько фото прикрепляется к объявлению
+MAX_POST_PHOTOS = 6
 
-def upload_photos_to_group(photo_urls: List[str]) -> Dict[str, Any]:
+
+def upload_photo(url: str, owner: str = "") -> Dict[str, Any]:
     """
-    Загружает список URL'ов фото в сообщество.
+    Загружает одно фото по URL в сообщество.
+
+    Повторно присланное тем же пользователем фото не загружается заново.
+    Похожее фото другого пользователя (типовой интерьер, фото из
+    интернета) загружается отдельно: иначе объявление получило бы чужое
+    вложение и считалось бы дубликатом чужого объявления.
 
     Args:
-        photo_urls: Список URL фотографий
+        url: URL фотографии
+        owner: Пользователь, приславший фото (область поиска готовых вложений)
 
     Returns:
-        {"response": {"attachments": "photo<owner>_<id>,..."}}
-        или {"error": {...}}
+        {"response": {"attachment": "photo<owner>_<id>"}} или {"error": {...}}
     """
-    if not photo_urls:
-        return {"response": {"attachments": None}}
-
     if GROUP_ID == 0:
         return {"error": {"error_msg": "GROUP_ID not configured"}}
 
@@ -45,97 +62,131 @@ def upload_photos_to_group(photo_urls: List[str]) -> Dict[str, Any]:
             }
         }
 
-    attachments: List[str] = []
-    max_photos = 6
-
-    for idx, url in enumerate(photo_urls[:max_photos], start=1):
-        logger.info("Downloading photo #%s from: %s", idx, url)
+    logger.info("Downloading photo from: %s", url)
+
+    try:
+        resp = requests.get(url, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        img_bytes = resp.content
+    except Exception as e:
+        logger.exception("Failed to download %s: %s", url, e)
+        return {"error": {"error_msg": f"Failed to download photo: {e}"}}
+
+    # Это фото пользователь уже присылал (например, в другом объявлении) - используем готовое вложение
+    photo_hash = dhash(img_bytes)
+    if photo_hash is not None:
+        existing = photo_index.get(photo_hash, namespace=owner)
+        if existing:
+            logger.info("Photo already uploaded as %s", existing)
+            return {"response": {"attachment": existing}}
+
+    # 1) Получаем upload_url
+    get_upload = vk_api_call(
+        "photos.getWallUploadServer",
+        {"group_id": GROUP_ID, "v": API_V},
+        token=token_for_upload,
+    )
 
-        try:
-            resp = requests.get(url, timeout=REQUEST_TIMEOUT)
-            resp.raise_for_status()
-            img_bytes = resp.content
-        except Exception as e:
-            logger.exception("Failed to download %s: %s", url, e)
-            return {"error": {"error_msg": f"Failed to download photo: {e}"}}
-
-        # 1) Получаем upload_url
-        get_upload = vk_api_call(
-            "photos.getWallUploadServer",
-            {"group_id": GROUP_ID, "v": API_V},
-            token=token_for_upload,
-        )
-
-        if "error" in get_upload:
-            logger.error("photos.getWallUploadServer error: %s", get_upload)
-            return {"error": get_upload["error"]}
-
-        upload_url = get_upload.get("response", {}).get("upload_url")
-        if not upload_url:
-            logger.error("No upload_url in response: %s", get_upload)
-            return {"error": {"error_msg": "No upload_url returned"}}
-
-        # 2) Загружаем файл
-        logger.info("Uploading to %s", upload_url)
-        try:
-            files = {"photo": ("photo.jpg", img_bytes)}
-            up = requests.post(upload_url, files=files, timeout=REQUEST_TIMEOUT * 2)
-            up.raise_for_status()
-            upj = up.json()
-        except Exception as e:
-            logger.exception("Upload failed: %s", e)
-            return {
-                "error": {
-                    "error_msg": f"Upload failed: {e}",
-                    "raw": getattr(up, "text", None),
-                }
+    if "error" in get_upload:
+        logger.error("photos.getWallUploadServer error: %s", get_upload)
+        return {"error": get_upload["error"]}
+
+    upload_url = get_upload.get("response", {}).get("upload_url")
+    if not upload_url:
+        logger.error("No upload_url in response: %s", get_upload)
+        return {"error": {"error_msg": "No upload_url returned"}}
+
+    # 2) Загружаем файл
+    logger.info("Uploading to %s", upload_url)
+    try:
+        files = {"photo": ("photo.jpg", img_bytes)}
+        up = requests.post(upload_url, files=files, timeout=REQUEST_TIMEOUT * 2)
+        up.raise_for_status()
+        upj = up.json()
+    except Exception as e:
+        logger.exception("Upload failed: %s", e)
+        return {
+            "error": {
+                "error_msg": f"Upload failed: {e}",
+                "raw": getattr(up, "text", None),
             }
+        }
 
-        server = upj.get("server")
-        photo = upj.get("photo")
-        hash_ = upj.get("hash")
-
-        if not (server and photo and hash_):
-            logger.error("Invalid upload response: %s", upj)
-            return {"error": {"error_msg": "Invalid upload response", "raw": upj}}
-
-        # 3) Сохраняем фото
-        save_resp = vk_api_call(
-            "photos.saveWallPhoto",
-            {
-                "group_id": GROUP_ID,
-                "photo": photo,
-                "server": server,
-                "hash": hash_,
-                "v": API_V,
-            },
-            token=token_for_upload,
-        )
-
-        if "error" in save_resp:
-            logger.error("photos.saveWallPhoto error: %s", save_resp)
-            return {"error": save_resp["error"]}
-
-        saved = save_resp.get("response")
-        if not saved or not isinstance(saved, list):
-            logger.error("photos.saveWallPhoto unexpected: %s", save_resp)
-            return {
-                "error": {
-                    "error_msg": "saveWallPhoto returned unexpected response",
-                    "raw": save_resp,
-                }
+    server = upj.get("server")
+    photo = upj.get("photo")
+    hash_ = upj.get("hash")
+
+    if not (server and photo and hash_):
+        logger.error("Invalid upload response: %s", upj)
+        return {"error": {"error_msg": "Invalid upload response", "raw": upj}}
+
+    # 3) Сохраняем фото
+    save_resp = vk_api_call(
+        "photos.saveWallPhoto",
+        {
+            "group_id": GROUP_ID,
+            "photo": photo,
+            "server": server,
+            "hash": hash_,
+            "v": API_V,
+        },
+        token=token_for_upload,
+    )
+
+    if "error" in save_resp:
+        logger.error("photos.saveWallPhoto error: %s", save_resp)
+        return {"error": save_resp["error"]}
+
+    saved = save_resp.get("response")
+    if not saved or not isinstance(saved, list):
+        logger.error("photos.saveWallPhoto unexpected: %s", save_resp)
+        return {
+            "error": {
+                "error_msg": "saveWallPhoto returned unexpected response",
+                "raw": save_resp,
             }
+        }
+
+    item = saved[0]
+    owner_id = item.get("owner_id")
+    photo_id = item.get("id")
+
+    if owner_id is None or photo_id is None:
+        logger.error("saveWallPhoto missing owner_id/id: %s", item)
+        return {"error": {"error_msg": "Invalid saved photo response", "raw": item}}
+
+    attachment = f"photo{owner_id}_{photo_id}"
+    logger.info("Saved photo: %s", attachment)
+
+    if photo_hash is not None:
+        photo_index.put(photo_hash, attachment, namespace=owner)
 
-        item = saved[0]
-        owner_id = item.get("owner_id")
-        photo_id = item.get("id")
+    return {"response": {"attachment": attachment}}
+
+
+def upload_photos_to_group(photo_urls: List[str], owner: str = "") -> Dict[str, Any]:
+    """
+    Загружает список URL'ов фото в сообщество.
+
+    Args:
+        photo_urls: Список URL фотографий
+        owner: Пользователь, приславший фото
+
+    Returns:
+        {"response": {"attachments": "photo<owner>_<id>,..."}}
+        или {"error": {...}}
+    """
+    if not photo_urls:
+        return {"response": {"attachments": None}}
 
-        if owner_id is None or photo_id is None:
-            logger.error("saveWallPhoto missing owner_id/id: %s", item)
-            return {"error": {"error_msg": "Invalid saved photo response", "raw": item}}
+    attachments: List[str] = []
 
-        attachments.append(f"photo{owner_id}_{photo_id}")
-        logger.info("Saved photo: photo%s_%s", owner_id, photo_id)
+    for idx, url in enumerate(photo_urls[:MAX_POST_PHOTOS], start=1):
+        logger.info("Uploading photo #%s", idx)
+        result = upload_photo(url, owner)
+        if "error" in result:
+            return result
+        attachments.append(result["response"]["attachment"])
 
     attachments_str = ",".join(attachments) if attachments else None
     logger.info("All photos uploaded; attachments=%s", attachments_str)
@@ -146,17 +197,22 @@ def send_to_scheduled(
     text: str,
     attachments: Optional[str] = None,
     delay_seconds: int = DEFAULT_SCHEDULE_DELAY,
+    publish_date: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Создаёт отложенный пост (wall.post с publish_date).
 
+    Без publish_date пост получает ближайший свободный слот расписания
+    не раньше чем через delay_seconds.
+
     Args:
         text: Текст поста
         attachments: Строка вложений (например, "photo123_456,photo123_789")
-        delay_seconds: Задержка публикации в секундах
+        delay_seconds: Минимальная задержка публикации в секундах
+        publish_date: Точное время публикации (unix time)
 
     Returns:
-        Ответ VK API
+        Ответ VK API; при успехе response содержит также publish_date
     """
     if GROUP_ID == 0:
         return {"error": {"error_msg": "GROUP_ID not configured"}}
@@ -170,7 +226,12 @@ def send_to_scheduled(
         }
 
     owner_id = -abs(int(GROUP_ID))
-    publish_date = int(time.time()) + int(delay_seconds)
+    reserved = publish_date is None
+    if reserved:
+        try:
+            publish_date = slot_planner.reserve(int(time.time()) + int(delay_seconds))
+        except RuntimeError as e:
+            return {"error": {"error_msg": f"Schedule is full: {e}"}}
 
     params = {
         "owner_id": owner_id,
@@ -193,4 +254,56 @@ def send_to_scheduled(
 
     resp = vk_api_call("wall.post", params, token=token_for_post)
     logger.info("wall.post response: %s", resp)
+
+    if "error" in resp:
+        if reserved:
+            slot_planner.release(publish_date)
+    elif isinstance(resp.get("response"), dict):
+        resp["response"]["publish_date"] = publish_date
+        logger.info("Postponed queue: %s", slot_planner.stats())
+    return resp
+
+
+def edit_post(
+    post_id: int,
+    text: str,
+    attachments: Optional[str] = None,
+    publish_date: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Заменяет текст и вложения поста сообщества (wall.edit).
+
+    Args:
+        post_id: ID поста
+        text: Новый текст
+        attachments: Строка вложений
+        publish_date: Время публикации отложенного поста (без него VK опубликует пост сразу)
+
+    Returns:
+        Ответ VK API
+    """
+    if GROUP_ID == 0:
+        return {"error": {"error_msg": "GROUP_ID not configured"}}
+
+    token_for_post = UPLOAD_TOKEN or GROUP_TOKEN
+    if not token_for_post:
+        return {
+            "error": {
+                "error_msg": "No token configured for posting (UPLOAD_TOKEN or GROUP_TOKEN)"
+            }
+        }
+
+    params = {
+        "owner_id": -abs(int(GROUP_ID)),
+        "post_id": post_id,
+        "message": text,
+        "v": API_V,
+    }
+    if attachments:
+        params["attachments"] = attachments
+    if publish_date:
+        params["publish_date"] = publish_date
+
+    resp = vk_api_call("wall.edit", params, token=token_for_post)
+    logger.info("wall.edit response for post %s: %s", post_id, resp)
     return resp
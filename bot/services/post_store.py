@@ -0,0 +1,269 @@
+"""
+Колоночное хранилище распарсенных полей постов.
+Цена, количество комнат, этаж, дата и код района каждого загруженного
+поста лежат в массивах NumPy рядом с массивом ID, поэтому фильтры поиска
+проверяются одной векторной операцией над всеми постами, а не циклом по
+словарям. Без NumPy используются списки и обычный цикл.
+"""
+import logging
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger("post_store")
+
+# Значение отсутствующего поля в числовых колонках
+MISSING = -(2 ** 31)
+
+# Колонка -> (поле распарсенного поста, тип NumPy)
+COLUMNS = {
+    "id": (None, "int64"),
+    "date": (None, "int64"),
+    "price": ("price_value", "int64"),
+    "rooms": ("rooms_value", "int32"),
+    "floor": ("floor_value", "int32"),
+    "district": ("district", "int32"),
+}
+
+INITIAL_CAPACITY = 1024
+
+
+class PostStore:
+    """
+    Колонки полей постов; строка поста переиспользуется при повторной загрузке.
+
+    Удаленный пост помечается в колонке alive, строки уплотняются, когда
+    удаленных становится больше половины.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, use_numpy: bool = NUMPY_AVAILABLE):
+        """
+        Args:
+            capacity: Начальное количество строк
+            use_numpy: Хранить колонки в массивах NumPy
+        """
+        self.use_numpy = use_numpy and NUMPY_AVAILABLE
+        self._lock = Lock()
+        self._size = 0
+        self._dead = 0
+        self._row_of: Dict[int, int] = {}
+        self._district_codes: Dict[str, int] = {}
+        self._district_names: List[str] = []
+        self._columns: Dict[str, Any] = {}
+        self._alive: Any = None
+        self._allocate(max(1, capacity))
+
+    # === Хранение ===
+
+    def _allocate(self, capacity: int) -> None:
+        """Создает колонки нужной емкости и копирует в них текущие строки."""
+        size = self._size
+        if self.use_numpy:
+            for name, (_, dtype) in COLUMNS.items():
+                column = np.full(capacity, MISSING, dtype=dtype)
+                if name in self._columns:
+                    column[:size] = self._columns[name][:size]
+                self._columns[name] = column
+            alive = np.zeros(capacity, dtype=bool)
+            if self._alive is not None:
+                alive[:size] = self._alive[:size]
+            self._alive = alive
+        else:
+            for name in COLUMNS:
+                column = self._columns.get(name, [])
+                self._columns[name] = column + [MISSING] * (capacity - len(column))
+            alive = self._alive or []
+            self._alive = alive + [False] * (capacity - len(alive))
+        self._capacity = capacity
+
+    def _district_code(self, name: str) -> int:
+        key = name.strip().lower()
+        code = self._district_codes.get(key)
+        if code is None:
+            code = len(self._district_names)
+            self._district_codes[key] = code
+            self._district_names.append(key)
+        return code
+
+    def _compact(self) -> None:
+        """Убирает строки удаленных постов."""
+        if self.use_numpy:
+            keep = np.flatnonzero(self._alive[:self._size])
+            for name in COLUMNS:
+                column = self._columns[name]
+                column[:len(keep)] = column[keep]
+                column[len(keep):self._size] = MISSING
+            self._alive[:len(keep)] = True
+            self._alive[len(keep):self._size] = False
+            ids = self._columns["id"][:len(keep)].tolist()
+        else:
+            keep = [row for row in range(self._size) if self._alive[row]]
+            for name in COLUMNS:
+                column = self._columns[name]
+                values = [column[row] for row in keep]
+                column[:len(keep)] = values
+                column[len(keep):self._size] = [MISSING] * (self._size - len(keep))
+            self._alive[:self._size] = [True] * len(keep) + [False] * (self._size - len(keep))
+            ids = self._columns["id"][:len(keep)]
+        self._row_of = {post_id: row for row, post_id in enumerate(ids)}
+        self._size = len(keep)
+        self._dead = 0
+
+    def add(self, post_id: int, parsed: Dict[str, Any], date: Optional[int] = None) -> None:
+        """Добавляет или обновляет строку поста."""
+        values = {"id": post_id, "date": date if isinstance(date, int) else MISSING}
+        for name, (field, _) in COLUMNS.items():
+            if field is None:
+                continue
+            value = parsed.get(field)
+            if value is None or value == "":
+                values[name] = MISSING
+            elif name == "district":
+                values[name] = value
+            else:
+                values[name] = int(value)
+
+        with self._lock:
+            if values["district"] != MISSING:
+                values["district"] = self._district_code(values["district"])
+            row = self._row_of.get(post_id)
+            if row is None:
+                if self._size == self._capacity:
+                    self._allocate(self._capacity * 2)
+                row = self._size
+                self._size += 1
+                self._row_of[post_id] = row
+            elif not self._alive[row]:
+                self._dead -= 1
+            for name, value in values.items():
+                self._columns[name][row] = value
+            self._alive[row] = True
+
+    def remove(self, post_id: int) -> None:
+        """Помечает пост удаленным."""
+        with self._lock:
+            row = self._row_of.get(post_id)
+            if row is None or not self._alive[row]:
+                return
+            self._alive[row] = False
+            self._dead += 1
+            if self._dead > INITIAL_CAPACITY and self._dead * 2 > self._size:
+                self._compact()
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    # === Фильтры ===
+
+    def _district_filter_codes(self, districts) -> List[int]:
+        return [self._district_codes[name] for name in districts if name in self._district_codes]
+
+    def _mask(self, prepared: Dict[str, Any], before: Optional[Tuple[int, int]] = None):
+        """Маска строк, подходящих под фильтры (NumPy)."""
+        size = self._size
+        columns = {name: column[:size] for name, column in self._columns.items()}
+        mask = self._alive[:size].copy()
+
+        if before is not None:
+            before_date, before_id = before
+            mask &= (columns["date"] < before_date) | (
+                (columns["date"] == before_date) & (columns["id"] < before_id)
+            )
+
+        if prepared.get("recent_threshold") is not None:
+            mask &= columns["date"] >= prepared["recent_threshold"]
+        if prepared.get("district") is not None:
+            mask &= np.isin(columns["district"], self._district_filter_codes(prepared["district"]))
+        price_min, price_max = prepared.get("price_min"), prepared.get("price_max")
+        if price_min is not None or price_max is not None:
+            mask &= columns["price"] != MISSING
+            if price_min is not None:
+                mask &= columns["price"] >= price_min
+            if price_max is not None:
+                mask &= columns["price"] <= price_max
+        if prepared.get("rooms") is not None:
+            mask &= np.isin(columns["rooms"], list(prepared["rooms"]))
+        return mask
+
+    def _match_rows(self, prepared: Dict[str, Any], before: Optional[Tuple[int, int]] = None) -> List[int]:
+        """Строки, подходящие под фильтры (цикл без NumPy)."""
+        threshold = prepared.get("recent_threshold")
+        districts = prepared.get("district")
+        codes = set(self._district_filter_codes(districts)) if districts is not None else None
+        price_min, price_max = prepared.get("price_min"), prepared.get("price_max")
+        rooms = prepared.get("rooms")
+        columns = self._columns
+
+        rows = []
+        for row in range(self._size):
+            if not self._alive[row]:
+                continue
+            if before is not None and (columns["date"][row], columns["id"][row]) >= before:
+                continue
+            if threshold is not None and columns["date"][row] < threshold:
+                continue
+            if codes is not None and columns["district"][row] not in codes:
+                continue
+            price = columns["price"][row]
+            if (price_min is not None or price_max is not None) and price == MISSING:
+                continue
+            if price_min is not None and price < price_min:
+                continue
+            if price_max is not None and price > price_max:
+                continue
+            if rooms is not None and columns["rooms"][row] not in rooms:
+                continue
+            rows.append(row)
+        return rows
+
+    def select(
+        self,
+        prepared: Dict[str, Any],
+        limit: Optional[int] = None,
+        before: Optional[Tuple[int, int]] = None,
+    ) -> List[int]:
+        """
+        ID постов, подходящих под фильтры, от новых к старым.
+
+        Args:
+            prepared: Фильтры в виде search._prepare_filters
+                (recent_threshold, district, price_min, price_max, rooms)
+            limit: Максимум ID
+            before: Ключ (date, id) - только посты старше него (продолжение
+                поиска после последнего показанного поста)
+        """
+        with self._lock:
+            if self.use_numpy:
+                rows = np.flatnonzero(self._mask(prepared, before))
+                ids = self._columns["id"][rows]
+                order = np.lexsort((-ids, -self._columns["date"][rows]))
+                if limit is not None:
+                    order = order[:limit]
+                return ids[order].tolist()
+
+            rows = self._match_rows(prepared, before)
+            columns = self._columns
+            rows.sort(key=lambda row: (columns["date"][row], columns["id"][row]), reverse=True)
+            if limit is not None:
+                rows = rows[:limit]
+            return [columns["id"][row] for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер хранилища."""
+        with self._lock:
+            return {
+                "posts": self._size - self._dead,
+                "rows": self._size,
+                "capacity": self._capacity,
+                "districts": len(self._district_names),
+                "numpy": self.use_numpy,
+            }
+
+
+post_store = PostStore()
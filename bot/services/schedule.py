@@ -0,0 +1,212 @@
+"""
+Планировщик времени публикации отложенных постов.
+Очередь отложенных записей сообщества загружается из wall.get
+(filter=postponed), и каждое новое объявление получает ближайший
+свободный слот с учетом лимитов постов в час и в сутки, поэтому
+поток объявлений публикуется равномерно, а не в одну минуту.
+"""
+import logging
+import time
+from collections import Counter
+from datetime import date, datetime, time as dt_time, timedelta
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from bot.config import (
+    GROUP_ID,
+    GROUP_TOKEN,
+    UPLOAD_TOKEN,
+    SCHEDULE_MAX_PER_HOUR,
+    SCHEDULE_MAX_PER_DAY,
+    SCHEDULE_FIRST_HOUR,
+    SCHEDULE_LAST_HOUR,
+    SCHEDULE_REFRESH_INTERVAL,
+)
+from bot.services.vk_api import vk_api_call
+
+logger = logging.getLogger("schedule")
+
+HOUR = 60 * 60
+# Ограничение VK: отложенный пост не дальше чем через год
+MAX_SCHEDULE_AHEAD = 365 * 24 * HOUR
+WALL_GET_PAGE = 100
+
+
+class SlotPlanner:
+    """
+    Расписание отложенных постов в памяти.
+
+    Час делится на max_per_hour слотов, пост занимает один слот; в сутки
+    (по местному времени) занимается не больше max_per_day слотов,
+    новые посты ставятся только в часы с first_hour до last_hour.
+    """
+
+    def __init__(
+        self,
+        max_per_hour: int = SCHEDULE_MAX_PER_HOUR,
+        max_per_day: int = SCHEDULE_MAX_PER_DAY,
+        first_hour: int = SCHEDULE_FIRST_HOUR,
+        last_hour: int = SCHEDULE_LAST_HOUR,
+        refresh_interval: float = SCHEDULE_REFRESH_INTERVAL,
+    ):
+        """
+        Args:
+            max_per_hour: Постов в час
+            max_per_day: Постов в сутки
+            first_hour: Первый час публикаций
+            last_hour: Час, с которого посты не публикуются
+            refresh_interval: Через сколько секунд перечитывать очередь из VK
+        """
+        self.max_per_hour = max(1, max_per_hour)
+        self.max_per_day = max(1, max_per_day)
+        self.first_hour = min(max(0, first_hour), 23)
+        self.last_hour = max(self.first_hour + 1, min(last_hour, 24))
+        self.refresh_interval = refresh_interval
+        self.slot_length = HOUR // self.max_per_hour
+        self._lock = Lock()
+        self._slots: Set[int] = set()
+        self._per_day: Counter = Counter()
+        self._loaded_at: Optional[float] = None
+        # Все слоты в [начало, конец) заняты - следующий поиск продолжается с конца
+        self._full_range: Optional[Tuple[int, int]] = None
+
+    def _slot_of(self, timestamp: int) -> int:
+        """Начало слота, в который попадает время."""
+        return timestamp - timestamp % self.slot_length
+
+    @staticmethod
+    def _day_of(slot: int) -> date:
+        return datetime.fromtimestamp(slot).date()
+
+    def _day_start(self, day: date) -> int:
+        """
+        Первый слот часов публикации в этот день.
+
+        Слоты отсчитываются от эпохи, поэтому first_hour:00 по местному
+        времени может попасть внутрь слота (слот не делит час или пояс
+        смещен не на целый час) - берется следующий слот.
+        """
+        start = int(datetime.combine(day, dt_time(hour=self.first_hour)).timestamp())
+        slot = self._slot_of(start)
+        return slot if slot == start else slot + self.slot_length
+
+    def _occupy(self, slot: int) -> None:
+        self._slots.add(slot)
+        self._per_day[self._day_of(slot)] += 1
+
+    def load(self, publish_dates: Iterable[int]) -> None:
+        """Заменяет расписание датами публикации из очереди VK."""
+        with self._lock:
+            self._slots = set()
+            self._per_day = Counter()
+            self._full_range = None
+            for publish_date in publish_dates:
+                self._occupy(self._slot_of(int(publish_date)))
+            self._loaded_at = time.monotonic()
+
+    def refresh(self) -> bool:
+        """
+        Загружает очередь отложенных постов сообщества.
+
+        Returns:
+            True если очередь загружена
+        """
+        token = UPLOAD_TOKEN or GROUP_TOKEN
+        if GROUP_ID == 0 or not token:
+            return False
+
+        publish_dates = []
+        offset = 0
+        while True:
+            resp = vk_api_call(
+                "wall.get",
+                {
+                    "owner_id": -abs(int(GROUP_ID)),
+                    "filter": "postponed",
+                    "offset": offset,
+                    "count": WALL_GET_PAGE,
+                },
+                token=token,
+            )
+            if "error" in resp:
+                logger.warning("Failed to load postponed posts: %s", resp["error"])
+                return False
+
+            response = resp.get("response", {})
+            items = response.get("items", [])
+            publish_dates.extend(item["date"] for item in items if item.get("date"))
+            offset += len(items)
+            if not items or offset >= response.get("count", 0):
+                break
+
+        self.load(publish_dates)
+        logger.info("Loaded %d postponed posts into the schedule", len(publish_dates))
+        return True
+
+    def _maybe_refresh(self) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.refresh()
+
+    def reserve(self, not_before: int) -> int:
+        """
+        Занимает ближайший свободный слот не раньше not_before.
+
+        Returns:
+            Время публикации (unix time)
+
+        Raises:
+            RuntimeError: Свободных слотов нет в пределах года
+        """
+        self._maybe_refresh()
+
+        with self._lock:
+            slot = self._slot_of(int(not_before))
+            if slot < not_before:
+                slot += self.slot_length
+            last = int(not_before) + MAX_SCHEDULE_AHEAD
+
+            search_start = slot
+            if self._full_range and self._full_range[0] <= slot < self._full_range[1]:
+                search_start = self._full_range[0]
+                slot = self._full_range[1]
+
+            # Каждая ветка сдвигает slot вперед хотя бы на один слот
+            while slot <= last:
+                day = self._day_of(slot)
+                hour = datetime.fromtimestamp(slot).hour
+                if hour < self.first_hour:
+                    slot = max(slot + self.slot_length, self._day_start(day))
+                    continue
+                if hour >= self.last_hour or self._per_day[day] >= self.max_per_day:
+                    slot = max(slot + self.slot_length, self._day_start(day + timedelta(days=1)))
+                    continue
+                if slot in self._slots:
+                    slot += self.slot_length
+                    continue
+                self._occupy(slot)
+                self._full_range = (search_start, slot + self.slot_length)
+                return slot
+
+        raise RuntimeError("No free slot for a postponed post")
+
+    def release(self, slot: int) -> None:
+        """Освобождает слот (пост не был создан)."""
+        with self._lock:
+            if slot in self._slots:
+                self._slots.discard(slot)
+                self._per_day[self._day_of(slot)] -= 1
+                self._full_range = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди и ближайшая занятая дата."""
+        now = int(time.time())
+        with self._lock:
+            upcoming = sorted(slot for slot in self._slots if slot >= now)
+        return {
+            "queued": len(upcoming),
+            "next": upcoming[0] if upcoming else None,
+            "last": upcoming[-1] if upcoming else None,
+        }
+
+
+slot_planner = SlotPlanner()
@@ -4,6 +4,7 @@
 import re
 import time
 import logging
+from dataclasses import asdict, dataclass, field
 from typing import Dict, Any, List, Optional, Tuple
 
 from bot.config import (
@@ -11,7 +12,11 @@ from bot.config import (
     USER_TOKEN,
     UPLOAD_TOKEN,
     SEARCH_RESULTS_LIMIT,
+    SEARCH_RESULTS_PAGE_SIZE,
+    SEARCH_SCAN_LIMIT,
+    WALL_CRAWL_LIMIT,
 )
+from bot.services.filter_index import filter_values, post_values
 from bot.services.vk_api import vk_api_call
 
 logger = logging.getLogger("search")
@@ -64,53 +69,61 @@ def parse_post_text(text: str) -> Dict[str, Any]:
     return parsed
 
 
-def search_posts(
-    filters: Dict[str, Any],
-    limit: Optional[int] = None,
-    fetch_count: int = 100,
-) -> Tuple[List[Dict[str, Any]], Optional[str]]:
-    """
-    Ищет посты в сообществе по заданным фильтрам.
+# Откуда берутся посты страницы поиска
+SOURCE_WALL = "wall"
+SOURCE_INDEX = "index"
 
-    Args:
-        filters: Словарь фильтров (district, price_min, price_max, rooms, recent_days)
-        limit: Максимальное количество результатов
-        fetch_count: Количество постов для загрузки за раз
 
-    Returns:
-        (список найденных постов, сообщение об ошибке или None)
+@dataclass
+class SearchCursor:
     """
-    if not GROUP_ID:
-        return [], "GROUP_ID не настроен"
+    Позиция продолжения поиска.
 
-    owner_id = -abs(int(GROUP_ID))
-    payload = {
-        "owner_id": owner_id,
-        "count": fetch_count,
-        "offset": 0,
-    }
-
-    token_for_wall = USER_TOKEN or UPLOAD_TOKEN
-    if not token_for_wall:
-        return [], "Добавьте USER_TOKEN или UPLOAD_TOKEN с правами wall/groups для поиска по постам"
-
-    resp = vk_api_call("wall.get", payload, token=token_for_wall)
-
-    if "error" in resp:
-        err_msg = resp["error"].get("error_msg", "Неизвестная ошибка VK")
-        if err_msg.lower().startswith("group authorization failed"):
-            err_msg = "Токен не подходит для wall.get. Убедитесь, что USER_TOKEN или UPLOAD_TOKEN выданы администратору с правами wall,groups."
-        return [], err_msg
+    Стена читается от новых постов к старым. Ключ (date, id) последнего
+    показанного объявления отсекает уже показанные посты, если новые
+    публикации сдвинули смещение на стене.
+    """
+    offset: int = 0
+    last_date: Optional[int] = None
+    last_id: Optional[int] = None
+    returned: int = 0
+    # Кластеры почти дубликатов, из которых объявление уже показано
+    clusters: List[int] = field(default_factory=list)
+    # wall - offset на стене, index - загруженные посты (ключ date, id или позиция по релевантности)
+    source: str = SOURCE_WALL
+
+    def is_seen(self, item: Dict[str, Any]) -> bool:
+        """Пост уже был на предыдущих страницах."""
+        if self.last_id is None:
+            return False
+        if item.get("is_pinned"):
+            # Закрепленный пост идет первым вне порядка дат
+            return True
+        return (_item_date(item) or 0, item.get("id") or 0) >= (self.last_date or 0, self.last_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Преобразует в словарь для хранения в сессии."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchCursor":
+        """Создает курсор из словаря."""
+        return cls(**data)
+
+
+def _item_date(item: Dict[str, Any]) -> Optional[int]:
+    """Дата поста как число."""
+    item_date = item.get("date")
+    if isinstance(item_date, str):
+        try:
+            item_date = int(item_date.strip())
+        except ValueError:
+            return None
+    return item_date if isinstance(item_date, (int, float)) else None
 
-    items = resp.get("response", {}).get("items", [])
-    if not isinstance(items, list):
-        return [], "Некорректный ответ от VK"
 
-    target_limit = limit if limit is not None else SEARCH_RESULTS_LIMIT
-    if target_limit is not None and target_limit <= 0:
-        target_limit = None
-
-    # Фильтр по дате
+def _prepare_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит фильтры к виду для проверки постов."""
     recent_days_filter = filters.get("recent_days")
     if isinstance(recent_days_filter, str):
         try:
@@ -122,62 +135,297 @@ def search_posts(
     if isinstance(recent_days_filter, int) and recent_days_filter > 0:
         recent_threshold = time.time() - recent_days_filter * 86400
 
-    # Остальные фильтры
-    district_filter = filters.get("district")
-    price_min = filters.get("price_min")
-    price_max = filters.get("price_max")
-    rooms_filter = filters.get("rooms")
+    return {
+        "recent_threshold": recent_threshold,
+        "district": filter_values(filters, "district"),
+        "price_min": filters.get("price_min"),
+        "price_max": filters.get("price_max"),
+        "rooms": filter_values(filters, "rooms"),
+    }
 
-    matches: List[Dict[str, Any]] = []
 
-    for item in items:
-        # Фильтр по дате
-        if recent_threshold is not None:
-            item_date = item.get("date")
-            if isinstance(item_date, str):
-                try:
-                    item_date = int(item_date.strip())
-                except ValueError:
-                    item_date = None
-
-            if not isinstance(item_date, (int, float)):
-                continue
-            if item_date < recent_threshold:
-                continue
+def _match_post(item: Dict[str, Any], prepared: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Проверяет пост по фильтрам.
 
-        # Парсим текст
-        text = item.get("text", "")
-        parsed = parse_post_text(text)
-        if not parsed:
-            continue
+    Returns:
+        Распарсенные поля поста или None, если пост не подходит
+    """
+    # Фильтр по дате
+    if prepared["recent_threshold"] is not None:
+        item_date = _item_date(item)
+        if item_date is None or item_date < prepared["recent_threshold"]:
+            return None
+
+    # Парсим текст
+    parsed = parse_post_text(item.get("text", ""))
+    if not parsed:
+        return None
+
+    # Фильтр по районам
+    if prepared["district"] is not None and post_values(parsed, "district") not in prepared["district"]:
+        return None
+
+    # Фильтр по цене
+    price_value = parsed.get("price_value")
+    if prepared["price_min"] is not None:
+        if price_value is None or price_value < prepared["price_min"]:
+            return None
+    if prepared["price_max"] is not None:
+        if price_value is None or price_value > prepared["price_max"]:
+            return None
+
+    # Фильтр по количеству комнат
+    if prepared["rooms"] is not None and post_values(parsed, "rooms") not in prepared["rooms"]:
+        return None
 
-        # Фильтр по району
-        if district_filter:
-            district = parsed.get("district")
-            if not district or district.lower() != district_filter.lower():
-                continue
+    return parsed
+
+
+def search_page(
+    filters: Dict[str, Any],
+    cursor: Optional[SearchCursor] = None,
+    page_size: int = SEARCH_RESULTS_PAGE_SIZE,
+    limit: Optional[int] = None,
+    fetch_count: int = 100,
+) -> Tuple[List[Dict[str, Any]], Optional[SearchCursor], Optional[str]]:
+    """
+    Ищет следующую страницу объявлений, начиная с позиции курсора.
+
+    Стена читается порциями по fetch_count постов только до тех пор, пока
+    не набрана страница. Результаты идут от новых к старым; из кластера
+    почти одинаковых постов показывается только первый (самый новый)
+    подходящий, в том числе между страницами. Курсор
+    возвращается, если стена просмотрена не до конца, поэтому следующая
+    страница может оказаться пустой.
 
-        # Фильтр по цене
-        price_value = parsed.get("price_value")
-        if price_min is not None:
-            if price_value is None or price_value < price_min:
+    С фильтром keywords стена не читается: посты с этими словами берутся
+    из полнотекстового индекса загруженных постов по релевантности.
+    Если последние SEARCH_SCAN_LIMIT постов стены уже загружены в индексы,
+    стена тоже не читается: подходящие посты отбираются векторной маской
+    по колоночному хранилищу (post_store) от новых к старым.
+
+    Args:
+        filters: Словарь фильтров (district, price_min, price_max, rooms, recent_days, keywords)
+        cursor: Курсор предыдущей страницы (None - первая страница)
+        page_size: Количество объявлений на странице
+        limit: Максимальное количество результатов за весь поиск
+        fetch_count: Количество постов для загрузки за раз
+
+    Returns:
+        (объявления страницы, курсор следующей страницы или None, сообщение об ошибке или None)
+    """
+    if not GROUP_ID:
+        return [], None, "GROUP_ID не настроен"
+
+    token_for_wall = USER_TOKEN or UPLOAD_TOKEN
+    if not token_for_wall:
+        return [], None, "Добавьте USER_TOKEN или UPLOAD_TOKEN с правами wall/groups для поиска по постам"
+
+    cursor = cursor or SearchCursor()
+    target_limit = limit if limit is not None else SEARCH_RESULTS_LIMIT
+    if target_limit is not None and target_limit <= 0:
+        target_limit = None
+
+    wanted = page_size
+    if target_limit is not None:
+        wanted = min(wanted, target_limit - cursor.returned)
+    if wanted <= 0:
+        return [], None, None
+
+    # Импорт здесь: индексы используют parse_post_text из этого модуля
+    from bot.services.ingest import ingest_post, wall_indexed
+    from bot.services.near_duplicates import near_duplicates
+    from bot.services.post_store import post_store
+    from bot.services.text_index import query_terms
+
+    prepared = _prepare_filters(filters)
+    if query_terms(filters.get("keywords") or ""):
+        post_ids = _keyword_ids(filters["keywords"], prepared)
+        # Порядок по релевантности: продолжаем после последнего показанного поста
+        start = cursor.offset
+        if cursor.last_id is not None and cursor.last_id in post_ids:
+            start = post_ids.index(cursor.last_id) + 1
+        return _index_page(post_ids, prepared, cursor, wanted, target_limit, start)
+
+    # Курсор, начатый по стене, продолжается по стене (индексы могли загрузиться позже)
+    if cursor.source == SOURCE_INDEX or (
+        cursor.last_id is None and wall_indexed() and WALL_CRAWL_LIMIT >= SEARCH_SCAN_LIMIT
+    ):
+        # Фильтры - одна векторная маска по колонкам загруженных постов. Следующая
+        # страница начинается после ключа (date, id) последнего показанного поста,
+        # поэтому новые и удаленные посты не сдвигают ее
+        before = (cursor.last_date or 0, cursor.last_id) if cursor.last_id is not None else None
+        return _index_page(post_store.select(prepared, before=before), prepared, cursor, wanted, target_limit)
+
+    owner_id = -abs(int(GROUP_ID))
+    offset = cursor.offset
+    page: List[Dict[str, Any]] = []
+    next_offset: Optional[int] = None
+    seen_clusters = set(cursor.clusters)
+
+    while next_offset is None and offset < SEARCH_SCAN_LIMIT:
+        payload = {
+            "owner_id": owner_id,
+            "count": fetch_count,
+            "offset": offset,
+        }
+        resp = vk_api_call("wall.get", payload, token=token_for_wall)
+
+        if "error" in resp:
+            err_msg = resp["error"].get("error_msg", "Неизвестная ошибка VK")
+            if err_msg.lower().startswith("group authorization failed"):
+                err_msg = "Токен не подходит для wall.get. Убедитесь, что USER_TOKEN или UPLOAD_TOKEN выданы администратору с правами wall,groups."
+            return [], None, err_msg
+
+        items = resp.get("response", {}).get("items", [])
+        if not isinstance(items, list):
+            return [], None, "Некорректный ответ от VK"
+
+        for index, item in enumerate(items):
+            if cursor.is_seen(item):
                 continue
-        if price_max is not None:
-            if price_value is None or price_value > price_max:
+            # Подпись считается один раз, дальше - поиск кластера в словаре
+            ingest_post(item)
+            parsed = _match_post(item, prepared)
+            if parsed is None:
                 continue
-
-        # Фильтр по комнатам
-        rooms_value = parsed.get("rooms_value")
-        if rooms_filter is not None:
-            if rooms_value is None or rooms_value != rooms_filter:
+            cluster = near_duplicates.cluster_of(item.get("id"))
+            if cluster is not None and cluster in seen_clusters:
                 continue
+            if len(page) == wanted:
+                # Следующая страница начнется с этого поста
+                next_offset = offset + index
+                break
+            page.append({"item": item, "parsed": parsed})
+            if cluster is not None:
+                seen_clusters.add(cluster)
+
+        if len(items) < fetch_count:
+            break
+        offset += len(items)
+        if next_offset is None and len(page) == wanted:
+            # Страница набрана - остаток стены проверится при следующем запросе
+            next_offset = offset
+
+    returned = cursor.returned + len(page)
+    if (
+        next_offset is None
+        or next_offset >= SEARCH_SCAN_LIMIT
+        or not page
+        or (target_limit is not None and returned >= target_limit)
+    ):
+        return page, None, None
+
+    last_item = page[-1]["item"]
+    next_cursor = SearchCursor(
+        offset=next_offset,
+        last_date=_item_date(last_item),
+        last_id=last_item.get("id"),
+        returned=returned,
+        clusters=sorted(seen_clusters),
+    )
+    return page, next_cursor, None
+
+
+def _keyword_ids(keywords: str, prepared: Dict[str, Any]) -> List[int]:
+    """ID постов со словами запроса по убыванию релевантности."""
+    from bot.services.filter_index import post_filters
+    from bot.services.text_index import text_index
+
+    candidates = None
+    if prepared["district"] is not None or prepared["rooms"] is not None:
+        # Районы и комнаты - AND/OR битовых масок, BM25 считается только для них
+        bitmap = post_filters.select({"district": prepared["district"], "rooms": prepared["rooms"]})
+        candidates = set(post_filters.keys(bitmap))
+    return [post_id for post_id, _ in text_index.search(keywords, candidates)]
+
+
+def _index_page(
+    post_ids: List[int],
+    prepared: Dict[str, Any],
+    cursor: SearchCursor,
+    wanted: int,
+    target_limit: Optional[int],
+    start: int = 0,
+) -> Tuple[List[Dict[str, Any]], Optional[SearchCursor], Optional[str]]:
+    """
+    Страница поиска по списку ID из индексов без чтения стены.
 
-        matches.append({"item": item, "parsed": parsed})
+    Список просматривается с позиции start; offset следующего курсора -
+    позиция в этом списке. Остальные фильтры проверяются так же, как при
+    чтении стены.
+    """
+    from bot.services.ingest import get_post
+    from bot.services.near_duplicates import near_duplicates
+
+    page: List[Dict[str, Any]] = []
+    next_offset: Optional[int] = None
+    seen_clusters = set(cursor.clusters)
 
-        if target_limit is not None and len(matches) >= target_limit:
+    for position in range(start, len(post_ids)):
+        post_id = post_ids[position]
+        item = get_post(post_id)
+        if item is None:
+            continue
+        parsed = _match_post(item, prepared)
+        if parsed is None:
+            continue
+        cluster = near_duplicates.cluster_of(post_id)
+        if cluster is not None and cluster in seen_clusters:
+            continue
+        if len(page) == wanted:
+            next_offset = position
             break
+        page.append({"item": item, "parsed": parsed})
+        if cluster is not None:
+            seen_clusters.add(cluster)
+
+    returned = cursor.returned + len(page)
+    if next_offset is None or (target_limit is not None and returned >= target_limit):
+        return page, None, None
+
+    last_item = page[-1]["item"]
+    next_cursor = SearchCursor(
+        offset=next_offset,
+        last_date=_item_date(last_item),
+        last_id=last_item.get("id"),
+        returned=returned,
+        clusters=sorted(seen_clusters),
+        source=SOURCE_INDEX,
+    )
+    return page, next_cursor, None
+
+
+def search_posts(
+    filters: Dict[str, Any],
+    limit: Optional[int] = None,
+    fetch_count: int = 100,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Ищет все посты в сообществе по заданным фильтрам.
+
+    Для показа пользователю используйте search_page - она не загружает
+    больше постов, чем нужно для одной страницы.
 
-    # Сортируем по дате (старые первые)
-    matches.sort(key=lambda x: x["item"].get("date", 0), reverse=False)
+    Args:
+        filters: Словарь фильтров (district, price_min, price_max, rooms, recent_days, keywords)
+        limit: Максимальное количество результатов
+        fetch_count: Количество постов для загрузки за раз
 
-    return matches, None
+    Returns:
+        (список найденных постов, сообщение об ошибке или None)
+    """
+    target_limit = limit if limit is not None else SEARCH_RESULTS_LIMIT
+    matches: List[Dict[str, Any]] = []
+    cursor: Optional[SearchCursor] = None
+
+    while True:
+        page, cursor, error = search_page(
+            filters, cursor, page_size=fetch_count, limit=target_limit, fetch_count=fetch_count
+        )
+        if error:
+            return [], error
+        matches.extend(page)
+        if cursor is None:
+            return matches, None
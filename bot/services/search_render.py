@@ -0,0 +1,146 @@
+"""
+Сборка страницы результатов поиска в одно-два сообщения VK.
+Вместо отдельного сообщения на каждое объявление страница отправляется
+одним сообщением с вложениями wall (до 10 штук) или каруселью.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from vkbottle import TemplateElement, template_gen
+
+from bot.config import GROUP_ID
+from bot.utils import format_price_display, format_search_summary
+
+# Ограничения VK
+MAX_ATTACHMENTS = 10
+MAX_CAROUSEL_ELEMENTS = 10
+CAROUSEL_TEXT_LIMIT = 80
+
+RESULTS_MODE_WALL = "wall"
+RESULTS_MODE_CAROUSEL = "carousel"
+
+
+@dataclass
+class ResultsMessage:
+    """Сообщение со страницей результатов поиска."""
+    text: str
+    attachment: Optional[str] = None
+    template: Optional[str] = None
+    keyboard: Optional[str] = None
+
+
+def _owner_id() -> int:
+    return -abs(int(GROUP_ID))
+
+
+def wall_attachment(item: Dict[str, Any]) -> Optional[str]:
+    """Вложение wall для поста сообщества."""
+    post_id = item.get("id")
+    if post_id is None:
+        return None
+    return f"wall{_owner_id()}_{post_id}"
+
+
+def post_photo_id(item: Dict[str, Any]) -> Optional[str]:
+    """Идентификатор первой фотографии поста для карусели."""
+    for attachment in item.get("attachments") or []:
+        if attachment.get("type") != "photo":
+            continue
+        photo = attachment.get("photo") or {}
+        if photo.get("id") is not None and photo.get("owner_id") is not None:
+            return f"{photo['owner_id']}_{photo['id']}"
+    return None
+
+
+def _truncate(text: str, limit: int = CAROUSEL_TEXT_LIMIT) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _with_header(header: str, text: str) -> str:
+    return f"{header}\n\n{text}" if header else text
+
+
+def can_render_carousel(matches: List[Dict[str, Any]]) -> bool:
+    """
+    Карусель возможна, если у каждого объявления есть пост и фотография:
+    VK требует фото либо у всех элементов, либо ни у одного.
+    """
+    return bool(matches) and len(matches) <= MAX_CAROUSEL_ELEMENTS and all(
+        match["item"].get("id") is not None and post_photo_id(match["item"])
+        for match in matches
+    )
+
+
+def _carousel_template(matches: List[Dict[str, Any]]) -> str:
+    """Шаблон карусели: фото, цена и район объявления, кнопка на пост."""
+    elements = []
+    for match in matches:
+        item, parsed = match["item"], match.get("parsed") or {}
+        link = f"https://vk.com/wall{_owner_id()}_{item['id']}"
+
+        title_parts = []
+        if parsed.get("price_value") is not None:
+            title_parts.append(format_price_display(parsed["price_value"]))
+        if parsed.get("rooms_value") is not None:
+            title_parts.append(f"{parsed['rooms_value']} комн.")
+        description_parts = [part for part in (parsed.get("district"), parsed.get("address")) if part]
+
+        elements.append(TemplateElement(
+            title=_truncate(" · ".join(title_parts) or "Объявление"),
+            description=_truncate(", ".join(description_parts) or "—"),
+            photo_id=post_photo_id(item),
+            action={"type": "open_link", "link": link},
+            buttons=[{"action": {"type": "open_link", "link": link, "label": "Открыть"}}],
+        ))
+    return template_gen(*elements)
+
+
+def render_results_page(
+    matches: List[Dict[str, Any]],
+    start: int,
+    footer: str,
+    keyboard: Optional[str] = None,
+    mode: str = RESULTS_MODE_WALL,
+    header: str = "",
+) -> List[ResultsMessage]:
+    """
+    Собирает сообщения для страницы результатов.
+
+    В режиме wall страница - одно сообщение со списком и вложениями постов.
+    В режиме carousel - карусель и сообщение с клавиатурой (VK не отправляет
+    клавиатуру вместе с шаблоном). Если карусель собрать нельзя,
+    используется режим wall.
+
+    Args:
+        matches: Результаты страницы (не больше 10)
+        start: Номер первого результата страницы (с 1)
+        footer: Текст под списком (сколько показано, что дальше)
+        keyboard: Клавиатура навигации
+        mode: Режим отображения
+        header: Текст в начале страницы
+
+    Returns:
+        Сообщения для отправки по порядку
+    """
+    matches = matches[:MAX_ATTACHMENTS]
+
+    if mode == RESULTS_MODE_CAROUSEL and can_render_carousel(matches):
+        end = start + len(matches) - 1
+        return [
+            ResultsMessage(
+                text=_with_header(header, f"Объявления {start}–{end}:"),
+                template=_carousel_template(matches),
+            ),
+            ResultsMessage(text=footer, keyboard=keyboard),
+        ]
+
+    lines = [
+        format_search_summary(start + offset, match["item"], match.get("parsed") or {})
+        for offset, match in enumerate(matches)
+    ]
+    attachments = [wall_attachment(match["item"]) for match in matches]
+    return [ResultsMessage(
+        text=_with_header(header, "\n".join(lines) + "\n\n" + footer),
+        attachment=",".join(filter(None, attachments)) or None,
+        keyboard=keyboard,
+    )]
@@ -1,19 +1,121 @@
 """
 Сервис для проверки подписки пользователей.
+Статус членства кэшируется: кэш обновляется событиями group_join/group_leave
+и заполняется при запуске пакетными запросами, поэтому большинство
+проверок обходится без обращения к API.
 """
 import logging
-from bot.config import GROUP_ID, TOKEN_FOR_BOT
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bot.config import (
+    GROUP_ID,
+    TOKEN_FOR_BOT,
+    MEMBERSHIP_CACHE_TTL,
+    MEMBERSHIP_WARMUP_LIMIT,
+)
 from bot.services.vk_api import vk_api_call
 
 logger = logging.getLogger("subscription")
 
+# Ограничения VK API
+IS_MEMBER_BATCH = 500
+GET_MEMBERS_PAGE = 1000
+
+
+class MembershipCache:
+    """Кэш статуса членства в сообществе с временем жизни записей."""
+
+    def __init__(self, ttl: float):
+        """
+        Args:
+            ttl: Время жизни записи в секундах
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: Dict[int, Tuple[bool, float]] = {}
+
+    def get(self, user_id: int) -> Optional[bool]:
+        """Возвращает статус из кэша или None, если его нет или он устарел."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, user_id: int) -> Optional[bool]:
+        """Последний известный статус независимо от возраста записи."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry[0] if entry else None
+
+    def set(self, user_id: int, is_member: bool) -> None:
+        """Сохраняет статус пользователя."""
+        with self._lock:
+            self._entries[user_id] = (is_member, time.time())
+
+    def set_many(self, statuses: Dict[int, bool]) -> None:
+        """Сохраняет статусы нескольких пользователей."""
+        now = time.time()
+        with self._lock:
+            for user_id, is_member in statuses.items():
+                self._entries[user_id] = (is_member, now)
+
+    def stats(self) -> Dict[str, float]:
+        """Возвращает статистику кэша."""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": size,
+        }
 
-async def check_subscription(user_id: int) -> bool:
+
+membership_cache = MembershipCache(MEMBERSHIP_CACHE_TTL)
+
+
+def _fetch_membership(user_id: int) -> Optional[bool]:
+    """Запрашивает статус пользователя через groups.isMember (None - ошибка)."""
+    try:
+        resp = vk_api_call(
+            "groups.isMember",
+            {
+                "group_id": str(GROUP_ID),
+                "user_id": str(user_id),
+            },
+            token=TOKEN_FOR_BOT,
+        )
+    except Exception as e:
+        logger.exception("Exception checking subscription: %s", e)
+        return None
+
+    if "error" in resp:
+        logger.warning(
+            "Error checking subscription for user %s: %s", user_id, resp["error"]
+        )
+        return None
+
+    return bool(resp.get("response", 0))
+
+
+async def check_subscription(user_id: int, force: bool = False) -> bool:
     """
     Проверяет, подписан ли пользователь на сообщество.
 
+    При ошибке API используется последний известный статус, а если его
+    нет - пользователь считается не подписанным (действует лимит поисков).
+
     Args:
         user_id: ID пользователя VK
+        force: Запросить статус в API в обход кэша
 
     Returns:
         True если подписан, False если нет
@@ -21,25 +123,116 @@ async def check_subscription(user_id: int) -> bool:
     if not GROUP_ID or not TOKEN_FOR_BOT:
         return True  # Если нет настроек, разрешаем всем
 
-    try:
+    if not force:
+        cached = membership_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+    is_member = _fetch_membership(user_id)
+    if is_member is None:
+        stale = membership_cache.get_stale(user_id)
+        return bool(stale)
+
+    membership_cache.set(user_id, is_member)
+    return is_member
+
+
+def update_membership(user_id: int, is_member: bool) -> None:
+    """Обновляет статус по событию group_join/group_leave."""
+    membership_cache.set(user_id, is_member)
+    logger.info("Membership of user %s updated from event: %s", user_id, is_member)
+
+
+def _fetch_all_members(limit: int) -> Optional[List[int]]:
+    """
+    Загружает всех участников сообщества через groups.getMembers.
+
+    Returns:
+        Список ID или None, если участников больше limit или запрос не удался
+    """
+    members: List[int] = []
+    offset = 0
+
+    while True:
         resp = vk_api_call(
-            "groups.isMember",
+            "groups.getMembers",
             {
                 "group_id": str(GROUP_ID),
-                "user_id": str(user_id),
+                "offset": offset,
+                "count": GET_MEMBERS_PAGE,
             },
             token=TOKEN_FOR_BOT,
         )
+        if "error" in resp:
+            logger.warning("groups.getMembers failed: %s", resp["error"])
+            return None
 
+        response = resp.get("response", {})
+        count = response.get("count", 0)
+        if count > limit:
+            return None
+
+        items = response.get("items", [])
+        members.extend(int(item) for item in items)
+        offset += len(items)
+        if not items or offset >= count:
+            return members
+
+
+def _fetch_memberships(user_ids: List[int]) -> Dict[int, bool]:
+    """Запрашивает статусы пачками по 500 через groups.isMember с user_ids."""
+    statuses: Dict[int, bool] = {}
+
+    for start in range(0, len(user_ids), IS_MEMBER_BATCH):
+        batch = user_ids[start:start + IS_MEMBER_BATCH]
+        resp = vk_api_call(
+            "groups.isMember",
+            {
+                "group_id": str(GROUP_ID),
+                "user_ids": ",".join(str(user_id) for user_id in batch),
+            },
+            token=TOKEN_FOR_BOT,
+        )
         if "error" in resp:
-            logger.warning(
-                "Error checking subscription for user %s: %s", user_id, resp["error"]
-            )
-            return True  # В случае ошибки разрешаем
+            logger.warning("groups.isMember batch failed: %s", resp["error"])
+            continue
+
+        for item in resp.get("response", []):
+            statuses[int(item["user_id"])] = bool(item.get("member"))
+
+    return statuses
+
 
-        is_member = resp.get("response", 0)
-        return bool(is_member)
+def warm_up_membership(user_ids: Iterable[int]) -> int:
+    """
+    Заполняет кэш статусами пользователей.
+
+    Если сообщество не больше MEMBERSHIP_WARMUP_LIMIT участников, загружается
+    весь список участников, иначе статусы user_ids запрашиваются пачками.
+
+    Args:
+        user_ids: Известные пользователи бота
 
+    Returns:
+        Количество записей, добавленных в кэш
+    """
+    if not GROUP_ID or not TOKEN_FOR_BOT:
+        return 0
+
+    user_ids = sorted(set(int(user_id) for user_id in user_ids))
+
+    try:
+        members = _fetch_all_members(MEMBERSHIP_WARMUP_LIMIT) if MEMBERSHIP_WARMUP_LIMIT > 0 else None
+        if members is not None:
+            member_set = set(members)
+            statuses = {user_id: True for user_id in member_set}
+            statuses.update({user_id: False for user_id in user_ids if user_id not in member_set})
+        else:
+            statuses = _fetch_memberships(user_ids)
     except Exception as e:
-        logger.exception("Exception checking subscription: %s", e)
-        return True  # В случае ошибки разрешаем
+        logger.exception("Membership warm-up failed: %s", e)
+        return 0
+
+    membership_cache.set_many(statuses)
+    logger.info("Membership cache warmed up: %d users", len(statuses))
+    return len(statuses)
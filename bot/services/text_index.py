@@ -0,0 +1,260 @@
+"""
+Полнотекстовый поиск по описанию и адресу объявлений.
+Слова приводятся к основе упрощенным стеммером Портера для русского
+языка, служебные слова отбрасываются. Обратный индекс обновляется при
+загрузке каждого поста, запрос ранжируется по BM25 и затрагивает только
+списки постов для слов запроса.
+"""
+import math
+import re
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bot.services.search import FIELD_LABELS
+
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли
+если уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя
+ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой
+совсем ним здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех
+никогда можно при наконец два об другой хоть после над больше тот через эти нас
+про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+иногда лучше чуть том нельзя такой им более всегда конечно всю между очень
+""".split())
+
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND_1 = ("в", "вши", "вшись")
+_PERFECTIVE_GERUND_2 = ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+_ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым",
+    "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)
+_PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")
+_PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+_REFLEXIVE = ("ся", "сь")
+_VERB_1 = (
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют",
+    "ны", "ть", "ешь", "нно",
+)
+_VERB_2 = (
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл",
+    "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены",
+    "ить", "ыть", "ишь", "ую", "ю",
+)
+_NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией",
+    "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах",
+    "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+
+def _remove(rv: str, endings: Tuple[str, ...], after_a: Tuple[str, ...] = ()) -> Optional[str]:
+    """
+    Удаляет самое длинное окончание из endings или after_a.
+
+    Окончания after_a удаляются, только если перед ними "а" или "я".
+    Returns:
+        Строка без окончания или None, если окончание не найдено
+    """
+    best, conditional = "", False
+    for ending in endings:
+        if len(ending) > len(best) and rv.endswith(ending):
+            best, conditional = ending, False
+    for ending in after_a:
+        if len(ending) > len(best) and rv.endswith(ending):
+            best, conditional = ending, True
+    if not best:
+        return None
+    if conditional and (len(rv) == len(best) or rv[-len(best) - 1] not in "ая"):
+        return None
+    return rv[:-len(best)]
+
+
+def _region_after_vc(word: str, start: int = 0) -> int:
+    """Начало области после первой пары "гласная + согласная" (R1/R2 Портера)."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word: str) -> str:
+    """Основа русского слова (стеммер Портера)."""
+    word = word.lower().replace("ё", "е")
+    first_vowel = next((i for i, char in enumerate(word) if char in _VOWELS), None)
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+
+    # Шаг 1: деепричастие, иначе возвратная частица и прилагательное/глагол/существительное
+    result = _remove(rv, _PERFECTIVE_GERUND_2, _PERFECTIVE_GERUND_1)
+    if result is None:
+        result = _remove(rv, _REFLEXIVE)
+        if result is not None:
+            rv = result
+        result = _remove(rv, _ADJECTIVE)
+        if result is not None:
+            participle = _remove(result, _PARTICIPLE_2, _PARTICIPLE_1)
+            if participle is not None:
+                result = participle
+        else:
+            result = _remove(rv, _VERB_2, _VERB_1)
+            if result is None:
+                result = _remove(rv, _NOUN)
+    if result is not None:
+        rv = result
+
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательное окончание в R2
+    full = prefix + rv
+    r2 = _region_after_vc(full, _region_after_vc(full))
+    for ending in _DERIVATIONAL:
+        if full.endswith(ending) and len(full) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        result = _remove(rv, _SUPERLATIVE)
+        if result is not None:
+            rv = result[:-1] if result.endswith("нн") else result
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def tokenize(text: str) -> List[str]:
+    """Основы значимых слов текста."""
+    words = re.findall(r"[0-9a-zа-яё]+", (text or "").lower())
+    return [stem(word) for word in words if word not in STOP_WORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    """Уникальные основы слов запроса в порядке появления."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def listing_text(text: str, parsed: Optional[Dict[str, Any]] = None) -> str:
+    """Описание и адрес объявления (без цены, телефона и других полей)."""
+    markers = tuple(f"{label}:" for label in FIELD_LABELS.values())
+    lines = [line for line in (text or "").splitlines() if not any(marker in line for marker in markers)]
+    address = (parsed or {}).get("address")
+    if address:
+        lines.append(address)
+    return "\n".join(lines)
+
+
+def matches_keywords(text: str, parsed: Optional[Dict[str, Any]], keywords: Optional[str]) -> bool:
+    """Есть ли в описании и адресе объявления все слова запроса."""
+    terms = query_terms(keywords or "")
+    if not terms:
+        return True
+    return set(terms) <= set(tokenize(listing_text(text, parsed)))
+
+
+class TextIndex:
+    """Обратный индекс: основа слова -> {ID поста: частота}."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: Насыщение частоты слова (BM25)
+            b: Влияние длины документа (BM25)
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._doc_terms: Dict[int, List[str]] = {}
+        self._total_length = 0
+
+    def _remove(self, doc_id: int) -> None:
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Индексирует документ (заменяя прежнюю версию)."""
+        tokens = tokenize(text)
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, count in frequencies.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            self._lengths[doc_id] = len(tokens)
+            self._doc_terms[doc_id] = list(frequencies)
+            self._total_length += len(tokens)
+
+    def remove(self, doc_id: int) -> None:
+        """Удаляет документ из индекса."""
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, query: str, candidates: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Документы, содержащие все слова запроса, по убыванию BM25.
+
+        Args:
+            query: Текст запроса
+            candidates: Ограничить поиск этими документами
+
+        Returns:
+            [(ID документа, оценка), ...]; при равной оценке новые посты первыми
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+
+            docs = set(postings[0])
+            for other in postings[1:]:
+                docs.intersection_update(other)
+            if candidates is not None:
+                docs.intersection_update(candidates)
+
+            total_docs = len(self._lengths)
+            average_length = self._total_length / total_docs if total_docs else 0.0
+            scores: Dict[int, float] = {}
+            for term_postings in postings:
+                idf = math.log(1 + (total_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for doc_id in docs:
+                    frequency = term_postings[doc_id]
+                    norm = 1 - self.b + self.b * self._lengths[doc_id] / (average_length or 1)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        return sorted(scores.items(), key=lambda pair: (-pair[1], -pair[0]))
+
+    def stats(self) -> Dict[str, int]:
+        """Размер индекса."""
+        with self._lock:
+            return {"documents": len(self._lengths), "terms": len(self._postings)}
+
+
+text_index = TextIndex()
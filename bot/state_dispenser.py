@@ -0,0 +1,222 @@
+"""
+Хранение состояний FSM вне памяти процесса.
+Состояние диалога и связанные с ним данные (черновик объявления, сессия
+поиска) сохраняются в хранилище, поэтому после перезапуска или на другом
+процессе бота пользователь продолжает с того же шага.
+"""
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+from vkbottle import ABCStateDispenser, BaseStateGroup
+from vkbottle.dispatch.dispenser.base import StatePeer, StateRepresentation
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    # redis опционален - нужен только для общего хранилища нескольких процессов
+
+logger = logging.getLogger("state_dispenser")
+
+# Размер кэша, после которого из него удаляются устаревшие записи
+CACHE_MAX_ENTRIES = 10000
+
+
+class StateBackend(ABC):
+    """Хранилище записей состояний по peer_id."""
+
+    @abstractmethod
+    async def get(self, peer_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает запись состояния или None."""
+
+    @abstractmethod
+    async def set(self, peer_id: int, record: Dict[str, Any], ttl: int) -> None:
+        """Сохраняет запись состояния на ttl секунд."""
+
+    @abstractmethod
+    async def delete(self, peer_id: int) -> None:
+        """Удаляет запись состояния."""
+
+
+class StorageStateBackend(StateBackend):
+    """Состояния в хранилище бота (storage): переживают перезапуск процесса."""
+
+    @property
+    def _storage(self):
+        # Импорт при первом обращении: storage зависит от bot.config
+        from storage import storage
+        return storage
+
+    async def get(self, peer_id: int) -> Optional[Dict[str, Any]]:
+        record = self._storage.get_state(peer_id)
+        if record and record.get("expires_at", float("inf")) < time.time():
+            self._storage.delete_state(peer_id)
+            return None
+        return record
+
+    async def set(self, peer_id: int, record: Dict[str, Any], ttl: int) -> None:
+        self._storage.set_state(peer_id, {**record, "expires_at": time.time() + ttl})
+
+    async def delete(self, peer_id: int) -> None:
+        self._storage.delete_state(peer_id)
+
+
+class RedisStateBackend(StateBackend):
+    """Состояния в Redis: общие для нескольких процессов бота."""
+
+    def __init__(self, url: str, prefix: str = "vkbot:state:"):
+        """
+        Args:
+            url: Адрес Redis (redis://host:port/db)
+            prefix: Префикс ключей
+        """
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Для STATE_BACKEND=redis установите пакет redis")
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url, decode_responses=True)
+
+    async def get(self, peer_id: int) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(f"{self.prefix}{peer_id}")
+        return json.loads(raw) if raw else None
+
+    async def set(self, peer_id: int, record: Dict[str, Any], ttl: int) -> None:
+        await self._redis.set(f"{self.prefix}{peer_id}", json.dumps(record, ensure_ascii=False), ex=ttl)
+
+    async def delete(self, peer_id: int) -> None:
+        await self._redis.delete(f"{self.prefix}{peer_id}")
+
+
+class PersistentStateDispenser(ABCStateDispenser):
+    """
+    Диспетчер состояний с хранением в StateBackend и кэшем в процессе.
+
+    Вместе с состоянием сохраняются сессии пользователя из словарей
+    sessions (ключ - str(peer_id)) и восстанавливаются при чтении
+    состояния, которого нет в кэше процесса.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        state_ttl: int = 24 * 60 * 60,
+        cache_ttl: float = 5.0,
+        sessions: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        """
+        Args:
+            backend: Хранилище состояний
+            state_ttl: Время жизни незавершенного диалога в секундах
+            cache_ttl: Время жизни состояния в кэше процесса
+                       (для нескольких процессов - насколько можно отстать от других)
+            sessions: Словари данных пользователя, сохраняемые вместе с состоянием
+        """
+        self.backend = backend
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.sessions = sessions or {}
+        self._cache: Dict[int, Tuple[Optional[StatePeer], float]] = {}
+
+    def _remember(self, peer_id: int, state_peer: Optional[StatePeer]) -> None:
+        """Кладет состояние в кэш, убирая устаревшие записи при переполнении."""
+        now = time.monotonic()
+        if len(self._cache) >= CACHE_MAX_ENTRIES:
+            self._cache = {
+                key: entry for key, entry in self._cache.items()
+                if now - entry[1] < self.cache_ttl
+            }
+        self._cache[peer_id] = (state_peer, now)
+
+    def _snapshot(self, peer_id: int) -> Dict[str, Any]:
+        """Копия сессий пользователя для сохранения."""
+        key = str(peer_id)
+        snapshot = {}
+        for name, store in self.sessions.items():
+            if key in store:
+                snapshot[name] = json.loads(json.dumps(store[key], ensure_ascii=False, default=str))
+        return snapshot
+
+    def _restore(self, peer_id: int, snapshot: Dict[str, Any]) -> None:
+        """Восстанавливает сессии пользователя, которых нет в памяти процесса."""
+        key = str(peer_id)
+        for name, data in snapshot.items():
+            store = self.sessions.get(name)
+            if store is not None and key not in store:
+                store[key] = data
+
+    async def get(self, peer_id: int) -> Optional[StatePeer]:
+        cached = self._cache.get(peer_id)
+        if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+            return cached[0]
+
+        try:
+            record = await self.backend.get(peer_id)
+        except Exception as e:
+            logger.warning("Failed to load state for %s: %s", peer_id, e)
+            return cached[0] if cached else None
+
+        state_peer = None
+        if record:
+            state_peer = StatePeer(
+                peer_id=peer_id,
+                state=StateRepresentation(record["state"]),
+                payload=record.get("payload") or {},
+            )
+            self._restore(peer_id, record.get("sessions") or {})
+
+        self._remember(peer_id, state_peer)
+        return state_peer
+
+    async def set(self, peer_id: int, state: BaseStateGroup, **payload: Any) -> None:
+        state_peer = StatePeer(peer_id=peer_id, state=state, payload=payload)
+        self._remember(peer_id, state_peer)
+
+        record = {
+            "state": str(state_peer.state),
+            "payload": payload,
+            "sessions": self._snapshot(peer_id),
+        }
+        try:
+            await self.backend.set(peer_id, record, self.state_ttl)
+        except Exception as e:
+            logger.warning("Failed to save state for %s: %s", peer_id, e)
+
+    async def delete(self, peer_id: int) -> None:
+        self._remember(peer_id, None)
+        try:
+            await self.backend.delete(peer_id)
+        except Exception as e:
+            logger.warning("Failed to delete state for %s: %s", peer_id, e)
+
+
+def create_state_dispenser(
+    backend_name: str,
+    redis_url: str,
+    state_ttl: int,
+    cache_ttl: float,
+    sessions: Dict[str, Dict[str, Any]],
+) -> ABCStateDispenser:
+    """
+    Создает диспетчер состояний по настройкам.
+
+    Args:
+        backend_name: memory, storage или redis
+        redis_url: Адрес Redis для backend_name=redis
+        state_ttl: Время жизни незавершенного диалога в секундах
+        cache_ttl: Время жизни состояния в кэше процесса
+        sessions: Словари данных пользователя, сохраняемые вместе с состоянием
+    """
+    if backend_name == "memory":
+        from vkbottle import BuiltinStateDispenser
+        return BuiltinStateDispenser()
+
+    if backend_name == "redis":
+        backend: StateBackend = RedisStateBackend(redis_url)
+    else:
+        backend = StorageStateBackend()
+
+    logger.info("FSM states are stored in %s", backend_name)
+    return PersistentStateDispenser(backend, state_ttl=state_ttl, cache_ttl=cache_ttl, sessions=sessions)
@@ -26,6 +26,7 @@ class SearchStates(BaseStateGroup):
     PRICE_MAX = "search_price_max"
     ROOMS = "search_rooms"
     RECENT_DAYS = "search_recent_days"
+    KEYWORDS = "search_keywords"
     RESULTS = "search_results"
 
 
@@ -51,11 +52,12 @@ STATE_PROMPTS = {
 
 # Подсказки для состояний поиска
 SEARCH_PROMPTS = {
-    SearchStates.DISTRICT: "Выберите район или нажмите «Любой»:",
+    SearchStates.DISTRICT: "Выберите район или нажмите «Любой» (можно написать несколько через запятую):",
     SearchStates.PRICE_MIN: "Укажите минимальную цену",
     SearchStates.PRICE_MAX: "Укажите максимальную цену",
-    SearchStates.ROOMS: "Сколько комнат вас интересует?",
+    SearchStates.ROOMS: "Сколько комнат вас интересует? Можно несколько: 1, 2 или 1-3",
     SearchStates.RECENT_DAYS: "Показать объявления за 7 дней, за 30 дней или без ограничения?",
+    SearchStates.KEYWORDS: "Введите слова для поиска в описании (например: мебель, животные, у метро) или нажмите «Пропустить»",
 }
 
 # Подсказки для состояний проверки договора
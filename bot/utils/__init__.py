@@ -4,12 +4,15 @@ from .formatters import (
     build_post_text,
     format_preview_text,
     format_search_result,
+    format_search_summary,
 )
 from .validators import (
     extract_int,
     validate_phone,
     validate_district,
     validate_search_district,
+    parse_search_districts,
+    parse_rooms,
 )
 
 __all__ = [
@@ -17,8 +20,11 @@ __all__ = [
     "build_post_text",
     "format_preview_text",
     "format_search_result",
+    "format_search_summary",
     "extract_int",
     "validate_phone",
     "validate_district",
     "validate_search_district",
+    "parse_search_districts",
+    "parse_rooms",
 ]
@@ -77,3 +77,18 @@ def format_search_result(index: int, item: Dict[str, Any]) -> str:
     if post_id is None:
         return f"Объявление №{index}"
     return f"Объявление №{index}"
+
+
+def format_search_summary(index: int, item: Dict[str, Any], parsed: Dict[str, Any]) -> str:
+    """Краткая строка результата поиска: номер, цена, район и комнаты."""
+    parts = []
+    if parsed.get("price_value") is not None:
+        parts.append(f"💰 {format_price_display(parsed['price_value'])}")
+    if parsed.get("district"):
+        parts.append(f"🏙 {parsed['district']}")
+    if parsed.get("rooms_value") is not None:
+        parts.append(f"🚪 {parsed['rooms_value']} комн.")
+
+    if not parts:
+        return f"{index}. {format_search_result(index, item)}"
+    return f"{index}. " + " · ".join(parts)
@@ -2,7 +2,9 @@
 Утилиты для валидации данных.
 """
 import re
-from typing import Optional
+from typing import List, Optional
+
+from bot.constants import DISTRICTS, SEARCH_DISTRICTS, Button
 
 
 def extract_int(text: str) -> Optional[int]:
@@ -49,17 +51,48 @@ def validate_phone(text: str) -> tuple[bool, str]:
 
 def validate_district(text: str) -> bool:
     """Проверяет, является ли текст валидным районом."""
-    valid_districts = {
-        "Автозаводский", "Канавинский", "Ленинский", "Московский",
-        "Нижегородский", "Приокский", "Советский", "Сормовский"
-    }
-    return text in valid_districts
+    return text in DISTRICTS
 
 
 def validate_search_district(text: str) -> bool:
     """Проверяет, является ли текст валидным районом для поиска."""
-    valid_districts = {
-        "Автозаводский", "Канавинский", "Ленинский", "Московский",
-        "Нижегородский", "Приокский", "Советский", "Сормовский", "Любой"
-    }
-    return text in valid_districts
+    return text in SEARCH_DISTRICTS
+
+
+def parse_search_districts(text: str) -> Optional[List[str]]:
+    """
+    Разбирает один или несколько районов для поиска ("Канавинский, Сормовский").
+
+    Returns:
+        Список районов ([] - любой район) или None, если район не найден
+    """
+    names = [part.strip() for part in re.split(r"[,;/]|\s+и\s+|\s+или\s+", text or "") if part.strip()]
+    if not names:
+        return None
+    by_lower = {name.lower(): name for name in SEARCH_DISTRICTS}
+    districts = []
+    for name in names:
+        district = by_lower.get(name.lower())
+        if district is None:
+            return None
+        if district == Button.DISTRICT_ANY:
+            return []
+        if district not in districts:
+            districts.append(district)
+    return districts
+
+
+def parse_rooms(text: str) -> Optional[List[int]]:
+    """
+    Разбирает количество комнат: "2", "1, 2", "1 или 2", "1-3".
+
+    Returns:
+        Отсортированный список или None, если чисел нет
+    """
+    rooms = set()
+    for start, end in re.findall(r"(\d+)(?:\s*-\s*(\d+))?", text or ""):
+        low, high = int(start), int(end or start)
+        if low > high:
+            low, high = high, low
+        rooms.update(range(low, min(high, low + 20) + 1))
+    return sorted(rooms) or None
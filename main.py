@@ -6,7 +6,7 @@ import asyncio
 
 # Импортируем bot_instance напрямую чтобы получить экземпляр бота
 from bot import bot_instance
-from bot.config import LOG
+from bot.config import BOT_MODE, LOG, NOTIFICATIONS_POLLING
 
 # Импортируем хендлеры для регистрации
 import bot.handlers
@@ -44,15 +44,86 @@ async def start_notification_loop():
     asyncio.create_task(notification_loop())
 
 
+async def warm_up_keyboards():
+    """Заранее собирает JSON статических клавиатур."""
+    from bot.keyboards import warm_up
+    warm_up()
+
+
+async def warm_up_membership_cache():
+    """Заполняет кэш подписок для известных пользователей бота."""
+    from bot.services import warm_up_membership
+    from storage import storage
+
+    user_ids = set(storage.get_all_search_counts())
+    user_ids.update(user_id for user_id, _ in storage.get_all_active_subscriptions())
+    await asyncio.to_thread(warm_up_membership, user_ids)
+
+
+async def load_postponed_schedule():
+    """Загружает очередь отложенных постов в планировщик публикаций."""
+    from bot.services import slot_planner
+    await asyncio.to_thread(slot_planner.refresh)
+
+
+async def crawl_wall_into_indexes():
+    """Загружает посты стены в индексы (поиск дубликатов объявлений)."""
+    from bot.services import crawl_wall
+    await asyncio.to_thread(crawl_wall)
+
+
+async def close_contract_analyzer():
+    """Закрывает соединения анализатора договоров при остановке."""
+    from bot.handlers.contract import contract_analyzer
+    await contract_analyzer.close()
+
+
+async def flush_storage():
+    """Записывает несохраненные изменения хранилища при остановке."""
+    from storage import storage
+    storage.close()
+
+
+async def flush_image_indexes():
+    """Записывает несохраненные изменения индексов фото и страниц договоров."""
+    from bot.handlers.contract import document_parser
+    from bot.services.post import photo_index
+    photo_index.close()
+    document_parser.page_index.close()
+
+
 # Добавляем задачу в on_startup
-bot_instance.bot.loop_wrapper.on_startup.append(start_notification_loop())
+bot_instance.bot.loop_wrapper.on_startup.append(warm_up_keyboards())
+if NOTIFICATIONS_POLLING:
+    bot_instance.bot.loop_wrapper.on_startup.append(start_notification_loop())
+else:
+    LOG.info("Notification polling disabled (NOTIFICATIONS_POLLING=0)")
+bot_instance.bot.loop_wrapper.on_startup.append(warm_up_membership_cache())
+bot_instance.bot.loop_wrapper.on_startup.append(load_postponed_schedule())
+bot_instance.bot.loop_wrapper.on_startup.append(crawl_wall_into_indexes())
+bot_instance.bot.loop_wrapper.on_shutdown.append(close_contract_analyzer())
+bot_instance.bot.loop_wrapper.on_shutdown.append(flush_storage())
+bot_instance.bot.loop_wrapper.on_shutdown.append(flush_image_indexes())
+
+
+def run_callback_server():
+    """Запускает бота в режиме Callback API вместо Long Poll."""
+    from bot.callback_server import CallbackServer
+
+    server = CallbackServer()
+    bot_instance.bot.loop_wrapper.add_task(server.serve_forever())
+    bot_instance.bot.loop_wrapper.on_shutdown.insert(0, server.stop())
+    bot_instance.bot.loop_wrapper.run()
 
 
 if __name__ == "__main__":
     try:
         LOG.info("Bot starting...")
         LOG.info("Wall post notifications enabled via polling (every 60 seconds)")
-        bot_instance.bot.run_forever()
+        if BOT_MODE == "callback":
+            run_callback_server()
+        else:
+            bot_instance.bot.run_forever()
     except KeyboardInterrupt:
         LOG.info("Bot stopped by user")
     except Exception as e:
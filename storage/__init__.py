@@ -1,4 +1,5 @@
 """Модуль хранилища данных."""
 from .storage import storage, Storage
+from .locks import ShardedLock
 
-__all__ = ["storage", "Storage"]
+__all__ = ["storage", "Storage", "ShardedLock"]
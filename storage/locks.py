@@ -0,0 +1,59 @@
+"""
+Шардированные блокировки для данных пользователей.
+Пользователь попадает в шард по ID, поэтому операции разных пользователей
+не ждут друг друга, а число блокировок не растет с числом пользователей.
+"""
+import asyncio
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import Dict, Iterator, List, Tuple
+
+
+class ShardedLock:
+    """
+    Набор блокировок, выбираемых по ключу.
+
+    Для кода в потоках - threading.RLock, для обработчиков - asyncio.Lock
+    того же шарда (держится между await без блокировки цикла событий).
+    """
+
+    def __init__(self, shards: int = 64):
+        """
+        Args:
+            shards: Количество шардов
+        """
+        self.shards = max(1, shards)
+        self._locks: List[RLock] = [RLock() for _ in range(self.shards)]
+        self._async_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+        self._async_guard = Lock()
+
+    def index(self, key) -> int:
+        """Номер шарда для ключа."""
+        try:
+            return int(key) % self.shards
+        except (TypeError, ValueError):
+            return hash(key) % self.shards
+
+    def lock(self, key) -> RLock:
+        """Блокировка шарда для использования в потоках."""
+        return self._locks[self.index(key)]
+
+    def async_lock(self, key) -> asyncio.Lock:
+        """Асинхронная блокировка шарда для текущего цикла событий."""
+        loop_key = (id(asyncio.get_running_loop()), self.index(key))
+        with self._async_guard:
+            lock = self._async_locks.get(loop_key)
+            if lock is None:
+                lock = self._async_locks[loop_key] = asyncio.Lock()
+            return lock
+
+    @contextmanager
+    def all(self) -> Iterator[None]:
+        """Захватывает все шарды по порядку (снимок всех данных)."""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
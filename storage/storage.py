@@ -1,57 +1,72 @@
 """
 Постоянное хранилище данных бота.
 Сохраняет счетчики поисков и другие данные пользователей.
+
+Данные пользователя защищены блокировкой его шарда, общие данные
+(last_checked_post_id) - отдельной блокировкой. Файл записывается
+в фоне не чаще раза в STORAGE_FLUSH_INTERVAL секунд.
 """
+import atexit
 import json
 import os
 import logging
+import threading
 from typing import Dict, Any, List, Optional
 from threading import Lock
 
-from bot.config import STORAGE_FILE
+from bot.config import STORAGE_FILE, STORAGE_LOCK_SHARDS, STORAGE_FLUSH_INTERVAL
+from storage.locks import ShardedLock
 
 logger = logging.getLogger("storage")
 
-# Блокировка для потокобезопасности
-_lock = Lock()
+
+def _empty_storage() -> Dict[str, Any]:
+    return {
+        "user_search_count": {},
+        "user_data": {},
+        "user_subscriptions": {},  # {user_id: [subscription_obj, ...]}
+        "last_checked_post_id": None,  # ID последнего проверенного поста
+        "fsm_states": {},  # {peer_id: {"state", "payload", "sessions", "expires_at"}}
+    }
 
 
-def _load_storage() -> Dict[str, Any]:
+def _load_storage(path: str = STORAGE_FILE) -> Dict[str, Any]:
     """Загружает данные из JSON файла."""
-    if not os.path.exists(STORAGE_FILE):
-        return {
-            "user_search_count": {},
-            "user_data": {},
-            "user_subscriptions": {},  # {user_id: [subscription_obj, ...]}
-            "last_checked_post_id": None,  # ID последнего проверенного поста
-        }
+    if not os.path.exists(path):
+        return _empty_storage()
 
     try:
-        with open(STORAGE_FILE, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
             # Конвертируем строковые ключи обратно в int
             if "user_search_count" in data:
                 data["user_search_count"] = {
                     int(k): v for k, v in data["user_search_count"].items()
                 }
-            return data
+            return {**_empty_storage(), **data}
     except Exception as e:
         logger.exception("Error loading storage: %s", e)
-        return {"user_search_count": {}, "user_data": {}}
+        return _empty_storage()
 
 
-def _save_storage(data: Dict[str, Any]) -> None:
-    """Сохраняет данные в JSON файл."""
-    try:
-        # Конвертируем int ключи в строки для JSON
-        data_to_save = data.copy()
-        if "user_search_count" in data_to_save:
-            data_to_save["user_search_count"] = {
-                str(k): v for k, v in data_to_save["user_search_count"].items()
-            }
+def _dump_storage(data: Dict[str, Any]) -> str:
+    """Сериализует данные в JSON."""
+    # Конвертируем int ключи в строки для JSON
+    data_to_save = data.copy()
+    if "user_search_count" in data_to_save:
+        data_to_save["user_search_count"] = {
+            str(k): v for k, v in data_to_save["user_search_count"].items()
+        }
+    return json.dumps(data_to_save, ensure_ascii=False, indent=2)
+
 
-        with open(STORAGE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
+def _save_storage(content: str, path: str = STORAGE_FILE) -> None:
+    """Атомарно записывает JSON в файл."""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
     except Exception as e:
         logger.exception("Error saving storage: %s", e)
 
@@ -59,38 +74,111 @@ def _save_storage(data: Dict[str, Any]) -> None:
 class Storage:
     """Класс для работы с постоянным хранилищем."""
 
-    def __init__(self):
-        self._data = _load_storage()
+    def __init__(
+        self,
+        path: str = STORAGE_FILE,
+        shards: int = STORAGE_LOCK_SHARDS,
+        flush_interval: float = STORAGE_FLUSH_INTERVAL,
+    ):
+        """
+        Args:
+            path: Путь к JSON файлу
+            shards: Количество шардов блокировок пользователей
+            flush_interval: Задержка фоновой записи файла (0 - запись сразу)
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._data = _load_storage(path)
+        self._users = ShardedLock(shards)
+        self._global_lock = Lock()
+        self._flush_lock = Lock()
+        self._write_lock = Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        # Увеличивается при создании, удалении и переключении подписок
+        self._subscriptions_revision = 0
+
+    # === Блокировки и запись ===
+
+    def user_lock(self, user_id: int):
+        """
+        Асинхронная блокировка пользователя для обработчиков.
+
+        Нужна, когда проверка и изменение данных разделены await,
+        например проверка дубликата перед созданием подписки.
+        """
+        return self._users.async_lock(user_id)
+
+    def _save(self) -> None:
+        """
+        Отмечает данные измененными и планирует запись файла.
+
+        Вызывается после освобождения блокировки пользователя.
+        """
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+
+        with self._flush_lock:
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Записывает текущее состояние в файл."""
+        with self._flush_lock:
+            self._dirty = False
+            self._flush_timer = None
+
+        with self._write_lock:
+            # Снимок под всеми блокировками: данные не меняются во время сериализации
+            with self._users.all(), self._global_lock:
+                content = _dump_storage(self._data)
+            _save_storage(content, self.path)
+
+    def close(self) -> None:
+        """Отменяет отложенную запись и сохраняет изменения."""
+        with self._flush_lock:
+            timer, self._flush_timer = self._flush_timer, None
+            dirty = self._dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.flush()
+
+    # === Счетчики поисков ===
 
     def get_search_count(self, user_id: int) -> int:
         """Получает количество поисков пользователя."""
-        with _lock:
+        with self._users.lock(user_id):
             return self._data["user_search_count"].get(user_id, 0)
 
     def increment_search_count(self, user_id: int) -> int:
         """Увеличивает счетчик поисков и возвращает новое значение."""
-        with _lock:
+        with self._users.lock(user_id):
             current = self._data["user_search_count"].get(user_id, 0)
             self._data["user_search_count"][user_id] = current + 1
-            _save_storage(self._data)
-            return current + 1
+        self._save()
+        return current + 1
 
     def reset_search_count(self, user_id: int) -> None:
         """Сбрасывает счетчик поисков пользователя."""
-        with _lock:
+        with self._users.lock(user_id):
             self._data["user_search_count"].pop(user_id, None)
-            _save_storage(self._data)
+        self._save()
 
     def get_all_search_counts(self) -> Dict[int, int]:
         """Возвращает все счетчики поисков."""
-        with _lock:
+        with self._users.all():
             return self._data["user_search_count"].copy()
 
     def clear_all_search_counts(self) -> None:
         """Очищает все счетчики поисков (для админских целей)."""
-        with _lock:
+        with self._users.all():
             self._data["user_search_count"] = {}
-            _save_storage(self._data)
+        self._save()
 
     # === Методы для работы с подписками ===
 
@@ -108,15 +196,12 @@ class Storage:
         import uuid
         import time
 
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                self._data["user_subscriptions"] = {}
+        # Получаем ID последнего поста чтобы не отправлять старые уведомления
+        last_post_id = self.get_last_checked_post_id()
 
+        with self._users.lock(user_id):
             user_subs = self._data["user_subscriptions"].get(str(user_id), [])
 
-            # Получаем ID последнего поста чтобы не отправлять старые уведомления
-            last_post_id = self._data.get("last_checked_post_id")
-
             subscription = {
                 "id": str(uuid.uuid4())[:8],
                 "filters": filters,
@@ -125,17 +210,15 @@ class Storage:
                 "last_notified_post_id": last_post_id,  # Начинаем с текущего последнего поста
             }
 
-            user_subs.append(subscription)
-            self._data["user_subscriptions"][str(user_id)] = user_subs
-            _save_storage(self._data)
+            self._data["user_subscriptions"][str(user_id)] = user_subs + [subscription]
+            self._subscriptions_revision += 1
 
-            return subscription["id"]
+        self._save()
+        return subscription["id"]
 
     def get_user_subscriptions(self, user_id: int) -> List[Dict[str, Any]]:
         """Получает все подписки пользователя."""
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                return []
+        with self._users.lock(user_id):
             return self._data["user_subscriptions"].get(str(user_id), []).copy()
 
     def toggle_subscription(self, user_id: int, sub_id: str) -> bool:
@@ -145,35 +228,34 @@ class Storage:
         Returns:
             Новое состояние подписки (True = включена)
         """
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                return False
-
+        with self._users.lock(user_id):
             user_subs = self._data["user_subscriptions"].get(str(user_id), [])
 
             for sub in user_subs:
                 if sub["id"] == sub_id:
                     sub["enabled"] = not sub.get("enabled", True)
-                    _save_storage(self._data)
-                    return sub["enabled"]
+                    enabled = sub["enabled"]
+                    self._subscriptions_revision += 1
+                    break
+            else:
+                return False
 
-            return False
+        self._save()
+        return enabled
 
     def delete_subscription(self, user_id: int, sub_id: str) -> bool:
         """Удаляет подписку пользователя."""
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                return False
-
+        with self._users.lock(user_id):
             user_subs = self._data["user_subscriptions"].get(str(user_id), [])
             new_subs = [s for s in user_subs if s["id"] != sub_id]
 
-            if len(new_subs) < len(user_subs):
-                self._data["user_subscriptions"][str(user_id)] = new_subs
-                _save_storage(self._data)
-                return True
+            if len(new_subs) == len(user_subs):
+                return False
+            self._data["user_subscriptions"][str(user_id)] = new_subs
+            self._subscriptions_revision += 1
 
-            return False
+        self._save()
+        return True
 
     def get_all_active_subscriptions(self) -> List[tuple]:
         """
@@ -182,28 +264,52 @@ class Storage:
         Returns:
             Список кортежей (user_id, subscription)
         """
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                return []
-
-            result = []
-            for user_id_str, subs in self._data["user_subscriptions"].items():
+        result = []
+        for user_id_str in list(self._data["user_subscriptions"]):
+            with self._users.lock(user_id_str):
+                subs = self._data["user_subscriptions"].get(user_id_str, [])
                 for sub in subs:
                     if sub.get("enabled", True):
                         result.append((int(user_id_str), sub))
 
-            return result
+        return result
+
+    def get_subscriptions_revision(self) -> int:
+        """Номер версии набора подписок (для кэшей, построенных по подпискам)."""
+        return self._subscriptions_revision
+
+    # === Состояния диалогов ===
+
+    def get_state(self, peer_id: int) -> Optional[Dict[str, Any]]:
+        """Получает сохраненное состояние диалога."""
+        with self._users.lock(peer_id):
+            return self._data["fsm_states"].get(str(peer_id))
+
+    def set_state(self, peer_id: int, record: Dict[str, Any]) -> None:
+        """Сохраняет состояние диалога."""
+        with self._users.lock(peer_id):
+            self._data["fsm_states"][str(peer_id)] = record
+        self._save()
+
+    def delete_state(self, peer_id: int) -> None:
+        """Удаляет состояние диалога."""
+        with self._users.lock(peer_id):
+            if self._data["fsm_states"].pop(str(peer_id), None) is None:
+                return
+        self._save()
+
+    # === Общие данные ===
 
     def get_last_checked_post_id(self) -> Optional[int]:
         """Получает ID последнего проверенного поста."""
-        with _lock:
+        with self._global_lock:
             return self._data.get("last_checked_post_id")
 
     def set_last_checked_post_id(self, post_id: int) -> None:
         """Сохраняет ID последнего проверенного поста."""
-        with _lock:
+        with self._global_lock:
             self._data["last_checked_post_id"] = post_id
-            _save_storage(self._data)
+        self._save()
 
     def update_subscription_last_notified_post(self, user_id: int, sub_id: str, post_id: int) -> None:
         """
@@ -214,19 +320,19 @@ class Storage:
             sub_id: ID подписки
             post_id: ID поста
         """
-        with _lock:
-            if "user_subscriptions" not in self._data:
-                return
-
+        with self._users.lock(user_id):
             user_subs = self._data["user_subscriptions"].get(str(user_id), [])
 
             for sub in user_subs:
                 if sub.get("id") == sub_id:
                     sub["last_notified_post_id"] = post_id
-                    self._data["user_subscriptions"][str(user_id)] = user_subs
-                    _save_storage(self._data)
-                    return
+                    break
+            else:
+                return
+
+        self._save()
 
 
 # Создаем глобальный экземпляр
 storage = Storage()
+atexit.register(storage.close)
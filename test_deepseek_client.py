@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Тестовый скрипт для проверки повторов и размыкателя цепи клиента Deepseek.
+Запросы идут на локальный aiohttp-сервер: один метод отвечает 429, затем
+500, затем 200, другой всегда возвращает ошибку.
+Запуск: python test_deepseek_client.py или pytest test_deepseek_client.py (нужен .env с GROUP_TOKEN)
+"""
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.services.deepseek_client import CircuitBreaker, DeepseekClient, DeepseekError
+
+RETRY_AFTER = 0.3
+RESET_TIMEOUT = 0.3
+PAYLOAD = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "тест"}]}
+
+
+def make_app(calls):
+    """Сервер-заглушка; calls - время каждого запроса по методам."""
+    async def flaky(request):
+        calls["flaky"].append(time.monotonic())
+        attempt = len(calls["flaky"])
+        if attempt == 1:
+            return web.Response(status=429, text="rate limit", headers={"Retry-After": str(RETRY_AFTER)})
+        if attempt == 2:
+            return web.Response(status=500, text="internal error")
+        return web.json_response({"choices": [{"message": {"content": "ok"}}]})
+
+    async def down(request):
+        calls["down"].append(time.monotonic())
+        return web.Response(status=503, text="unavailable")
+
+    async def ok(request):
+        calls["ok"].append(time.monotonic())
+        return web.json_response({"choices": [{"message": {"content": "ok"}}]})
+
+    async def unauthorized(request):
+        calls["unauthorized"].append(time.monotonic())
+        return web.Response(status=401, text="invalid api key")
+
+    app = web.Application()
+    app.router.add_post("/flaky", flaky)
+    app.router.add_post("/down", down)
+    app.router.add_post("/ok", ok)
+    app.router.add_post("/unauthorized", unauthorized)
+    return app
+
+
+async def run_with_server(scenario):
+    calls = {"flaky": [], "down": [], "ok": [], "unauthorized": []}
+    server = TestServer(make_app(calls))
+    await server.start_server()
+    try:
+        await scenario(server, calls)
+    finally:
+        await server.close()
+
+
+def make_client(server, path, breaker, max_retries=3):
+    return DeepseekClient(
+        api_key="test",
+        url=str(server.make_url(path)),
+        timeout=5,
+        max_retries=max_retries,
+        backoff_base=0.01,
+        backoff_max=1.0,
+        breaker=breaker,
+    )
+
+
+async def check_retries(server, calls):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    client = make_client(server, "/flaky", breaker)
+    try:
+        data = await client.chat(PAYLOAD)
+    finally:
+        await client.close()
+
+    assert data["choices"][0]["message"]["content"] == "ok"
+    # 429 -> 500 -> 200: три запроса, два повтора
+    assert len(calls["flaky"]) == 3, calls["flaky"]
+    # После 429 клиент ждал Retry-After, а не короткую экспоненциальную паузу
+    first, second, third = calls["flaky"]
+    assert second - first >= RETRY_AFTER * 0.9, second - first
+    assert third - second < RETRY_AFTER, third - second
+    assert breaker.failures == 0 and breaker.opened_at is None
+    print(f"Повторы: 3 запроса, пауза после 429 - {second - first:.2f} с")
+
+
+async def check_breaker(server, calls):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    failing = make_client(server, "/down", breaker, max_retries=1)
+    healthy = make_client(server, "/ok", breaker)
+    try:
+        # Две исчерпанные серии повторов размыкают цепь
+        for _ in range(2):
+            try:
+                await failing.chat(PAYLOAD)
+                raise AssertionError("ожидалась DeepseekError")
+            except DeepseekError:
+                pass
+        assert len(calls["down"]) == 4, calls["down"]
+        assert breaker.is_open and not failing.available
+
+        # Разомкнутая цепь: запрос отклоняется без обращения к серверу
+        try:
+            await healthy.chat(PAYLOAD)
+            raise AssertionError("ожидалась DeepseekError")
+        except DeepseekError:
+            pass
+        assert not calls["ok"]
+        print("Размыкатель: разомкнут после 2 ошибок, запросы отклоняются")
+
+        # Полуоткрытое состояние: неудачный пробный запрос снова размыкает цепь
+        await asyncio.sleep(RESET_TIMEOUT)
+        assert not breaker.is_open
+        try:
+            await failing.chat(PAYLOAD)
+            raise AssertionError("ожидалась DeepseekError")
+        except DeepseekError:
+            pass
+        assert breaker.is_open
+        print("Размыкатель: неудачная проба снова размыкает цепь")
+
+        # Успешный пробный запрос замыкает цепь
+        await asyncio.sleep(RESET_TIMEOUT)
+        assert breaker.allow_request()
+        assert not breaker.allow_request(), "во время пробы второй запрос должен отклоняться"
+        breaker.release_probe()
+        await healthy.chat(PAYLOAD)
+        assert breaker.opened_at is None and breaker.failures == 0
+        assert len(calls["ok"]) == 1
+        print("Размыкатель: успешная проба замыкает цепь")
+    finally:
+        await failing.close()
+        await healthy.close()
+
+
+async def check_client_errors(server, calls):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET_TIMEOUT)
+    client = make_client(server, "/unauthorized", breaker)
+    try:
+        # Ошибка запроса не повторяется и не сбрасывает счетчик ошибок
+        breaker.record_failure()
+        try:
+            await client.chat(PAYLOAD)
+            raise AssertionError("ожидалась DeepseekError")
+        except DeepseekError:
+            pass
+        assert len(calls["unauthorized"]) == 1
+        assert breaker.failures == 1 and breaker.opened_at is None
+
+        # 401 на пробном запросе не замыкает цепь, но снимает блокировку пробы
+        breaker.record_failure()
+        assert breaker.is_open
+        await asyncio.sleep(RESET_TIMEOUT)
+        try:
+            await client.chat(PAYLOAD)
+            raise AssertionError("ожидалась DeepseekError")
+        except DeepseekError:
+            pass
+        assert breaker.opened_at is not None
+        assert breaker.allow_request()
+        print("Ошибки 4xx: без повторов, состояние цепи не меняется")
+    finally:
+        await client.close()
+
+
+def test_retries():
+    asyncio.run(run_with_server(check_retries))
+
+
+def test_circuit_breaker():
+    asyncio.run(run_with_server(check_breaker))
+
+
+def test_client_errors():
+    asyncio.run(run_with_server(check_client_errors))
+
+
+if __name__ == "__main__":
+    test_retries()
+    test_circuit_breaker()
+    test_client_errors()
+    print("Все проверки пройдены")
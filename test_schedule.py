@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Тестовый скрипт для проверки планировщика отложенных постов.
+Очередь VK не загружается: расписание задается через load().
+Запуск: python test_schedule.py или pytest test_schedule.py (нужен .env с GROUP_TOKEN)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from bot.services.schedule import HOUR, SlotPlanner
+
+# reserve() раньше зацикливался - проверяем с ограничением по времени
+RESERVE_TIMEOUT = 5.0
+
+
+@contextmanager
+def local_timezone(name):
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = name
+    time.tzset()
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = previous
+        time.tzset()
+
+
+def make_planner(**kwargs):
+    planner = SlotPlanner(refresh_interval=10 ** 9, **kwargs)
+    planner.load([])
+    return planner
+
+
+def reserve(planner, not_before):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(slot=planner.reserve(not_before)), daemon=True)
+    thread.start()
+    thread.join(RESERVE_TIMEOUT)
+    assert not thread.is_alive(), "reserve() не вернул слот"
+    return result["slot"]
+
+
+def night(hour=3):
+    """Час завтрашнего дня по местному времени: (datetime, unix time)."""
+    day = datetime.now().date() + timedelta(days=1)
+    moment = datetime(day.year, day.month, day.day, hour)
+    return moment, int(moment.timestamp())
+
+
+def check_first_slot(planner, night_time, slot):
+    published = datetime.fromtimestamp(slot)
+    day_start = night_time.replace(hour=planner.first_hour)
+    assert published.date() == night_time.date(), published
+    assert day_start <= published < day_start + timedelta(seconds=planner.slot_length), published
+    assert slot % planner.slot_length == 0
+
+
+def test_unaligned_slots():
+    # 3600 / 7 - слоты не совпадают с началом часа
+    planner = make_planner(max_per_hour=7, first_hour=9, last_hour=22)
+    night_time, not_before = night()
+    slot = reserve(planner, not_before)
+    check_first_slot(planner, night_time, slot)
+    assert reserve(planner, not_before) == slot + planner.slot_length
+    print(f"7 постов в час: первый слот {datetime.fromtimestamp(slot):%H:%M:%S}")
+
+
+def test_half_hour_timezone():
+    # UTC+5:45 - получасовые слоты начинаются в :15 и :45 по местному времени
+    with local_timezone("Asia/Kathmandu"):
+        planner = make_planner(max_per_hour=2, first_hour=9, last_hour=22)
+        night_time, not_before = night()
+        slot = reserve(planner, not_before)
+        check_first_slot(planner, night_time, slot)
+        print(f"Asia/Kathmandu: первый слот {datetime.fromtimestamp(slot):%H:%M}")
+
+
+def test_daily_limit():
+    planner = make_planner(max_per_hour=2, max_per_day=3, first_hour=9, last_hour=22)
+    night_time, not_before = night()
+    slots = [reserve(planner, not_before) for _ in range(4)]
+    assert [b - a for a, b in zip(slots, slots[1:3])] == [HOUR // 2, HOUR // 2]
+    check_first_slot(planner, night_time + timedelta(days=1), slots[3])
+    print("Лимит в сутки: четвертый пост перенесен на следующий день")
+
+
+def test_evening_not_before():
+    planner = make_planner(max_per_hour=7, first_hour=9, last_hour=22)
+    evening_time, not_before = night(hour=23)
+    slot = reserve(planner, not_before)
+    check_first_slot(planner, evening_time + timedelta(days=1), slot)
+    print("После last_hour: пост перенесен на утро")
+
+
+if __name__ == "__main__":
+    test_unaligned_slots()
+    test_half_hour_timezone()
+    test_daily_limit()
+    test_evening_not_before()
+    print("Все проверки пройдены")